@@ -0,0 +1,317 @@
+"""
+In-memory AWS stand-in for benchmarks/load_harness.py.
+
+moto serves DynamoDB and S3 in-process. Requests still go through the
+service's own clients (utils.aws_clients), which point at the LocalStack
+endpoint from config; a first-registered `before-send` hook routes them to
+moto instead. The same hook can inject latency and throttling per HTTP
+attempt, so botocore's retry logic sees throttles exactly as it would
+against AWS. The time moto itself spends answering is recorded, so it can
+be taken out of the measured latency. Other hooks count API calls per
+operation and estimate the DynamoDB capacity each call consumes:
+
+  - reads:  ceil(bytes / 4 KB) per item read (query/scan: per page), halved
+            for eventually consistent reads, doubled inside transactions;
+  - writes: ceil(bytes / 1 KB) per item written, plus one write per global
+            secondary index the item belongs to, doubled inside transactions.
+
+Item sizes follow the DynamoDB sizing rules on the wire format, so the
+numbers track real billing closely for puts and reads. Updates and deletes
+that do not return the item are counted as 1 KB; conditional checks that
+fail still pay for the write.
+"""
+import json
+import math
+import random
+import threading
+import time
+
+import config
+
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+# Key attributes of each GSI declared in template.yaml (an item is indexed when it has all of them)
+INDEX_KEYS = {
+    "GSI_CreatedAt": ("PK", "createdAt"),
+    "GSI_StatusCreatedAt": ("statusKey", "createdAt"),
+}
+
+THROTTLE_RESPONSES = {
+    "dynamodb": (400, {"Content-Type": "application/x-amz-json-1.0"}, json.dumps({
+        "__type": "com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException",
+        "message": "Injected by load harness",
+    }).encode()),
+    "s3": (503, {"Content-Type": "application/xml"},
+           b"<Error><Code>SlowDown</Code><Message>Injected by load harness</Message></Error>"),
+}
+
+
+def _number_size(text):
+    digits = text.lstrip("-").replace(".", "").split("e")[0].split("E")[0].strip("0")
+    return (len(digits) + 1) // 2 + 1
+
+
+def attribute_size(value):
+    """Stored size of one wire-format attribute value ({"S": ...}, {"N": ...}, ...)."""
+    (kind, data), = value.items()
+    if kind == "S":
+        return len(data.encode())
+    if kind == "N":
+        return _number_size(data)
+    if kind == "B":
+        return math.ceil(len(data) * 3 / 4)
+    if kind in ("BOOL", "NULL"):
+        return 1
+    if kind == "SS":
+        return sum(len(v.encode()) for v in data)
+    if kind == "NS":
+        return sum(_number_size(v) for v in data)
+    if kind == "BS":
+        return sum(math.ceil(len(v) * 3 / 4) for v in data)
+    if kind == "L":
+        return 3 + sum(attribute_size(v) + 1 for v in data)
+    if kind == "M":
+        return 3 + sum(len(k.encode()) + attribute_size(v) + 1 for k, v in data.items())
+    return 0
+
+
+def item_size(item):
+    return sum(len(name.encode()) + attribute_size(value) for name, value in (item or {}).items())
+
+
+def read_units(size, consistent=False):
+    units = max(1, math.ceil(size / READ_UNIT_BYTES))
+    return units if consistent else units / 2
+
+
+def write_units(item=None, size=None):
+    """Base-table units plus one write per GSI the item is projected into."""
+    size = item_size(item) if size is None else size
+    indexes = sum(1 for keys in INDEX_KEYS.values() if item and all(k in item for k in keys))
+    return max(1, math.ceil(size / WRITE_UNIT_BYTES)) * (1 + indexes)
+
+
+def _write_request_units(operation, request, response):
+    """WCU of one write call, from the request and (when it succeeded) the response."""
+    if operation == "PutItem":
+        return write_units(request.get("Item"))
+    if operation in ("UpdateItem", "DeleteItem"):
+        attributes = response.get("Attributes")
+        units = write_units(attributes) if attributes else 1
+        # Changing an index key moves the entry: a delete plus a put in that index
+        if operation == "UpdateItem" and "statusKey" in request.get("UpdateExpression", ""):
+            units += 2
+        return units
+    if operation == "BatchWriteItem":
+        unprocessed = sum(len(v) for v in response.get("UnprocessedItems", {}).values())
+        writes = [w for table in request.get("RequestItems", {}).values() for w in table]
+        units = sum(write_units(w["PutRequest"]["Item"]) if "PutRequest" in w else 1 for w in writes)
+        return units * (len(writes) - unprocessed) / len(writes) if writes else 0
+    if operation == "TransactWriteItems":
+        return 2 * sum(
+            write_units(action["Put"]["Item"]) if "Put" in action else 1
+            for action in request.get("TransactItems", [])
+        )
+    return 0
+
+
+def _read_request_units(operation, request, response):
+    """RCU of one read call, from the items it returned."""
+    consistent = bool(request.get("ConsistentRead"))
+    if operation == "GetItem":
+        return read_units(item_size(response.get("Item")), consistent)
+    if operation == "BatchGetItem":
+        return sum(
+            read_units(item_size(item), bool(request["RequestItems"][table].get("ConsistentRead")))
+            for table, items in response.get("Responses", {}).items() for item in items
+        )
+    if operation in ("Query", "Scan"):
+        items = response.get("Items", [])
+        returned = sum(item_size(item) for item in items)
+        # Filtered-out items are read (and paid for) too; assume they average the same size
+        scanned = response.get("ScannedCount", len(items))
+        average = returned / len(items) if items else WRITE_UNIT_BYTES
+        return read_units(average * scanned, consistent)
+    if operation == "TransactGetItems":
+        return 2 * sum(read_units(item_size(r.get("Item")), True) for r in response.get("Responses", []))
+    return 0
+
+
+def capacity(operation, request, response, failed=False):
+    """(RCU, WCU) estimate of one DynamoDB call; failed reads cost nothing."""
+    wcu = _write_request_units(operation, request, {} if failed else response)
+    rcu = 0 if failed else _read_request_units(operation, request, response)
+    return rcu, wcu
+
+
+class _RawBody:
+    """Minimal urllib3-like body for an injected response."""
+
+    def __init__(self, body):
+        self._body = body
+
+    def stream(self, **kwargs):
+        yield self._body
+
+
+class Metrics:
+    """Backend usage accumulated while one request runs (hooks fire from handler pool threads too)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}       # "dynamodb.GetItem" -> count
+        self.attempts = 0     # HTTP attempts, retries included
+        self.throttled = 0
+        self.rcu = 0.0
+        self.wcu = 0.0
+        self._standin = []    # (start, end) of each attempt answered by the stand-in
+
+    def add_call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def add_attempt(self, throttled):
+        with self._lock:
+            self.attempts += 1
+            self.throttled += int(throttled)
+
+    def add_capacity(self, rcu, wcu):
+        with self._lock:
+            self.rcu += rcu
+            self.wcu += wcu
+
+    def add_standin(self, start, end):
+        with self._lock:
+            self._standin.append((start, end))
+
+    def standin_seconds(self):
+        """Time during which at least one call was inside the stand-in (overlaps counted once)."""
+        total, reach = 0.0, None
+        for start, end in sorted(self._standin):
+            if reach is None or start > reach:
+                total += end - start
+                reach = end
+            elif end > reach:
+                total += end - reach
+                reach = end
+        return total
+
+
+class Backend:
+    """
+    Starts moto, creates the table and bucket, and instruments the shared
+    boto3 session. `latency_ms` and `throttle` map a service name
+    ("dynamodb", "s3") to milliseconds per attempt / probability per attempt.
+    """
+
+    def __init__(self, latency_ms=None, jitter=0.0, throttle=None, seed=0):
+        self.latency_ms = latency_ms or {}
+        self.jitter = jitter
+        self.throttle = throttle or {}
+        self.metrics = None  # the Metrics of the request being driven, if any
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._local = threading.local()
+        self._mock = None
+
+    def start(self):
+        try:
+            from moto import mock_aws
+        except ImportError:
+            raise SystemExit("benchmarks/load_harness.py needs moto (pip install moto)")
+        self._mock = mock_aws()
+        self._mock.start()
+
+        from utils.aws_clients import get_session
+        events = get_session().events
+        events.register_first("before-send", self._before_send)
+        events.register("before-call", self._before_call)
+        events.register("before-parse", self._before_parse)
+        events.register("after-call", self._after_call)
+        self._create_resources()
+        return self
+
+    def stop(self):
+        from utils.aws_clients import get_session
+        events = get_session().events
+        events.unregister("before-send", self._before_send)
+        events.unregister("before-call", self._before_call)
+        events.unregister("before-parse", self._before_parse)
+        events.unregister("after-call", self._after_call)
+        if self._mock:
+            self._mock.stop()
+
+    def _create_resources(self):
+        from utils.aws_clients import get_dynamodb, get_s3
+
+        def key(*names):
+            return [{"AttributeName": n, "KeyType": t} for n, t in zip(names, ("HASH", "RANGE"))]
+
+        attributes = {"PK": "S", "SK": "S", "createdAt": "N", "statusKey": "S"}
+        get_dynamodb().meta.client.create_table(
+            TableName=config.MEDIA_TABLE,
+            BillingMode="PAY_PER_REQUEST",
+            AttributeDefinitions=[{"AttributeName": n, "AttributeType": t} for n, t in attributes.items()],
+            KeySchema=key("PK", "SK"),
+            GlobalSecondaryIndexes=[
+                {"IndexName": name, "KeySchema": key(*keys), "Projection": {"ProjectionType": "ALL"}}
+                for name, keys in INDEX_KEYS.items()
+            ],
+        )
+        get_s3().create_bucket(Bucket=config.MEDIA_BUCKET)
+
+    def _chance(self, probability):
+        with self._random_lock:
+            return self._random.random() < probability
+
+    def _before_send(self, request, event_name, **kwargs):
+        service = event_name.split(".")[1]
+        if config.ENDPOINT and request.url.startswith(config.ENDPOINT):
+            host = "https://s3.amazonaws.com" if service == "s3" else f"https://{service}.{config.REGION}.amazonaws.com"
+            request.url = host + request.url[len(config.ENDPOINT):]
+
+        metrics = self.metrics
+        if metrics is None:
+            return None  # seeding and setup run without faults
+
+        delay = self.latency_ms.get(service, 0)
+        if delay:
+            with self._random_lock:
+                delay *= 1 + self._random.uniform(-self.jitter, self.jitter)
+            time.sleep(delay / 1000)
+
+        throttled = service in THROTTLE_RESPONSES and self._chance(self.throttle.get(service, 0))
+        metrics.add_attempt(throttled)
+        if throttled:
+            from botocore.awsrequest import AWSResponse
+            status, headers, body = THROTTLE_RESPONSES[service]
+            # Every before-send handler still runs: an unroutable URL keeps moto from executing the call
+            request.url = "http://throttled.load-harness.invalid/"
+            return AWSResponse(request.url, status, headers, _RawBody(body))
+        # moto answers from the next before-send handler; before-parse follows its response
+        self._local.sent = time.perf_counter()
+        return None
+
+    def _before_parse(self, **kwargs):
+        sent, self._local.sent = getattr(self._local, "sent", None), None
+        if sent is not None and self.metrics:
+            self.metrics.add_standin(sent, time.perf_counter())
+
+    def _before_call(self, model, params, context, **kwargs):
+        service = model.service_model.endpoint_prefix
+        if self.metrics:
+            self.metrics.add_call(f"{service}.{model.name}")
+        if service == "dynamodb":
+            context["load_harness_request"] = params.get("body")
+
+    def _after_call(self, http_response, model, context, **kwargs):
+        body = context.get("load_harness_request")
+        if body is None or not self.metrics:
+            return
+        request = json.loads(body or b"{}")
+        failed = http_response.status_code >= 300
+        if failed and b"ThroughputExceeded" in (http_response.content or b""):
+            return  # throttled requests consume nothing
+        response = {} if failed else json.loads(http_response.content or b"{}")
+        self.metrics.add_capacity(*capacity(model.name, request, response, failed))
@@ -0,0 +1,531 @@
+"""
+End-to-end load harness for the Lambda handlers.
+
+Drives every handler's lambda_handler in-process, one request at a time,
+against the in-memory AWS stand-in of benchmarks/load_backend.py (moto,
+with optional per-call latency and throttling). For each operation it
+reports p50/p95/p99 latency, AWS calls per request and estimated DynamoDB
+RCU/WCU per request, and can fail on regressions against a stored baseline.
+
+Latency is wall time minus the time moto spends answering, i.e. the
+handler's own work plus any injected latency; wall_p95_ms keeps the raw
+figure. AWS calls and capacity are deterministic for a given seed, so they
+are compared tightly; latency only with generous headroom.
+
+Events are either generated (seeded, so runs are reproducible) or replayed
+from a JSONL file:
+
+    {"setup": {"seed": 7, "users": 50, ...}}          optional first line: data to seed
+    {"op": "list", "event": {...API Gateway event...}}
+    {"op": "complete", "event": {...SQS-wrapped S3 notification...}}
+
+Generated runs can be written out with --record and replayed later, or
+edited by hand. Inside events, "{{token:<userId>}}" becomes a bearer token
+for that user and "{{upload:<mediaId>}}" the uploadId of a seeded
+multipart upload, so recordings stay valid across runs.
+
+Usage:
+    PYTHONPATH=. python benchmarks/load_harness.py [--requests 500] [--users 50] [--seed 7]
+    PYTHONPATH=. python benchmarks/load_harness.py --latency dynamodb=8,s3=20 --throttle dynamodb=0.02
+    PYTHONPATH=. python benchmarks/load_harness.py --record run.jsonl | --replay run.jsonl
+    PYTHONPATH=. python benchmarks/load_harness.py --check | --write-baseline
+"""
+import argparse
+import copy
+import importlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import sys
+import time
+import uuid
+import zlib
+
+# Keep the handlers' INFO logs out of the measurements unless asked for
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+from benchmarks.load_backend import Backend, Metrics  # noqa: E402
+from utils import tracing  # noqa: E402
+
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "load_baseline.json")
+# Regression thresholds: backend usage is deterministic for a given seed, latency is not
+USAGE_TOLERANCE = 0.05
+LATENCY_HEADROOM = 1.5
+LATENCY_FLOOR_MS = 5.0
+LATENCY_MIN_SAMPLES = 20  # below this a p95 is the slowest request or two, too noisy to gate on
+
+OPS = {
+    "upload": "handlers/upload_handler.lambda_handler",
+    "upload_batch": "handlers/upload_handler.lambda_handler",
+    "multipart": "handlers/multipart_handler.lambda_handler",
+    "complete": "handlers/status_update_handler.lambda_handler",
+    "derivative": "handlers/derivative_handler.lambda_handler",
+    "list": "handlers/list_handler.lambda_handler",
+    "view": "handlers/view_handler.lambda_handler",
+    "view_batch": "handlers/view_handler.lambda_handler",
+    "search": "handlers/search_handler.lambda_handler",
+    "tags": "handlers/tags_handler.lambda_handler",
+    "stats": "handlers/stats_handler.lambda_handler",
+    "delete": "handlers/delete_handler.lambda_handler",
+    "delete_batch": "handlers/delete_handler.lambda_handler",
+    "stats_repair": "handlers/stats_repair_handler.lambda_handler",
+    "reaper": "handlers/reaper_handler.lambda_handler",
+}
+DEFAULT_MIX = ("list=30,view=20,view_batch=5,upload=8,upload_batch=2,complete=10,search=8,tags=4,stats=4,"
+               "delete=3,delete_batch=1,multipart=1,derivative=2,stats_repair=1,reaper=1")
+DEFAULT_SETUP = {"seed": 7, "users": 50, "itemsPerUser": 20, "skew": 1.1, "tags": 30, "pendingRatio": 0.1}
+
+PLACEHOLDER = re.compile(r"\{\{(token|upload):([^}]+)\}\}")
+IMAGE_SIZE = (800, 600)
+
+
+def parse_pairs(spec, cast=float):
+    """'list=30,view=20' -> {"list": 30.0, "view": 20.0}."""
+    pairs = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            pairs[name] = cast(value)
+    return pairs
+
+
+def png_bytes(width, height):
+    """A grayscale gradient PNG, built with the standard library only."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    row = bytes(x * 255 // max(width - 1, 1) for x in range(width))
+    raw = b"".join(b"\x00" + row for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def zipf_weights(count, skew):
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+# --- seeded data -------------------------------------------------------------
+
+def build_dataset(setup):
+    """
+    Deterministic users and media for `setup`. Each user's media ids are
+    split into pools so events never collide: "completed" (viewed, tagged),
+    "pending" (completed by S3 events), "doomed" (deleted) and "multipart".
+    """
+    rng = random.Random(setup["seed"])
+    users = [f"load-user-{i:04d}" for i in range(setup["users"])]
+    vocabulary = [f"tag{i:03d}" for i in range(setup["tags"])]
+    tag_weights = zipf_weights(len(vocabulary), setup["skew"])
+    total = setup["users"] * setup["itemsPerUser"]
+    user_weights = zipf_weights(len(users), setup["skew"])
+    scale = total / sum(user_weights)
+
+    dataset = {"users": users, "vocabulary": vocabulary, "tagWeights": tag_weights,
+               "userWeights": user_weights, "media": {}}
+    created_at = int(time.time()) - total
+    for user_id, weight in zip(users, user_weights):
+        pools = {"completed": [], "pending": [], "doomed": [], "multipart": []}
+        for _ in range(max(4, round(weight * scale))):
+            media_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            roll = rng.random()
+            if roll < setup["pendingRatio"]:
+                pool = "pending"
+            elif roll < setup["pendingRatio"] + 0.1:
+                pool = "doomed"
+            elif roll < setup["pendingRatio"] + 0.12:
+                pool = "multipart"
+            else:
+                pool = "completed"
+            created_at += 1
+            tags = sorted(set(rng.choices(vocabulary, tag_weights, k=rng.randint(0, 4))))
+            pools[pool].append({"mediaId": media_id, "createdAt": created_at, "tags": tags,
+                                "visibility": "PRIVATE" if rng.random() < 0.2 else "PUBLIC"})
+        dataset["media"][user_id] = pools
+    return dataset
+
+
+def seed_backend(dataset):
+    """Write the dataset through the service's own write paths. Returns {mediaId: uploadId}."""
+    from services.dynamo_service import build_media_item, batch_insert_media
+    from services.s3_service import put_object
+    from utils.aws_clients import get_s3
+
+    image = png_bytes(*IMAGE_SIZE)
+    uploads = {}
+    for user_id, pools in dataset["media"].items():
+        items = []
+        for pool, media in pools.items():
+            for m in media:
+                key = f"{user_id}/{m['mediaId']}"
+                upload_id = None
+                if pool == "multipart":
+                    upload_id = get_s3().create_multipart_upload(Bucket=config.MEDIA_BUCKET, Key=key)["UploadId"]
+                    uploads[m["mediaId"]] = upload_id
+                else:
+                    # Pending uploads have landed too; their S3 events are part of the load
+                    put_object(key, image, "image/png")
+                items.append(build_media_item(
+                    user_id, m["mediaId"], key, "load-seed",
+                    status="COMPLETED" if pool in ("completed", "doomed") else "PENDING",
+                    tags=m["tags"], visibility=m["visibility"], content_type="image/png",
+                    file_size=len(image), created_at=m["createdAt"], modified_at=m["createdAt"],
+                    upload_id=upload_id, part_size=8 * 1024 * 1024 if upload_id else None,
+                    part_count=1 if upload_id else None,
+                ))
+        if batch_insert_media(items):
+            raise SystemExit(f"Seeding failed for {user_id}")
+    return uploads
+
+
+# --- event generation ----------------------------------------------------------
+
+def api_event(user_id, method, path_parameters=None, query=None, body=None):
+    return {
+        "httpMethod": method,
+        "headers": {"Authorization": f"{{{{token:{user_id}}}}}"},
+        "pathParameters": path_parameters,
+        "queryStringParameters": query,
+        "body": json.dumps(body) if body is not None else None,
+        "requestContext": {},
+    }
+
+
+def s3_message(user_id, media_id, size):
+    record = {
+        "eventName": "ObjectCreated:Put",
+        "s3": {"bucket": {"name": config.MEDIA_BUCKET},
+               "object": {"key": f"{user_id}/{media_id}", "size": size}},
+    }
+    return {"eventSource": "aws:sqs", "messageId": str(uuid.uuid4()), "body": json.dumps({"Records": [record]})}
+
+
+class EventGenerator:
+    """Samples operations by weight over Zipf-distributed users and tags."""
+
+    def __init__(self, dataset, seed):
+        self.rng = random.Random(seed + 1)
+        self.data = dataset
+        self.image_size = len(png_bytes(*IMAGE_SIZE))
+        # Pools are consumed by one-shot operations (deletes, completions)
+        self.pools = copy.deepcopy(dataset["media"])
+
+    def user(self):
+        return self.rng.choices(self.data["users"], self.data["userWeights"])[0]
+
+    def tags(self, k):
+        return sorted(set(self.rng.choices(self.data["vocabulary"], self.data["tagWeights"], k=k)))
+
+    def pick(self, user_id, pool, k=1, consume=False):
+        media = self.pools[user_id][pool]
+        if not media:
+            return []
+        if consume:
+            return [media.pop(self.rng.randrange(len(media)))["mediaId"] for _ in range(min(k, len(media)))]
+        return [m["mediaId"] for m in self.rng.sample(media, min(k, len(media)))]
+
+    def event(self, op):
+        """Event for `op`, or None when the data for it ran out."""
+        user_id = self.user()
+        if op == "list":
+            query = self.rng.choice([{"limit": "20"}, {"limit": "50", "order": "desc"},
+                                     {"status": "COMPLETED", "limit": "20"},
+                                     {"limit": "20", "fields": "mediaId,status,createdAt"}])
+            return api_event(user_id, "GET", query=query)
+        if op == "view":
+            ids = self.pick(user_id, "completed")
+            query = self.rng.choice([None, {"variant": "thumb"}])
+            return ids and api_event(user_id, "GET", {"mediaId": ids[0]}, query)
+        if op == "view_batch":
+            ids = self.pick(user_id, "completed", 10)
+            return ids and api_event(user_id, "POST", body={"mediaIds": ids})
+        if op == "upload":
+            return api_event(user_id, "POST", body={"contentType": "image/jpeg", "fileSize": 2_000_000,
+                                                    "fileName": "photo.jpg", "tags": self.tags(2)})
+        if op == "upload_batch":
+            files = [{"contentType": "image/png", "fileSize": 500_000, "tags": self.tags(1)} for _ in range(5)]
+            return api_event(user_id, "POST", body={"files": files})
+        if op == "multipart":
+            ids = self.pick(user_id, "multipart")
+            return ids and api_event(user_id, "POST", {"mediaId": ids[0], "action": "parts"},
+                                     body={"uploadId": f"{{{{upload:{ids[0]}}}}}", "partNumbers": [1]})
+        if op == "complete":
+            # One SQS batch of S3 notifications, spread over users like real traffic
+            messages = []
+            for _ in range(self.rng.randint(1, 10)):
+                owner = self.user()
+                for media_id in self.pick(owner, "pending", consume=True):
+                    messages.append(s3_message(owner, media_id, self.image_size))
+            return messages and {"Records": messages}
+        if op == "derivative":
+            ids = self.pick(user_id, "completed")
+            return ids and {"items": [{"userId": user_id, "mediaId": ids[0], "s3Key": f"{user_id}/{ids[0]}"}]}
+        if op == "search":
+            tags = self.tags(self.rng.randint(1, 3))
+            return api_event(user_id, "GET", query={"tags": ",".join(tags), "mode": self.rng.choice(["and", "or"]),
+                                                    "limit": "20"})
+        if op == "tags":
+            ids = self.pick(user_id, "completed")
+            return ids and api_event(user_id, "PUT", {"mediaId": ids[0]}, body={"tags": self.tags(3)})
+        if op == "stats":
+            return api_event(user_id, "GET")
+        if op == "delete":
+            ids = self.pick(user_id, "doomed", consume=True)
+            return ids and api_event(user_id, "DELETE", {"mediaId": ids[0]})
+        if op == "delete_batch":
+            ids = self.pick(user_id, "doomed", 5, consume=True)
+            return ids and api_event(user_id, "POST", body={"mediaIds": ids})
+        if op == "stats_repair":
+            return {"totalSegments": 4, "dryRun": True}
+        if op == "reaper":
+            return {"dryRun": True}
+        raise ValueError(f"Unknown operation: {op}")
+
+    def generate(self, requests, mix):
+        ops, weights = zip(*mix.items())
+        events = []
+        while len(events) < requests:
+            op = self.rng.choices(ops, weights)[0]
+            event = self.event(op)
+            if event:
+                events.append({"op": op, "event": event})
+            elif all(self.event_exhausted(o) for o in ops):
+                break
+        return events
+
+    def event_exhausted(self, op):
+        return op in ("delete", "delete_batch", "complete") and not any(
+            self.pools[u]["doomed" if op.startswith("delete") else "pending"] for u in self.data["users"]
+        )
+
+
+# --- driving -----------------------------------------------------------------
+
+class LambdaContext:
+    """The parts of the Lambda context object the handlers use."""
+
+    def __init__(self, timeout_ms=900_000):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+        self.aws_request_id = str(uuid.uuid4())
+
+    def get_remaining_time_in_millis(self):
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+def resolve(event, tokens, uploads):
+    """Fill in {{token:...}} / {{upload:...}} placeholders."""
+    def replace(match):
+        kind, value = match.groups()
+        if kind == "token":
+            if value not in tokens:
+                import jwt
+                tokens[value] = "Bearer " + jwt.encode({"user_id": value}, config.JWT_SECRET,
+                                                       algorithm=config.JWT_ALGO)
+            return tokens[value]
+        return uploads.get(value, value)
+
+    return json.loads(PLACEHOLDER.sub(replace, json.dumps(event)))
+
+
+def status_of(response):
+    if isinstance(response, dict) and "statusCode" in response:
+        return response["statusCode"]
+    if isinstance(response, dict) and response.get("batchItemFailures"):
+        return 500
+    return 200
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else 0.0
+
+
+def drive(events, backend, uploads):
+    """Invoke each event's handler in order. Returns {op: [(ms, wall ms, status, Metrics)]}."""
+    handlers = {}
+    tokens = {}
+    results = {}
+    for entry in events:
+        op = entry["op"]
+        if op not in handlers:
+            module = OPS[op].rsplit(".", 1)[0].replace("/", ".")
+            handlers[op] = importlib.import_module(module).lambda_handler
+        event = resolve(entry["event"], tokens, uploads)
+
+        metrics = backend.metrics = Metrics()
+        start = time.perf_counter()
+        try:
+            status = status_of(handlers[op](event, LambdaContext()))
+        except Exception:
+            status = 599  # escaped the handler's own error handling
+        wall = time.perf_counter() - start
+        backend.metrics = None
+        results.setdefault(op, []).append(((wall - metrics.standin_seconds()) * 1000, wall * 1000, status, metrics))
+    return results
+
+
+def summarize(results, wall_seconds):
+    report = {"ops": {}, "requests": 0, "throughputPerSecond": 0.0}
+    for op, runs in sorted(results.items()):
+        latencies = [ms for ms, _, _, _ in runs]
+        calls = {}
+        for _, _, _, metrics in runs:
+            for name, count in metrics.calls.items():
+                calls[name] = calls.get(name, 0) + count
+        n = len(runs)
+        report["ops"][op] = {
+            "handler": OPS[op],
+            "requests": n,
+            "errors": sum(1 for _, _, status, _ in runs if status >= 500),
+            "clientErrors": sum(1 for _, _, status, _ in runs if 400 <= status < 500),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "wall_p95_ms": round(percentile([wall for _, wall, _, _ in runs], 95), 2),
+            "calls": round(sum(calls.values()) / n, 2),
+            "attempts": round(sum(m.attempts for *_, m in runs) / n, 2),
+            "throttled": sum(m.throttled for *_, m in runs),
+            "rcu": round(sum(m.rcu for *_, m in runs) / n, 2),
+            "wcu": round(sum(m.wcu for *_, m in runs) / n, 2),
+            "callsByOperation": {name: round(count / n, 2) for name, count in sorted(calls.items())},
+        }
+        report["requests"] += n
+    report["throughputPerSecond"] = round(report["requests"] / wall_seconds, 1) if wall_seconds else 0.0
+    return report
+
+
+def print_report(report):
+    columns = ("requests", "errors", "clientErrors", "p50_ms", "p95_ms", "p99_ms", "wall_p95_ms",
+               "calls", "attempts", "rcu", "wcu")
+    print(f"{'operation':<14}" + "".join(f"{c:>13}" for c in columns))
+    for op, row in report["ops"].items():
+        print(f"{op:<14}" + "".join(f"{row[c]:>13}" for c in columns))
+    print(f"\n{report['requests']} requests, {report['throughputPerSecond']} req/s (single in-process worker)")
+
+
+def regressions(report, baseline):
+    """Human-readable regressions of `report` against a stored baseline."""
+    found = []
+    for op, expected in baseline["ops"].items():
+        actual = report["ops"].get(op)
+        if actual is None:
+            found.append(f"{op}: not exercised")
+            continue
+        for metric in ("calls", "rcu", "wcu"):
+            limit = expected[metric] * (1 + USAGE_TOLERANCE) + 0.01
+            if actual[metric] > limit:
+                found.append(f"{op}: {metric} {actual[metric]} > {expected[metric]} (+{USAGE_TOLERANCE:.0%})")
+        if actual["errors"] > expected["errors"]:
+            found.append(f"{op}: errors {actual['errors']} > {expected['errors']}")
+        if actual["requests"] < LATENCY_MIN_SAMPLES:
+            continue
+        limit = max(expected["p95_ms"] * LATENCY_HEADROOM, expected["p95_ms"] + LATENCY_FLOOR_MS)
+        if actual["p95_ms"] > limit:
+            found.append(f"{op}: p95 {actual['p95_ms']}ms > {limit:.1f}ms")
+    return found
+
+
+def load_replay(path):
+    setup, events = None, []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "setup" in entry:
+                setup = entry["setup"]
+            elif entry.get("op") in OPS:
+                events.append(entry)
+            else:
+                raise SystemExit(f"{path}: unknown operation in {line.strip()[:80]}")
+    return setup, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=DEFAULT_SETUP["users"])
+    parser.add_argument("--items-per-user", type=int, default=DEFAULT_SETUP["itemsPerUser"],
+                        help="average; spread over users by a Zipf distribution")
+    parser.add_argument("--skew", type=float, default=DEFAULT_SETUP["skew"], help="Zipf exponent for users and tags")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SETUP["seed"])
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. list=50,view=50")
+    parser.add_argument("--latency", default="", help="ms per AWS call attempt, e.g. dynamodb=8,s3=20")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency jitter (uniform)")
+    parser.add_argument("--throttle", default="", help="throttle probability per attempt, e.g. dynamodb=0.02")
+    parser.add_argument("--record", metavar="PATH", help="write the generated setup and events as JSONL")
+    parser.add_argument("--replay", metavar="PATH", help="drive the events of a JSONL file instead")
+    parser.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the stored baseline")
+    parser.add_argument("--write-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    options = {"latency": args.latency, "throttle": args.throttle}
+    if args.replay:
+        setup, events = load_replay(args.replay)
+        options["replay"] = os.path.basename(args.replay)
+    else:
+        setup = {**DEFAULT_SETUP, "seed": args.seed, "users": args.users,
+                 "itemsPerUser": args.items_per_user, "skew": args.skew}
+        mix = parse_pairs(args.mix)
+        unknown = set(mix) - set(OPS)
+        if unknown:
+            parser.error(f"unknown operations in --mix: {', '.join(sorted(unknown))}")
+        options.update(requests=args.requests, mix=args.mix)
+    options["setup"] = setup
+
+    # Nothing to invoke asynchronously in the stand-in; derivatives are driven directly
+    config.DERIVATIVES_ENABLED = False
+    # Tracing hooks stay on as in production; only their per-request EMF lines are dropped from the report
+    tracing.emit = lambda doc: None
+    backend = Backend(parse_pairs(args.latency), args.jitter, parse_pairs(args.throttle), seed=args.seed).start()
+    try:
+        dataset = build_dataset(setup) if setup else None
+        uploads = seed_backend(dataset) if dataset else {}
+        if not args.replay:
+            events = EventGenerator(dataset, setup["seed"]).generate(args.requests, mix)
+        if args.record:
+            with open(args.record, "w") as f:
+                f.write(json.dumps({"setup": setup}) + "\n")
+                for entry in events:
+                    f.write(json.dumps(entry) + "\n")
+
+        start = time.perf_counter()
+        results = drive(events, backend, uploads)
+        report = summarize(results, time.perf_counter() - start)
+    finally:
+        backend.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": options, **report}, f, indent=2)
+
+    if args.write_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"options": options, "ops": {op: {k: row[k] for k in ("errors", "p95_ms", "calls", "rcu", "wcu")}
+                                                   for op, row in report["ops"].items()}},
+                      f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {os.path.relpath(BASELINE_FILE, ROOT)}")
+    elif args.check:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        if baseline["options"] != options:
+            print("Baseline was recorded with different options; rerun with the same ones or --write-baseline")
+            return 2
+        found = regressions(report, baseline)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Microbenchmark for the response envelope of large /list pages.
+
+Compares the previous path (json.dumps in success(), then json.loads /
+inject requestId / json.dumps again in with_request_id) with the current
+single render() pass, for every available JSON backend.
+
+Usage:
+    PYTHONPATH=. python benchmarks/response_bench.py [--items 50 200 1000] [--repeat 200]
+"""
+import argparse
+import json
+import time
+from decimal import Decimal
+
+from utils import response
+
+
+def list_page(n):
+    return {
+        "items": [
+            {
+                "mediaId": f"0b7c1f8e-{i:04d}-4c1a-9d2e-5f6a7b8c9d0e",
+                "s3Key": f"user-123/0b7c1f8e-{i:04d}-4c1a-9d2e-5f6a7b8c9d0e",
+                "status": "COMPLETED",
+                "requestId": "4f0e6f1c-2a6b-4d53-8f43-1f1d8c2b9a77",
+                "createdAt": 1730000000000 + i,
+                "modifiedAt": 1730000000000 + i,
+                "fileName": f"holiday_{i}.jpg",
+                "contentType": "image/jpeg",
+                "fileSize": Decimal(204800 + i),
+                "tags": ["beach", "sunset"],
+            }
+            for i in range(n)
+        ],
+        "nextCursor": "eyJrIjp7fX0.abcdef",
+    }
+
+
+def legacy_envelope(body, request_id):
+    # success() + the old decorator re-parse; Decimal needed a str fallback
+    rendered = {"statusCode": 200, "body": json.dumps(body, default=str)}
+    parsed = json.loads(rendered["body"])
+    parsed["requestId"] = request_id
+    rendered["body"] = json.dumps(parsed)
+    return rendered
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'variant':<16} {'ms/response':>12} {'speedup':>8}")
+    for n in args.items:
+        body = list_page(n)
+        baseline = timed(lambda: legacy_envelope(body, "req-1"), args.repeat)
+        print(f"{n:>6} {'legacy':<16} {baseline:>12.3f} {'1.00x':>8}")
+        for name, dumps in response.JSON_BACKENDS.items():
+            def current():
+                return {"statusCode": 200, "body": dumps(dict(body, requestId="req-1"))}
+            ms = timed(current, args.repeat)
+            print(f"{n:>6} {'render/' + name:<16} {ms:>12.3f} {baseline / ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
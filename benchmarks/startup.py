@@ -0,0 +1,163 @@
+"""
+Cold-start benchmark for every Lambda entry point declared in template.yaml.
+
+For each handler it measures, in a fresh interpreter:
+  - import_ms:        cumulative `python -X importtime` cost of the handler module
+  - first_invoke_ms:  first lambda_handler call with a request that gets past
+                      validation and auth (signed JWT, one S3 record, ...) and
+                      makes the handler's first AWS calls. Every call is
+                      answered by a stub in place of the HTTP send, so the
+                      session, credentials and client construction are timed
+                      without any network.
+
+Results are compared against benchmarks/startup_budget.json; the script exits
+non-zero when any handler exceeds its budget.
+
+Usage:
+    PYTHONPATH=. python benchmarks/startup.py [--runs 5] [--write-budget]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE = os.path.join(ROOT, "template.yaml")
+BUDGET_FILE = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+# Headroom applied to measurements when writing a new budget: enough for run-to-run
+# noise of the medians, small enough that an eagerly built client goes over
+BUDGET_HEADROOM = 1.25
+BUDGET_FLOOR_MS = 5.0  # absolute slack so sub-millisecond metrics are not flaky
+
+INVOKE_SNIPPET = """
+import io, json, time
+import jwt, config
+from botocore.awsrequest import AWSResponse
+from botocore.endpoint import Endpoint
+import {module} as handler
+
+class Body(io.BytesIO):
+    def stream(self, **kwargs):
+        yield self.getvalue()
+
+def send(self, request):
+    # Empty success for every operation: {{}} for DynamoDB's JSON protocol, no body for S3/Lambda
+    body = b"{{}}" if self._endpoint_prefix == "dynamodb" else b""
+    return AWSResponse(request.url, 200, {{"Content-Length": str(len(body))}}, Body(body))
+
+Endpoint._send = send
+token = jwt.encode({{"user_id": "startup-bench"}}, config.JWT_SECRET, algorithm=config.JWT_ALGO)
+event = json.loads({event!r}.replace("TOKEN", token))
+t0 = time.perf_counter()
+handler.lambda_handler(event, None)
+print(json.dumps({{"first_invoke_ms": (time.perf_counter() - t0) * 1000}}))
+"""
+
+
+def template_handlers():
+    """Return the `handlers/x.lambda_handler` entry points declared in template.yaml."""
+    with open(TEMPLATE) as f:
+        return sorted(set(re.findall(r"^\s*Handler:\s*(\S+)", f.read(), re.MULTILINE)))
+
+
+def sample_event(module):
+    """An event that reaches the handler's AWS calls; "TOKEN" becomes a signed JWT."""
+    name = module.rsplit(".", 1)[-1]
+    if name == "status_update_handler":
+        return {"Records": [{"eventName": "ObjectCreated:Put",
+                             "s3": {"bucket": {"name": "media-bucket"}, "object": {"key": "u/m", "size": 1}}}]}
+    if name == "derivative_handler":
+        return {"items": [{"userId": "u", "mediaId": "m", "s3Key": "u/m"}]}
+    if name in ("stats_repair_handler", "reaper_handler"):
+        return {"totalSegments": 1, "dryRun": True}
+
+    event = {"headers": {"Authorization": "Bearer TOKEN"}, "requestContext": {"requestId": "startup-bench"},
+             "pathParameters": {"mediaId": "m"}, "queryStringParameters": None}
+    if name == "upload_handler":
+        event["body"] = json.dumps({"contentType": "image/jpeg", "fileName": "a.jpg", "fileSize": 1})
+    elif name == "multipart_handler":
+        event["pathParameters"]["action"] = "abort"
+        event["body"] = json.dumps({"uploadId": "x"})
+    elif name == "search_handler":
+        event["queryStringParameters"] = {"tags": "a"}
+    elif name == "tags_handler":
+        event["body"] = json.dumps({"tags": ["a"]})
+    return event
+
+
+def run_python(args, env):
+    return subprocess.run(
+        [sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def measure(entry_point, env):
+    module = entry_point.rsplit(".", 1)[0].replace("/", ".")
+
+    # -X importtime writes "import time: self | cumulative | name" lines to stderr
+    out = run_python(["-X", "importtime", "-c", f"import {module}"], env)
+    import_us = 0
+    for line in out.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            import_us = int(parts[1])
+
+    snippet = INVOKE_SNIPPET.format(module=module, event=json.dumps(sample_event(module)))
+    timings = json.loads(run_python(["-c", snippet], env).stdout.strip().splitlines()[-1])
+    return {"import_ms": import_us / 1000, "first_invoke_ms": timings["first_invoke_ms"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per handler (median is used)")
+    parser.add_argument("--write-budget", action="store_true", help="store current results as the new budget")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    env.setdefault("AWS_ACCESS_KEY_ID", "test")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+
+    results = {}
+    for entry_point in template_handlers():
+        runs = [measure(entry_point, env) for _ in range(args.runs)]
+        results[entry_point] = {
+            metric: round(statistics.median(r[metric] for r in runs), 2)
+            for metric in ("import_ms", "first_invoke_ms")
+        }
+
+    if args.write_budget:
+        budget = {
+            entry_point: {
+                metric: round(max(value * BUDGET_HEADROOM, value + BUDGET_FLOOR_MS), 1)
+                for metric, value in metrics.items()
+            }
+            for entry_point, metrics in results.items()
+        }
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    budget = {}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as f:
+            budget = json.load(f)
+
+    failures = []
+    print(f"{'handler':<52} {'import_ms':>10} {'invoke_ms':>10}  budget")
+    for entry_point, metrics in results.items():
+        limits = budget.get(entry_point, {})
+        over = [m for m, v in metrics.items() if m in limits and v > limits[m]]
+        failures.extend(f"{entry_point} {m}={metrics[m]} > {limits[m]}" for m in over)
+        status = "OVER" if over else ("ok" if limits else "no budget")
+        print(f"{entry_point:<52} {metrics['import_ms']:>10.1f} {metrics['first_invoke_ms']:>10.2f}  {status}")
+
+    if failures:
+        print("\nStartup budget exceeded:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
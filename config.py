@@ -19,9 +19,105 @@ MEDIA_TABLE = os.getenv("MEDIA_TABLE", "MediaTable")
 # Auth
 JWT_SECRET = os.getenv("JWT_SECRET", "my-secret")
 JWT_ALGO = os.getenv("JWT_ALGO", "HS256")
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "1024"))
+JWT_CACHE_MAX_AGE_SECONDS = int(os.getenv("JWT_CACHE_MAX_AGE_SECONDS", "300"))  # upper bound for cached claims
+
+# Presigned URLs
+PRESIGNED_URL_EXPIRY_SECONDS = int(os.getenv("PRESIGNED_URL_EXPIRY_SECONDS", "300"))
+URL_CACHE_MAX_ENTRIES = int(os.getenv("URL_CACHE_MAX_ENTRIES", "10000"))
+# Cached download URLs are dropped this long before the presigned URL itself expires
+URL_CACHE_SAFETY_SECONDS = int(os.getenv("URL_CACHE_SAFETY_SECONDS", "60"))
+# Shared DynamoDB-backed URL cache (separate urlcache# items with a native TTL)
+DYNAMO_URL_CACHE_ENABLED = os.getenv("DYNAMO_URL_CACHE_ENABLED", "false").lower() == "true"
+
+# Pagination
+CURSOR_SECRET = os.getenv("CURSOR_SECRET", JWT_SECRET)  # signs opaque list cursors
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "50"))
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "200"))
+# Serve ?status= from the sparse GSI_StatusCreatedAt; "false" falls back to a FilterExpression
+STATUS_INDEX_ENABLED = os.getenv("STATUS_INDEX_ENABLED", "true").lower() == "true"
+
+# Tags: inverted index (tag#<tag>#<createdAt>#<mediaId> items) and /search
+MAX_TAGS_PER_MEDIA = int(os.getenv("MAX_TAGS_PER_MEDIA", "20"))
+MAX_TAG_LENGTH = int(os.getenv("MAX_TAG_LENGTH", "64"))
+MAX_SEARCH_TAGS = int(os.getenv("MAX_SEARCH_TAGS", "5"))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "200"))  # index entries read per query page
+
+# Per-user stats item (ADD-maintained counters) and quotas; 0 disables a quota
+MAX_MEDIA_PER_USER = int(os.getenv("MAX_MEDIA_PER_USER", "0"))
+MAX_BYTES_PER_USER = int(os.getenv("MAX_BYTES_PER_USER", "0"))
+STATS_REPAIR_SEGMENTS = int(os.getenv("STATS_REPAIR_SEGMENTS", "4"))  # parallel scan segments
+
+# Reaper: abandoned PENDING uploads and orphaned S3 objects (scheduled, resumable)
+REAPER_PENDING_MAX_AGE_SECONDS = int(os.getenv("REAPER_PENDING_MAX_AGE_SECONDS", "86400"))  # well past URL expiry
+REAPER_MULTIPART_MAX_AGE_SECONDS = int(os.getenv("REAPER_MULTIPART_MAX_AGE_SECONDS", "259200"))  # past the 2-day abort rule
+REAPER_ORPHAN_MIN_AGE_SECONDS = int(os.getenv("REAPER_ORPHAN_MIN_AGE_SECONDS", "86400"))   # younger objects are left alone
+REAPER_SEGMENTS = int(os.getenv("REAPER_SEGMENTS", "4"))                      # parallel scan segments
+REAPER_DELETES_PER_SECOND = float(os.getenv("REAPER_DELETES_PER_SECOND", "50"))  # per job; 0 = unlimited
+REAPER_TIME_MARGIN_SECONDS = int(os.getenv("REAPER_TIME_MARGIN_SECONDS", "30"))  # stop and checkpoint before timeout
+REAPER_MAX_RUN_SECONDS = int(os.getenv("REAPER_MAX_RUN_SECONDS", "840"))        # when run without a Lambda context
+
+# Batch operations
+MAX_FILES_PER_UPLOAD = int(os.getenv("MAX_FILES_PER_UPLOAD", "50"))
+MAX_BATCH_DELETE = int(os.getenv("MAX_BATCH_DELETE", "1000"))
+MAX_BATCH_VIEW = int(os.getenv("MAX_BATCH_VIEW", "100"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "5"))           # retries for unprocessed batch items
+BATCH_BACKOFF_BASE_SECONDS = float(os.getenv("BATCH_BACKOFF_BASE_SECONDS", "0.05"))
+
+# Multipart uploads (S3 allows 5 MiB - 5 GiB parts and at most 10,000 parts)
+MULTIPART_PART_SIZE_BYTES = int(os.getenv("MULTIPART_PART_SIZE_BYTES", str(8 * 1024 * 1024)))
+MULTIPART_MAX_FILE_SIZE_BYTES = int(os.getenv("MULTIPART_MAX_FILE_SIZE_BYTES", str(5 * 1024 ** 3)))
+MULTIPART_URL_EXPIRY_SECONDS = int(os.getenv("MULTIPART_URL_EXPIRY_SECONDS", "3600"))  # part URLs outlive slow uploads
+
+# Header probe run when an upload lands (ranged GETs only)
+MEDIA_PROBE_ENABLED = os.getenv("MEDIA_PROBE_ENABLED", "true").lower() == "true"
+MEDIA_PROBE_BYTES = int(os.getenv("MEDIA_PROBE_BYTES", "16384"))          # first read; also the read-ahead size
+MEDIA_PROBE_MAX_BYTES = int(os.getenv("MEDIA_PROBE_MAX_BYTES", "262144"))  # total bytes read per object
+
+# Derivatives (resized variants generated after an upload completes)
+DERIVATIVES_ENABLED = os.getenv("DERIVATIVES_ENABLED", "true").lower() == "true"
+DERIVATIVE_FUNCTION_NAME = os.getenv("DERIVATIVE_FUNCTION_NAME", "media-service-derivatives")
+DERIVATIVE_VARIANTS = os.getenv("DERIVATIVE_VARIANTS", "thumb:150,small:640,large:1080")  # name:maxWidth
+DERIVATIVE_FORMAT = os.getenv("DERIVATIVE_FORMAT", "WEBP")
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "80"))
+DERIVATIVE_MAX_WORKERS = int(os.getenv("DERIVATIVE_MAX_WORKERS", "0"))  # 0 = one per CPU
+
+# Status updates: max S3/SQS records processed concurrently per invocation
+STATUS_UPDATE_MAX_WORKERS = int(os.getenv("STATUS_UPDATE_MAX_WORKERS", "8"))
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")  # e.g. "EXIT=0.1,INSERT_MEDIA=0"; unlisted events are always kept
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2048"))
+
+# Tracing: one CloudWatch EMF metrics line per invocation (AWS call timings, capacity, spans)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "MediaService")
+
+# On-demand profiling (utils/profiling.py); off unless a sample rate or a header secret is set
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cpu")                 # cpu | memory | all, for sampled requests
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")                # signs X-Debug-Profile headers; empty disables them
+PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT", "/tmp/profiles")   # directory or s3://bucket/prefix
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))           # functions / allocation sites in the summary
+
+# Connections per boto3 client; raise it to at least CONTAINER_THREADS in container mode
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "10"))
+
+# Async fan-out (utils/aio.py): one event loop per process, blocking boto3 calls on a shared pool
+AIO_MAX_WORKERS = int(os.getenv("AIO_MAX_WORKERS", "10"))              # backend calls in flight per process
+AIO_BATCH_CONCURRENCY = int(os.getenv("AIO_BATCH_CONCURRENCY", "8"))  # items in flight per batch request
+
+# Container mode (container/server.py): every API route served by one pre-forked HTTP server
+CONTAINER_HOST = os.getenv("CONTAINER_HOST", "0.0.0.0")
+CONTAINER_PORT = int(os.getenv("CONTAINER_PORT", "8080"))
+CONTAINER_WORKERS = int(os.getenv("CONTAINER_WORKERS", "0"))        # processes; 0 = one per CPU
+CONTAINER_THREADS = int(os.getenv("CONTAINER_THREADS", "8"))        # concurrent requests per process
+CONTAINER_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("CONTAINER_GRACEFUL_TIMEOUT_SECONDS", "30"))
+CONTAINER_REQUEST_TIMEOUT_SECONDS = int(os.getenv("CONTAINER_REQUEST_TIMEOUT_SECONDS", "29"))  # as API Gateway
+CONTAINER_MAX_BODY_BYTES = int(os.getenv("CONTAINER_MAX_BODY_BYTES", str(10 * 1024 * 1024)))   # as API Gateway
+UPLOAD_QUEUE_URL = os.getenv("UPLOAD_QUEUE_URL", "")                # consumer input; empty = look up the name
+UPLOAD_QUEUE_NAME = os.getenv("UPLOAD_QUEUE_NAME", "media-upload-events")
 
 # Lambda config (for deployment)
 LAMBDA_ROLE = os.getenv("LAMBDA_ROLE", "arn:aws:iam::000000000000:role/lambda-role")
@@ -0,0 +1,209 @@
+"""
+HTTP front for the API handlers when the service runs as a long-lived
+container instead of one Lambda function per route.
+
+ROUTES mirrors the Api events of template.yaml. Each HTTP request becomes
+the API Gateway (REST, proxy integration) event the handlers already
+understand, the unchanged lambda_handler runs, and its proxy response is
+sent back. Everything the handlers and services keep at module level (the
+boto3 clients and their connection pools, the JWT claims cache, the URL
+caches) is shared by every request a process serves.
+
+`application` is a plain WSGI callable, so any WSGI server can host it,
+e.g. `gunicorn -w 4 --threads 8 container.router:application`;
+container/server.py is the built-in pre-fork server.
+"""
+import base64
+import importlib
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import config
+from utils.response import dumps
+from utils.logger import logger
+
+Route = namedtuple("Route", "method path handler pattern")
+
+
+def _route(method, path, handler):
+    # "/view/{mediaId}" -> ^/view/(?P<mediaId>[^/]+)$
+    pattern = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", path)
+    return Route(method, path, handler, re.compile(f"^{pattern}$"))
+
+
+# Same paths and methods as the Api events in template.yaml
+ROUTES = [
+    _route("POST", "/upload", "handlers.upload_handler"),
+    _route("POST", "/upload/{mediaId}/{action}", "handlers.multipart_handler"),
+    _route("GET", "/list", "handlers.list_handler"),
+    _route("GET", "/search", "handlers.search_handler"),
+    _route("GET", "/stats", "handlers.stats_handler"),
+    _route("PUT", "/tags/{mediaId}", "handlers.tags_handler"),
+    _route("GET", "/view/{mediaId}", "handlers.view_handler"),
+    _route("POST", "/view", "handlers.view_handler"),
+    _route("DELETE", "/delete/{mediaId}", "handlers.delete_handler"),
+    _route("POST", "/delete", "handlers.delete_handler"),
+]
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def load_handler(module):
+    """The module's lambda_handler, imported once per process."""
+    handler = _handlers.get(module)
+    if handler is None:
+        with _handlers_lock:
+            handler = _handlers.get(module)
+            if handler is None:
+                handler = _handlers[module] = importlib.import_module(module).lambda_handler
+    return handler
+
+
+def load_handlers():
+    """Import every routed handler up front (the pre-fork server does this once, before forking)."""
+    for route in ROUTES:
+        load_handler(route.handler)
+
+
+def match(method, path):
+    """(route, pathParameters) for a request, or (None, allowed methods) when nothing matches."""
+    allowed = []
+    for route in ROUTES:
+        found = route.pattern.match(path)
+        if found is None:
+            continue
+        if route.method == method:
+            return route, found.groupdict()
+        allowed.append(route.method)
+    return None, allowed
+
+
+class LambdaContext:
+    """The parts of the Lambda context object the handlers use."""
+
+    def __init__(self, function_name, request_id, timeout_seconds=None):
+        self.function_name = function_name
+        self.aws_request_id = request_id
+        self._deadline = time.monotonic() + (timeout_seconds or config.CONTAINER_REQUEST_TIMEOUT_SECONDS)
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def _headers(environ):
+    headers = {}
+    for name, value in environ.items():
+        if name.startswith("HTTP_"):
+            headers[name[5:].replace("_", "-").title()] = value
+        elif name in ("CONTENT_TYPE", "CONTENT_LENGTH") and value:
+            headers[name.replace("_", "-").title()] = value
+    return headers
+
+
+def to_event(route, path_parameters, environ, body, request_id):
+    """API Gateway REST proxy event for one WSGI request."""
+    method = environ["REQUEST_METHOD"].upper()
+    path = environ.get("PATH_INFO") or "/"
+    query = parse_qs(environ.get("QUERY_STRING", ""), keep_blank_values=True)
+    headers = _headers(environ)
+
+    is_base64 = False
+    if body is not None:
+        try:
+            body = body.decode("utf-8")
+        except UnicodeDecodeError:
+            body, is_base64 = base64.b64encode(body).decode("ascii"), True
+
+    return {
+        "resource": route.path,
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": {name: [value] for name, value in headers.items()},
+        "queryStringParameters": {k: v[-1] for k, v in query.items()} or None,
+        "multiValueQueryStringParameters": query or None,
+        "pathParameters": path_parameters or None,
+        "stageVariables": None,
+        "body": body,
+        "isBase64Encoded": is_base64,
+        "requestContext": {
+            "requestId": request_id,
+            "resourcePath": route.path,
+            "httpMethod": method,
+            "path": path,
+            "stage": "container",
+            "requestTimeEpoch": int(time.time() * 1000),
+            "identity": {"sourceIp": environ.get("REMOTE_ADDR")},
+        },
+    }
+
+
+def _read_body(environ):
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > config.CONTAINER_MAX_BODY_BYTES:
+        raise OverflowError(length)
+    return environ["wsgi.input"].read(length) if length > 0 else None
+
+
+def _respond(start_response, status_code, body=b"", headers=None):
+    headers = dict(headers or {})
+    headers.setdefault("Content-Type", "application/json")
+    headers["Content-Length"] = str(len(body))
+    try:
+        reason = HTTPStatus(status_code).phrase
+    except ValueError:
+        reason = "Unknown"
+    start_response(f"{status_code} {reason}", [(k, str(v)) for k, v in headers.items()])
+    return [body]
+
+
+def _error(start_response, status_code, message, headers=None):
+    return _respond(start_response, status_code, dumps({"message": message}).encode(), headers)
+
+
+def proxy_response(start_response, result):
+    """Send a handler's API Gateway proxy response."""
+    body = result.get("body") or ""
+    if result.get("isBase64Encoded"):
+        body = base64.b64decode(body)
+    elif isinstance(body, str):
+        body = body.encode("utf-8")
+    headers = dict(result.get("headers") or {})
+    for name, values in (result.get("multiValueHeaders") or {}).items():
+        headers.setdefault(name, ", ".join(str(v) for v in values))
+    return _respond(start_response, int(result.get("statusCode", 200)), body, headers)
+
+
+def application(environ, start_response):
+    """WSGI entry point serving every route of ROUTES."""
+    method = environ["REQUEST_METHOD"].upper()
+    route, found = match(method, environ.get("PATH_INFO") or "/")
+    if route is None:
+        if found:
+            return _error(start_response, 405, "Method Not Allowed", {"Allow": ", ".join(found)})
+        return _error(start_response, 404, "Not Found")
+
+    try:
+        body = _read_body(environ)
+    except OverflowError:
+        return _error(start_response, 413, "Request body too large")
+
+    request_id = str(uuid.uuid4())
+    try:
+        event = to_event(route, found, environ, body, request_id)
+        context = LambdaContext(route.handler.rsplit(".", 1)[-1], request_id)
+        result = load_handler(route.handler)(event, context)
+        return proxy_response(start_response, result)
+    except Exception as e:
+        # Handlers render their own failures; this is the router or a handler import failing
+        logger.exception({"event": "ROUTER_ERROR", "requestId": request_id, "path": route.path, "error": str(e)})
+        return _error(start_response, 500, "Internal server error")
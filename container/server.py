@@ -0,0 +1,195 @@
+"""
+Pre-fork HTTP server for container mode.
+
+    python -m container.server [--workers N] [--threads N] [--consumer]
+
+The master binds the listening socket, imports every routed handler once
+and forks the workers, which share the socket. Each worker serves
+container.router.application with a pool of CONTAINER_THREADS threads and
+builds its own boto3 clients after the fork. A worker that dies is
+replaced. With --consumer the master also forks the upload notification
+consumer (container/sqs_consumer.py), so one container covers the API and
+the status updates.
+
+SIGTERM or SIGINT stops accepting connections everywhere, lets in-flight
+requests and the current SQS batch finish, and kills whatever is still
+running after CONTAINER_GRACEFUL_TIMEOUT_SECONDS. --workers 0 serves from
+the current process without forking (local development).
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+from container import router  # noqa: E402
+from utils.aws_clients import reset_clients  # noqa: E402
+from utils.logger import logger  # noqa: E402
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Requests are logged by with_request_id; skip the access line on stderr."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGIServer on an already-listening socket, handling requests on a bounded thread pool."""
+
+    def __init__(self, sock, app, threads):
+        super().__init__(sock.getsockname()[:2], QuietRequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_name, self.server_port = sock.getsockname()[:2]
+        self.setup_environ()
+        self.set_app(app)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)  # in-flight requests finish
+
+
+def listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def serve_worker(sock, threads):
+    """Serve until SIGTERM, then drain. Runs in a forked worker or, without workers, in-process."""
+    server = PooledWSGIServer(sock, router.application, threads)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever, which is running on this very thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info({"event": "WORKER_STARTED", "pid": os.getpid(), "threads": threads})
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.server_close()
+        logger.info({"event": "WORKER_STOPPED", "pid": os.getpid()})
+
+
+def _fork(target, *args):
+    pid = os.fork()
+    if pid:
+        return pid
+    # Child: fresh clients, default signal handling until the target installs its own
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master forwards Ctrl-C as SIGTERM
+        reset_clients()
+        target(*args)
+    except Exception as e:
+        logger.exception({"event": "WORKER_FAILED", "pid": os.getpid(), "error": str(e)})
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _consume():
+    from container.sqs_consumer import run_consumer
+
+    run_consumer()
+
+
+def run(host, port, workers, threads, consumer=False):
+    """Master loop: fork, supervise, and on a stop signal drain and reap the children."""
+    sock = listen(host, port)
+    router.load_handlers()
+    logger.info({"event": "SERVER_STARTED", "host": host, "port": sock.getsockname()[1],
+                 "workers": workers, "threads": threads, "consumer": consumer})
+    if workers == 0:
+        serve_worker(sock, threads)
+        return
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+    roles = {}  # pid -> ("http" | "consumer")
+    for _ in range(workers):
+        roles[_fork(serve_worker, sock, threads)] = "http"
+    if consumer:
+        roles[_fork(_consume)] = "consumer"
+
+    while not stopping.is_set():
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid and pid in roles:
+            role = roles.pop(pid)
+            logger.error({"event": "WORKER_EXITED", "pid": pid, "role": role, "status": status})
+            if stopping.wait(1.0):  # a worker that dies on start must not turn into a fork loop
+                break
+            roles[_fork(serve_worker, sock, threads) if role == "http" else _fork(_consume)] = role
+            continue
+        stopping.wait(0.2)
+
+    logger.info({"event": "SERVER_STOPPING", "workers": len(roles)})
+    for pid in roles:
+        _signal(pid, signal.SIGTERM)
+    deadline = time.monotonic() + config.CONTAINER_GRACEFUL_TIMEOUT_SECONDS
+    while roles and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            roles.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in roles:
+        logger.warning({"event": "WORKER_KILLED", "pid": pid})
+        _signal(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    sock.close()
+    logger.info({"event": "SERVER_STOPPED"})
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default=config.CONTAINER_HOST)
+    parser.add_argument("--port", type=int, default=config.CONTAINER_PORT)
+    parser.add_argument("--workers", type=int, default=config.CONTAINER_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=config.CONTAINER_THREADS)
+    parser.add_argument("--consumer", action="store_true", help="also run the upload notification consumer")
+    args = parser.parse_args(argv)
+
+    # Every request thread, and every utils.aio pool thread, may hold a connection at once
+    config.AWS_MAX_POOL_CONNECTIONS = max(config.AWS_MAX_POOL_CONNECTIONS, args.threads + config.AIO_MAX_WORKERS)
+    run(args.host, args.port, args.workers, args.threads, args.consumer)
+
+
+if __name__ == "__main__":
+    main()
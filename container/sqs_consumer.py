@@ -0,0 +1,106 @@
+"""
+Upload notification consumer for container mode.
+
+    python -m container.sqs_consumer
+
+Long-polls the queue S3 sends ObjectCreated notifications to (the same
+MediaUploadQueue the status update Lambda is subscribed to) and hands each
+batch to the unchanged status_update_handler as an SQS event. Messages
+the handler reports in batchItemFailures stay on the queue and come back
+after their visibility timeout, just as with the Lambda event source
+mapping; the rest are deleted. SIGTERM lets the current batch finish.
+"""
+import signal
+import threading
+import uuid
+
+import config
+from container.router import LambdaContext
+from utils.aws_clients import get_sqs
+from utils.logger import logger
+
+MAX_MESSAGES = 10     # ReceiveMessage limit
+WAIT_SECONDS = 20     # long polling; also bounds how long a stop request can take
+ERROR_BACKOFF_SECONDS = 5
+
+
+def queue_url():
+    return config.UPLOAD_QUEUE_URL or get_sqs().get_queue_url(QueueName=config.UPLOAD_QUEUE_NAME)["QueueUrl"]
+
+
+def to_event(messages, url):
+    """SQS event, as the Lambda event source mapping delivers it."""
+    account, name = url.rstrip("/").split("/")[-2:]
+    source_arn = f"arn:aws:sqs:{config.REGION}:{account}:{name}"
+    return {"Records": [
+        {
+            "messageId": message["MessageId"],
+            "receiptHandle": message["ReceiptHandle"],
+            "body": message.get("Body", ""),
+            "attributes": message.get("Attributes", {}),
+            "messageAttributes": message.get("MessageAttributes", {}),
+            "md5OfBody": message.get("MD5OfBody"),
+            "eventSource": "aws:sqs",
+            "eventSourceARN": source_arn,
+            "awsRegion": config.REGION,
+        }
+        for message in messages
+    ]}
+
+
+def failed_ids(messages, result):
+    """Message ids to leave on the queue, from the handler's partial batch response."""
+    if isinstance(result, dict) and "batchItemFailures" in result:
+        return {failure["itemIdentifier"] for failure in result["batchItemFailures"]}
+    # Anything else (e.g. a rendered 500) means the batch as a whole failed
+    return {message["MessageId"] for message in messages}
+
+
+def process_batch(messages, url):
+    """Run one received batch through the status update handler. Returns (deleted, failed)."""
+    from handlers.status_update_handler import lambda_handler
+
+    request_id = str(uuid.uuid4())
+    event = to_event(messages, url)
+    event["requestId"] = request_id
+    result = lambda_handler(event, LambdaContext("status_update_handler", request_id))
+    failed = failed_ids(messages, result)
+
+    done = [m for m in messages if m["MessageId"] not in failed]
+    if done:
+        response = get_sqs().delete_message_batch(QueueUrl=url, Entries=[
+            {"Id": str(index), "ReceiptHandle": m["ReceiptHandle"]} for index, m in enumerate(done)
+        ])
+        if response.get("Failed"):
+            # Redelivered later; completing an upload twice is a no-op
+            logger.warning({"event": "SQS_DELETE_FAILED", "count": len(response["Failed"])})
+    return len(done), len(failed)
+
+
+def run_consumer(stop=None, url=None):
+    """Poll until `stop` is set (SIGTERM sets it when running in the main thread)."""
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    url = url or queue_url()
+    logger.info({"event": "CONSUMER_STARTED", "queueUrl": url})
+
+    while not stop.is_set():
+        try:
+            messages = get_sqs().receive_message(
+                QueueUrl=url, MaxNumberOfMessages=MAX_MESSAGES, WaitTimeSeconds=WAIT_SECONDS,
+                AttributeNames=["All"], MessageAttributeNames=["All"],
+            ).get("Messages", [])
+            if messages:
+                deleted, failed = process_batch(messages, url)
+                logger.info({"event": "CONSUMER_BATCH", "received": len(messages),
+                             "deleted": deleted, "failed": failed})
+        except Exception as e:
+            logger.exception({"event": "CONSUMER_ERROR", "error": str(e)})
+            stop.wait(ERROR_BACKOFF_SECONDS)
+    logger.info({"event": "CONSUMER_STOPPED"})
+
+
+if __name__ == "__main__":
+    run_consumer()
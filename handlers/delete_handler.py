@@ -1,9 +1,111 @@
+import json
+import config
+from utils import aio
 from utils.decorators import with_request_id
 from utils.jwt_utils import extract_jwt_claims
-from services.s3_service import delete_object
-from services.dynamo_service import delete_media
+from utils.common import parse_media_ids
+from services.s3_service import delete_object, delete_objects, delete_keys
+from services.dynamo_service import delete_media, batch_delete_media, batch_get_media, release_content_hash
+from services.derivatives import variant_keys
 from utils.response import success, failure
-from utils.errors import MediaServiceError, BadRequestError
+from utils.errors import MediaServiceError, BadRequestError, NotFoundError
+from utils.logger import logger
+
+
+def delete_variants(items):
+    """
+    Best-effort removal of the derivatives of deleted originals. Leftovers
+    are unreachable (their keys are only served through the media item).
+    """
+    keys = [key for item in items for key in variant_keys(item)]
+    if not keys:
+        return
+    try:
+        errors = delete_keys(keys)
+    except MediaServiceError as e:
+        errors = {"*": e.message}
+    if errors:
+        logger.warning({"event": "DELETE_VARIANTS_FAILED", "keys": len(keys), "errors": errors})
+
+
+async def release_object_async(user_id, item):
+    """
+    Drop a deleted record's reference to its stored object. Deduplicated
+    content is shared through a hash# item, so the object is only removed
+    with the last reference. Returns the deleted S3 key, or None if kept.
+    """
+    content_hash = item.get("contentHash")
+    if content_hash and not await aio.to_thread(release_content_hash, user_id, content_hash):
+        return None
+    owner_id, object_id = item["s3Key"].split("/", 1)
+    key, _ = await aio.gather(
+        aio.to_thread(delete_object, owner_id, object_id),
+        aio.to_thread(delete_variants, [item]),
+    )
+    return key
+
+
+def release_object(user_id, item):
+    """Blocking form of release_object_async."""
+    return aio.run(release_object_async(user_id, item))
+
+
+async def delete_batch_async(user_id, media_ids):
+    """
+    Delete many media items: BatchWriteItem on DynamoDB and DeleteObjects
+    on S3 run concurrently. Records sharing deduplicated content are
+    deleted one by one so their reference counts are released, up to
+    AIO_BATCH_CONCURRENCY at a time alongside the batch calls. Ids without
+    a record are reported as not found and leave S3 alone: their key may
+    be a deduplicated object that other records still share.
+    Returns one result entry per mediaId.
+    """
+    items = await aio.to_thread(batch_get_media, user_id, media_ids)
+    hashed = [m for m in media_ids if items.get(m, {}).get("contentHash")]
+    shared = set(hashed)
+    plain = [m for m in media_ids if m in items and m not in shared]
+
+    async def delete_plain():
+        if not plain:
+            return set(), {}
+        failed, errors, _ = await aio.gather(
+            aio.to_thread(batch_delete_media, user_id, plain, items),
+            aio.to_thread(delete_objects, user_id, plain),
+            aio.to_thread(delete_variants, [items[m] for m in plain]),
+        )
+        return set(failed), errors
+
+    async def delete_hashed(media_id):
+        item = await aio.to_thread(delete_media, user_id, media_id)
+        if item:
+            await release_object_async(user_id, item)
+
+    (db_failed, s3_errors), outcomes = await aio.gather(
+        delete_plain(),
+        aio.map_limited(delete_hashed, hashed, config.AIO_BATCH_CONCURRENCY, return_exceptions=True),
+    )
+    for media_id, outcome in zip(hashed, outcomes):
+        if isinstance(outcome, MediaServiceError):
+            s3_errors[media_id] = outcome.message
+        elif isinstance(outcome, Exception):
+            db_failed.add(media_id)
+
+    results = []
+    for media_id in media_ids:
+        if media_id not in items:
+            results.append({"mediaId": media_id, "status": "FAILED", "error": "Media not found"})
+        elif media_id in db_failed:
+            results.append({"mediaId": media_id, "status": "FAILED", "error": "Failed to delete metadata"})
+        elif media_id in s3_errors:
+            results.append({"mediaId": media_id, "status": "FAILED", "error": s3_errors[media_id]})
+        else:
+            results.append({"mediaId": media_id, "status": "DELETED"})
+    return results
+
+
+def delete_batch(user_id, media_ids):
+    """Blocking form of delete_batch_async."""
+    return aio.run(delete_batch_async(user_id, media_ids))
 
 
 @with_request_id
@@ -15,6 +117,23 @@ def lambda_handler(event, context):
         claims = extract_jwt_claims(event)
         user_id = claims.get("user_id")
 
+        # Batch delete: POST /delete {"mediaIds": [...]}
+        if event.get("httpMethod") == "POST":
+            try:
+                body = json.loads(event.get("body") or "{}")
+            except ValueError:
+                raise BadRequestError("Request body must be valid JSON")
+            media_ids = parse_media_ids(body, config.MAX_BATCH_DELETE)
+
+            results = delete_batch(user_id, media_ids)
+            deleted = sum(1 for r in results if r["status"] == "DELETED")
+            return success({
+                "results": results,
+                "deleted": deleted,
+                "failed": len(results) - deleted,
+                "requestId": request_id
+            })
+
         # Path param check
         path = event.get("pathParameters") or {}
         media_id = path.get("mediaId")
@@ -23,9 +142,18 @@ def lambda_handler(event, context):
 
         # Ensure exists & delete from DB
         item = delete_media(user_id, media_id)
+        if not item:
+            # Without a record the key may still be shared by deduplicated content
+            raise NotFoundError(f"Media not found for id={media_id}")
 
-        # Delete from S3
-        key = delete_object(user_id, media_id)
+        # Delete from S3 (shared deduplicated objects only with their last reference)
+        key = release_object(user_id, item)
+        if key is None:
+            return success({
+                "message": f"Deleted media {media_id}; stored object is still referenced",
+                "mediaId": media_id,
+                "requestId": request_id
+            })
 
         return success({
             "message": f"Deleted {key}",
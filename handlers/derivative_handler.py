@@ -0,0 +1,39 @@
+from services.derivatives import generate_derivatives
+from utils.decorators import with_request_id
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError
+from utils.logger import logger
+
+
+def parse_jobs(event):
+    """Asynchronous invoke payload from the status update handler: {"items": [{userId, mediaId, s3Key}]}."""
+    items = event.get("items")
+    if not isinstance(items, list):
+        raise BadRequestError("items must be an array")
+    jobs = []
+    for item in items:
+        if not isinstance(item, dict) or not all(item.get(k) for k in ("userId", "mediaId", "s3Key")):
+            raise BadRequestError("Each item needs userId, mediaId and s3Key")
+        jobs.append({"userId": item["userId"], "mediaId": item["mediaId"], "s3Key": item["s3Key"]})
+    return jobs
+
+
+@with_request_id
+def lambda_handler(event, context):
+    try:
+        jobs = parse_jobs(event)
+        if not jobs:
+            return success({"message": "No media to process", "results": {}})
+
+        results = generate_derivatives(jobs)
+        failed = sum(1 for r in results.values() if "error" in r)
+        logger.info({"event": "DERIVATIVES_GENERATED", "media": len(jobs), "failed": failed})
+        return success({"results": results, "failed": failed})
+
+    except MediaServiceError as e:
+        logger.warning({"event": "BUSINESS_ERROR", "error": e.message})
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+
+    except Exception as e:
+        logger.exception({"event": "UNEXPECTED_ERROR", "error": str(e)})
+        return failure("Failed to generate derivatives", 500, "InternalServiceError")
@@ -1,11 +1,47 @@
 from utils.decorators import with_request_id
 from utils.jwt_utils import extract_jwt_claims
-from services.dynamo_service import list_media
+from services.dynamo_service import list_media, MEDIA_FIELDS
 from utils.response import success, failure
 from utils.errors import MediaServiceError, BadRequestError
+import config
 
 
 ALLOWED_FILTERS = {"status", "mediaId", "createdAfter", "createdBefore"}
+PAGINATION_PARAMS = {"limit", "cursor", "order"}
+RESPONSE_PARAMS = {"fields"}
+ALLOWED_ORDERS = {"asc", "desc"}
+
+
+def parse_pagination(params):
+    """Validate limit / cursor / order query parameters."""
+    limit = config.LIST_DEFAULT_LIMIT
+    if "limit" in params:
+        try:
+            limit = int(params["limit"])
+        except ValueError:
+            raise BadRequestError("limit must be an integer")
+        if not 1 <= limit <= config.LIST_MAX_LIMIT:
+            raise BadRequestError(f"limit must be between 1 and {config.LIST_MAX_LIMIT}")
+
+    order = params.get("order")
+    if order is not None and order not in ALLOWED_ORDERS:
+        raise BadRequestError("order must be one of: asc, desc")
+
+    return limit, params.get("cursor") or None, order
+
+
+def parse_fields(params):
+    """
+    Optional sparse fieldset, e.g. fields=createdAt,status. mediaId is
+    always included. Returns the field names or None for all fields.
+    """
+    if not params.get("fields"):
+        return None
+    fields = [name.strip() for name in params["fields"].split(",") if name.strip()]
+    unknown = [name for name in fields if name not in MEDIA_FIELDS]
+    if unknown:
+        raise BadRequestError(f"Unsupported field: {unknown[0]} (allowed: {', '.join(MEDIA_FIELDS)})")
+    return ["mediaId"] + [name for name in dict.fromkeys(fields) if name != "mediaId"]
 
 
 @with_request_id
@@ -24,6 +60,8 @@ def lambda_handler(event, context):
         filters = {}
 
         for key, value in raw_filters.items():
+            if key in PAGINATION_PARAMS or key in RESPONSE_PARAMS:
+                continue
             if key not in ALLOWED_FILTERS:
                 raise BadRequestError(f"Unsupported filter: {key}")
 
@@ -35,11 +73,15 @@ def lambda_handler(event, context):
             else:
                 filters[key] = value
 
+        limit, cursor, order = parse_pagination(raw_filters)
+        fields = parse_fields(raw_filters)
+
         # Query DynamoDB
-        items = list_media(user_id, filters)
+        page = list_media(user_id, filters, limit=limit, cursor=cursor, order=order, fields=fields)
 
         return success({
-            "items": items,
+            "items": page["items"],
+            "nextCursor": page["nextCursor"],
             "requestId": request_id
         })
 
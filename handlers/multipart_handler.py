@@ -0,0 +1,123 @@
+import json
+from utils.decorators import with_request_id
+from utils.jwt_utils import extract_jwt_claims
+from services.s3_service import generate_part_urls, complete_multipart_upload, abort_multipart_upload
+from services.dynamo_service import get_media, delete_media
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError, NotFoundError
+from utils.logger import logger
+
+# POST /upload/{mediaId}/{action}
+ACTIONS = {"parts", "complete", "abort"}
+
+
+def _part_number(value, part_count):
+    if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= part_count:
+        raise BadRequestError(f"partNumber must be an integer between 1 and {part_count}")
+    return value
+
+
+def parse_part_numbers(body, part_count):
+    """partNumbers to re-sign, e.g. after their URLs expired or the PUT failed."""
+    numbers = body.get("partNumbers")
+    if not isinstance(numbers, list) or not numbers:
+        raise BadRequestError("partNumbers must be a non-empty array")
+    return sorted({_part_number(n, part_count) for n in numbers})
+
+
+def parse_parts(body, part_count):
+    """
+    Validate client-reported parts [{"partNumber", "eTag"}] and return
+    [(partNumber, eTag)] in ascending order. Every part must be listed once.
+    """
+    parts = body.get("parts")
+    if not isinstance(parts, list) or not parts:
+        raise BadRequestError("parts must be a non-empty array")
+
+    etags = {}
+    for part in parts:
+        if not isinstance(part, dict):
+            raise BadRequestError("Each part must be an object with partNumber and eTag")
+        number = _part_number(part.get("partNumber"), part_count)
+        etag = part.get("eTag")
+        if not isinstance(etag, str) or not etag.strip('"'):
+            raise BadRequestError(f"Missing eTag for part {number}")
+        if number in etags:
+            raise BadRequestError(f"Duplicate partNumber: {number}")
+        etags[number] = etag if etag.startswith('"') else f'"{etag}"'
+
+    if len(etags) != part_count:
+        missing = sorted(set(range(1, part_count + 1)) - set(etags))
+        raise BadRequestError(f"Missing parts: {missing[:10]}")
+    return sorted(etags.items())
+
+
+def load_upload(user_id, media_id, upload_id):
+    """Fetch the PENDING media record that owns `upload_id`."""
+    item = get_media(user_id, media_id)
+    if not item or item.get("uploadId") != upload_id:
+        raise NotFoundError(f"Multipart upload not found for id={media_id}")
+    if item.get("status") != "PENDING":
+        raise BadRequestError("Upload is already completed")
+    return item
+
+
+@with_request_id
+def lambda_handler(event, context):
+    request_id = event["requestId"]
+
+    try:
+        claims = extract_jwt_claims(event)
+        user_id = claims.get("user_id")
+
+        path = event.get("pathParameters") or {}
+        media_id = path.get("mediaId")
+        action = path.get("action")
+        if not media_id:
+            raise BadRequestError("Missing required path parameter: mediaId")
+        if action not in ACTIONS:
+            raise BadRequestError(f"action must be one of: {', '.join(sorted(ACTIONS))}")
+
+        try:
+            body = json.loads(event.get("body") or "{}")
+        except ValueError:
+            raise BadRequestError("Request body must be valid JSON")
+        if not isinstance(body, dict) or not body.get("uploadId"):
+            raise BadRequestError("Missing required field: uploadId")
+        upload_id = body["uploadId"]
+
+        item = load_upload(user_id, media_id, upload_id)
+        key = item["s3Key"]
+        part_count = int(item["partCount"])
+
+        if action == "parts":
+            numbers = parse_part_numbers(body, part_count)
+            urls = generate_part_urls(key, upload_id, numbers)
+            return success({
+                "mediaId": media_id,
+                "uploadId": upload_id,
+                "parts": [{"partNumber": n, "uploadUrl": url} for n, url in zip(numbers, urls)],
+                "requestId": request_id
+            })
+
+        if action == "complete":
+            parts = parse_parts(body, part_count)
+            complete_multipart_upload(key, upload_id, parts)
+            logger.info({"requestId": request_id, "step": "MULTIPART_COMPLETED", "mediaId": media_id,
+                         "parts": part_count})
+            # status flips to COMPLETED when the CompleteMultipartUpload event arrives
+            return success({"mediaId": media_id, "uploadId": upload_id, "status": "UPLOADED",
+                            "requestId": request_id})
+
+        abort_multipart_upload(key, upload_id)
+        delete_media(user_id, media_id)
+        logger.info({"requestId": request_id, "step": "MULTIPART_ABORTED", "mediaId": media_id})
+        return success({"mediaId": media_id, "uploadId": upload_id, "status": "ABORTED",
+                        "requestId": request_id})
+
+    except MediaServiceError as e:
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+    except Exception as e:
+        logger.error({"requestId": request_id, "step": "MULTIPART_HANDLER_EXCEPTION", "error": str(e)},
+                     exc_info=True)
+        return failure("Failed to process multipart upload", 500, "InternalServiceError")
@@ -0,0 +1,49 @@
+import time
+import config
+from services.reaper import JOBS, run_reaper
+from utils.decorators import with_request_id
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError
+from utils.logger import logger
+
+MAX_SEGMENTS = 64
+
+
+def parse_options(event):
+    """
+    Scheduled event or manual invoke, every field optional:
+    {"jobs": ["pending", "objects"], "totalSegments": 8, "dryRun": true}
+    """
+    jobs = event.get("jobs", list(JOBS))
+    if not isinstance(jobs, list) or not jobs or any(job not in JOBS for job in jobs):
+        raise BadRequestError(f"jobs must be a non-empty array of: {', '.join(JOBS)}")
+    segments = event.get("totalSegments", config.REAPER_SEGMENTS)
+    if not isinstance(segments, int) or isinstance(segments, bool) or not 1 <= segments <= MAX_SEGMENTS:
+        raise BadRequestError(f"totalSegments must be an integer between 1 and {MAX_SEGMENTS}")
+    return list(dict.fromkeys(jobs)), segments, event.get("dryRun") is True
+
+
+def run_deadline(context):
+    """Monotonic time at which to stop and checkpoint, leaving a margin before the Lambda timeout."""
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        budget = context.get_remaining_time_in_millis() / 1000 - config.REAPER_TIME_MARGIN_SECONDS
+    else:
+        budget = config.REAPER_MAX_RUN_SECONDS
+    return time.monotonic() + max(budget, 1)
+
+
+@with_request_id
+def lambda_handler(event, context):
+    try:
+        jobs, segments, dry_run = parse_options(event)
+        summary = run_reaper(jobs, segments, dry_run=dry_run, deadline=run_deadline(context))
+        logger.info({"event": "REAPER_RUN", "totalSegments": segments, **summary, "dryRun": dry_run})
+        return success({**summary, "dryRun": dry_run})
+
+    except MediaServiceError as e:
+        logger.warning({"event": "BUSINESS_ERROR", "error": e.message})
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+
+    except Exception as e:
+        logger.exception({"event": "UNEXPECTED_ERROR", "error": str(e)})
+        return failure("Failed to run reaper", 500, "InternalServiceError")
@@ -0,0 +1,63 @@
+from utils.decorators import with_request_id
+from utils.jwt_utils import extract_jwt_claims
+from utils.common import normalize_tag
+from services.tag_search import search_media, MODES
+from handlers.list_handler import parse_pagination
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError
+from utils.logger import logger
+import config
+
+
+def parse_search_tags(value):
+    """Comma-separated `tags` query parameter -> normalized, de-duplicated tags."""
+    tags = []
+    for raw in (value or "").split(","):
+        if not raw.strip():
+            continue
+        tag = normalize_tag(raw)
+        if tag is None:
+            raise BadRequestError(f"Invalid tag: {raw!r}")
+        tags.append(tag)
+    tags = list(dict.fromkeys(tags))
+    if not tags:
+        raise BadRequestError("Missing required parameter: tags")
+    if len(tags) > config.MAX_SEARCH_TAGS:
+        raise BadRequestError(f"At most {config.MAX_SEARCH_TAGS} tags are allowed per search")
+    return tags
+
+
+@with_request_id
+def lambda_handler(event, context):
+    request_id = event["requestId"]
+
+    try:
+        claims = extract_jwt_claims(event)
+        user_id = claims.get("user_id")
+        if not user_id:
+            raise BadRequestError("Invalid token: missing user_id")
+
+        # GET /search?tags=beach,sunset&mode=and|or
+        params = event.get("queryStringParameters") or {}
+        tags = parse_search_tags(params.get("tags"))
+        mode = params.get("mode", "and")
+        if mode not in MODES:
+            raise BadRequestError("mode must be one of: and, or")
+        limit, cursor, order = parse_pagination(params)
+
+        page = search_media(user_id, tags, mode, limit=limit, cursor=cursor, order=order)
+        logger.info({"requestId": request_id, "step": "TAG_SEARCH", "tags": len(tags), "mode": mode,
+                     "returned": len(page["items"])})
+
+        return success({
+            "items": page["items"],
+            "nextCursor": page["nextCursor"],
+            "requestId": request_id
+        })
+
+    except MediaServiceError as e:
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+    except Exception as e:
+        logger.error({"requestId": request_id, "step": "SEARCH_HANDLER_EXCEPTION", "error": str(e)},
+                     exc_info=True)
+        return failure("Failed to search media", 500, "InternalServiceError")
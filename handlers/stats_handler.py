@@ -0,0 +1,28 @@
+from utils.decorators import with_request_id
+from utils.jwt_utils import extract_jwt_claims
+from services.dynamo_service import get_stats
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError
+from utils.logger import logger
+
+
+@with_request_id
+def lambda_handler(event, context):
+    request_id = event["requestId"]
+
+    try:
+        claims = extract_jwt_claims(event)
+        user_id = claims.get("user_id")
+        if not user_id:
+            raise BadRequestError("Invalid token: missing user_id")
+
+        # One GetItem on the stats item instead of reading the partition
+        stats = get_stats(user_id)
+        return success({**stats, "requestId": request_id})
+
+    except MediaServiceError as e:
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+    except Exception as e:
+        logger.error({"requestId": request_id, "step": "STATS_HANDLER_EXCEPTION", "error": str(e)},
+                     exc_info=True)
+        return failure("Failed to load stats", 500, "InternalServiceError")
@@ -0,0 +1,33 @@
+import config
+from services.stats_repair import repair_stats
+from utils.decorators import with_request_id
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError
+from utils.logger import logger
+
+MAX_SEGMENTS = 64
+
+
+def parse_options(event):
+    """Scheduled event or manual invoke: {"totalSegments": 8, "dryRun": true}, both optional."""
+    segments = event.get("totalSegments", config.STATS_REPAIR_SEGMENTS)
+    if not isinstance(segments, int) or isinstance(segments, bool) or not 1 <= segments <= MAX_SEGMENTS:
+        raise BadRequestError(f"totalSegments must be an integer between 1 and {MAX_SEGMENTS}")
+    return segments, event.get("dryRun") is True
+
+
+@with_request_id
+def lambda_handler(event, context):
+    try:
+        segments, dry_run = parse_options(event)
+        summary = repair_stats(segments, dry_run=dry_run)
+        logger.info({"event": "STATS_REPAIRED", "totalSegments": segments, **summary, "dryRun": dry_run})
+        return success({**summary, "dryRun": dry_run})
+
+    except MediaServiceError as e:
+        logger.warning({"event": "BUSINESS_ERROR", "error": e.message})
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+
+    except Exception as e:
+        logger.exception({"event": "UNEXPECTED_ERROR", "error": str(e)})
+        return failure("Failed to repair stats", 500, "InternalServiceError")
@@ -1,56 +1,161 @@
 import json
-from services.dynamo_service import get_media, mark_media_completed
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import unquote_plus
+import config
+from services.dynamo_service import mark_media_completed, set_media_metadata
+from services.media_probe import probe_object
+from services.derivatives import is_variant_key, request_derivatives
+from utils.decorators import with_request_id
 from utils.response import success, failure
-from utils.errors import MediaServiceError
+from utils.errors import MediaServiceError, BadRequestError
 from utils.logger import logger
+from utils.tracing import bind
 
 
-def lambda_handler(event, context):
-    logger.info("StatusUpdate Lambda invoked")
+def parse_media_key(key):
+    """Split an S3 object key of the form userId/mediaId."""
+    parts = key.split("/", 1)
+    if len(parts) != 2 or not all(parts):
+        raise BadRequestError(f"Invalid S3 key format: {key}")
+    return parts
+
+
+def unwrap_records(event):
+    """
+    Group incoming S3 records into units of work.
+    Direct S3 notifications give one unit per record; SQS-wrapped
+    notifications give one unit per message so failures map onto
+    batchItemFailures. Returns (is_sqs, [(itemIdentifier, [s3_records])]).
+    """
+    records = event.get("Records", [])
+    if not records or records[0].get("eventSource") != "aws:sqs":
+        return False, [(None, [record]) for record in records]
+
+    units = []
+    for message in records:
+        try:
+            body = json.loads(message.get("body") or "{}")
+        except ValueError:
+            body = None
+        # s3:TestEvent and other non-record payloads carry no "Records"
+        s3_records = body.get("Records", []) if isinstance(body, dict) else None
+        units.append((message["messageId"], s3_records))
+    return True, units
+
+
+def process_s3_record(record):
+    """
+    Idempotently mark the media item behind one S3 record as COMPLETED.
+    Single PUTs (ObjectCreated:Put) and multipart uploads
+    (ObjectCreated:CompleteMultipartUpload) complete the same way; other
+    event types and derivative objects are ignored. Returns the derivative
+    job for a newly completed image, else None.
+    """
+    event_name = record.get("eventName", "ObjectCreated:Put")
+    key = unquote_plus(record["s3"]["object"]["key"])
+    bucket = record["s3"]["bucket"]["name"]
+    logger.debug({"event": "S3_RECORD", "bucket": bucket, "key": key, "eventName": event_name})
+
+    if not event_name.startswith("ObjectCreated:"):
+        logger.info({"event": "S3_RECORD_IGNORED", "key": key, "eventName": event_name})
+        return None
+    if is_variant_key(key):
+        return None
+
+    user_id, media_id = parse_media_key(key)
+    size = record["s3"]["object"].get("size")
+
+    # Conditional write first: redelivered and duplicate notifications stop here, before any S3 read
+    completed = mark_media_completed(user_id, media_id, None if size is None else {"actualFileSize": size})
+    if not completed:
+        logger.info({"event": "MEDIA_COMPLETED_SKIPPED", "userId": user_id, "mediaId": media_id,
+                     "reason": "missing or already COMPLETED"})
+        return None
+    logger.info({"event": "MEDIA_COMPLETED", "userId": user_id, "mediaId": media_id})
+
+    # Ranged header read: format, dimensions and orientation, stored with any mismatches in one write
+    metadata = probe_object(key, size)
     try:
-        logger.debug(f"Raw event: {json.dumps(event)}")
+        set_media_metadata(user_id, media_id, completed, metadata)
+    except Exception as e:
+        # A redelivery would stop at the completed record, so retrying cannot help; keep going
+        logger.warning({"event": "MEDIA_METADATA_FAILED", "userId": user_id, "mediaId": media_id,
+                        "error": str(e)})
 
-        records = event.get("Records", [])
-        if not records:
-            logger.warning("No S3 records found in event")
-            return success({"message": "No records to process"})
+    # Without probing the type is unknown; the derivative function skips non-images
+    if metadata.get("detectedContentType", "image/").startswith("image/"):
+        return {"userId": user_id, "mediaId": media_id, "s3Key": key}
+    return None
+
+
+def process_unit(unit, jobs=None):
+    """
+    Process every S3 record of one unit; returns the exception or None.
+    Derivative jobs of completed images are appended to `jobs`.
+    """
+    item_id, s3_records = unit
+    try:
+        if s3_records is None:
+            raise BadRequestError(f"Malformed SQS message: {item_id}")
+        for record in s3_records:
+            job = process_s3_record(record)
+            if job and jobs is not None:
+                jobs.append(job)
+        return None
+    except MediaServiceError as e:
+        logger.error({"event": "RECORD_FAILED", "itemIdentifier": item_id, "error": e.message})
+        return e
+    except Exception as e:
+        logger.exception({"event": "RECORD_FAILED", "itemIdentifier": item_id, "error": str(e)})
+        return e
 
-        for record in records:
-            key = record["s3"]["object"]["key"]
-            bucket = record["s3"]["bucket"]["name"]
 
-            logger.info(f"Processing S3 event: bucket={bucket}, key={key}")
+@with_request_id
+def lambda_handler(event, context):
+    try:
+        # Serialized (and capped) only when DEBUG is enabled
+        logger.debug({"event": "RAW_EVENT", "payload": event})
+
+        is_sqs, units = unwrap_records(event)
+        if not units:
+            logger.warning({"event": "NO_RECORDS"})
+            return success({"message": "No records to process"})
 
-            # Expect key format: userId/mediaId
-            parts = key.split("/", 1)
-            if len(parts) != 2:
-                logger.error(f"Invalid S3 key format: {key}")
-                return failure(f"Invalid S3 key format: {key}", 400, "BadRequest")
+        jobs = []
+        workers = max(1, min(config.STATUS_UPDATE_MAX_WORKERS, len(units)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            errors = list(pool.map(bind(partial(process_unit, jobs=jobs)), units))
 
-            user_id, media_id = parts
-            logger.debug(f"Extracted user_id={user_id}, media_id={media_id}")
+        # One asynchronous invoke for every image completed in this batch
+        request_derivatives(jobs)
 
-            # 🔎 Fetch the record first
-            item = get_media(user_id, media_id)
-            if not item:
-                logger.warning(f"No matching record found for key={key}")
-                continue
+        failed = [(unit[0], error) for unit, error in zip(units, errors) if error]
 
-            if item.get("status") == "COMPLETED":
-                logger.info(f"Media {media_id} already marked COMPLETED, skipping update")
-                continue
+        if is_sqs:
+            # Malformed messages and keys fail the same way on every redelivery: acknowledge them
+            for item_id, error in failed:
+                if isinstance(error, BadRequestError):
+                    logger.warning({"event": "RECORD_DISCARDED", "itemIdentifier": item_id, "error": error.message})
+            retry = [item_id for item_id, error in failed if not isinstance(error, BadRequestError)]
+            # Partial batch response: only retryable failures come back
+            logger.info({"event": "BATCH_PROCESSED", "messages": len(units), "failed": len(failed),
+                         "retried": len(retry)})
+            return {"batchItemFailures": [{"itemIdentifier": item_id} for item_id in retry]}
 
-            # ✅ Update only if not already completed
-            mark_media_completed(user_id, media_id)
-            logger.info(f"Marked mediaId={media_id} as COMPLETED for userId={user_id}")
+        if any(not isinstance(error, MediaServiceError) for _, error in failed):
+            return failure("Failed to update media status", 500, "InternalServiceError")
+        if failed:
+            error = failed[0][1]
+            return failure(error.message, error.code, error_type=error.__class__.__name__)
 
-        logger.info("All records processed successfully")
+        logger.info({"event": "BATCH_PROCESSED", "records": len(units), "failed": 0})
         return success({"message": "Media status updated"})
 
     except MediaServiceError as e:
-        logger.warning(f"Business error: {e.message}")
+        logger.warning({"event": "BUSINESS_ERROR", "error": e.message})
         return failure(e.message, e.code, error_type=e.__class__.__name__)
 
     except Exception as e:
-        logger.exception("Unexpected error while processing S3 event")
+        logger.exception({"event": "UNEXPECTED_ERROR", "error": str(e)})
         return failure("Failed to update media status", 500, "InternalServiceError")
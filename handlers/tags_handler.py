@@ -0,0 +1,50 @@
+import json
+import config
+from utils.decorators import with_request_id
+from utils.jwt_utils import extract_jwt_claims
+from utils.common import parse_tags
+from services.dynamo_service import set_media_tags
+from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError, NotFoundError
+from utils.logger import logger
+
+
+@with_request_id
+def lambda_handler(event, context):
+    request_id = event["requestId"]
+
+    try:
+        claims = extract_jwt_claims(event)
+        user_id = claims.get("user_id")
+
+        # PUT /tags/{mediaId} {"tags": [...]} replaces the media's tags
+        path = event.get("pathParameters") or {}
+        media_id = path.get("mediaId")
+        if not media_id:
+            raise BadRequestError("Missing required path parameter: mediaId")
+
+        try:
+            body = json.loads(event.get("body") or "{}")
+        except ValueError:
+            raise BadRequestError("Request body must be valid JSON")
+        if not isinstance(body, dict) or "tags" not in body:
+            raise BadRequestError("Missing required field: tags")
+        tags = parse_tags(body["tags"], config.MAX_TAGS_PER_MEDIA)
+
+        item = set_media_tags(user_id, media_id, tags)
+        if item is None:
+            raise NotFoundError(f"Media not found for id={media_id}")
+
+        return success({
+            "mediaId": media_id,
+            "tags": tags,
+            "modifiedAt": int(item["modifiedAt"]),
+            "requestId": request_id
+        })
+
+    except MediaServiceError as e:
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
+    except Exception as e:
+        logger.error({"requestId": request_id, "step": "TAGS_HANDLER_EXCEPTION", "error": str(e)},
+                     exc_info=True)
+        return failure("Failed to update tags", 500, "InternalServiceError")
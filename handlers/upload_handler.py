@@ -1,12 +1,22 @@
+import base64
 import json
+import math
 import time
 import re
+import uuid
+import config
 from utils.decorators import with_request_id
 from utils.jwt_utils import extract_jwt_claims
-from services.s3_service import generate_upload_url
-from services.dynamo_service import insert_media
+from services.s3_service import (
+    generate_upload_url, create_multipart_upload, generate_part_urls,
+    MIN_PART_SIZE_BYTES, MAX_PART_SIZE_BYTES, MAX_PARTS,
+)
+from services.dynamo_service import (
+    insert_media, batch_insert_media, build_media_item, get_content_hash, insert_media_with_hash, get_stats,
+)
+from utils.common import parse_tags
 from utils.response import success, failure
-from utils.errors import MediaServiceError, BadRequestError
+from utils.errors import MediaServiceError, BadRequestError, QuotaExceededError
 from utils.logger import logger
 
 # Allowed MIME types
@@ -18,6 +28,7 @@ ALLOWED_CONTENT_TYPES = {
 }
 # Max file size: 100 MB
 MAX_FILE_SIZE_BYTES = 100 * 1024 * 1024
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
 
 
 def sanitize_filename(filename: str) -> str:
@@ -35,15 +46,224 @@ def sanitize_filename(filename: str) -> str:
     return safe_name[:255]  # limit length for S3 compatibility
 
 
+def validate_file(descriptor: dict, max_size: int = MAX_FILE_SIZE_BYTES):
+    """
+    Validate one file descriptor (contentType, fileSize).
+    Raises BadRequestError with the first problem found.
+    """
+    if not isinstance(descriptor, dict):
+        raise BadRequestError("Invalid file descriptor: must be an object")
+
+    content_type = descriptor.get("contentType")
+    file_size = descriptor.get("fileSize")  # expected from client (bytes)
+
+    if not content_type:
+        raise BadRequestError("Missing required field: contentType")
+
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise BadRequestError(f"Unsupported content type: {content_type}")
+
+    if file_size is None:
+        raise BadRequestError("Missing required field: fileSize")
+
+    if not isinstance(file_size, int) or file_size <= 0:
+        raise BadRequestError("Invalid fileSize: must be a positive integer (bytes)")
+
+    if file_size > max_size:
+        raise BadRequestError(f"File size exceeds the maximum limit of {max_size // (1024 * 1024)} MB")
+
+
+def parse_sha256(descriptor: dict):
+    """Optional client-supplied SHA-256 of the file, as 64 hex characters."""
+    sha256 = descriptor.get("sha256")
+    if sha256 is None:
+        return None
+    if not isinstance(sha256, str) or not SHA256_PATTERN.match(sha256.lower()):
+        raise BadRequestError("Invalid sha256: must be 64 hexadecimal characters")
+    if descriptor.get("multipart") is True:
+        raise BadRequestError("sha256 is not supported for multipart uploads")
+    return sha256.lower()
+
+
+def plan_parts(descriptor: dict):
+    """
+    Resolve (part_size, part_count) for a multipart upload.
+    Clients may request a partSize; otherwise MULTIPART_PART_SIZE_BYTES is used.
+    """
+    part_size = descriptor.get("partSize", config.MULTIPART_PART_SIZE_BYTES)
+    if not isinstance(part_size, int) or not MIN_PART_SIZE_BYTES <= part_size <= MAX_PART_SIZE_BYTES:
+        raise BadRequestError(
+            f"Invalid partSize: must be an integer between {MIN_PART_SIZE_BYTES} and {MAX_PART_SIZE_BYTES} bytes"
+        )
+
+    part_count = math.ceil(descriptor["fileSize"] / part_size)
+    if part_count > MAX_PARTS:
+        raise BadRequestError(f"partSize too small: upload would need more than {MAX_PARTS} parts")
+    return part_size, part_count
+
+
+def check_quota(user_id: str, descriptors: list):
+    """
+    Reject a request that would take the user past MAX_MEDIA_PER_USER or
+    MAX_BYTES_PER_USER. Reads the single stats item, never the partition.
+    """
+    if not config.MAX_MEDIA_PER_USER and not config.MAX_BYTES_PER_USER:
+        return
+    stats = get_stats(user_id)
+    sizes = [d.get("fileSize") for d in descriptors if isinstance(d, dict)]
+    new_bytes = sum(size for size in sizes if isinstance(size, int) and size > 0)
+
+    if config.MAX_MEDIA_PER_USER and stats["mediaCount"] + len(descriptors) > config.MAX_MEDIA_PER_USER:
+        raise QuotaExceededError(f"Media limit of {config.MAX_MEDIA_PER_USER} items reached")
+    if config.MAX_BYTES_PER_USER and stats["totalBytes"] + new_bytes > config.MAX_BYTES_PER_USER:
+        raise QuotaExceededError(f"Storage limit of {config.MAX_BYTES_PER_USER} bytes reached")
+
+
+def prepare_upload(user_id: str, descriptor: dict, request_id: str, timestamp: int, dedup: bool = True):
+    """
+    Validate a descriptor, presign its PUT URL (or start a multipart upload
+    and presign every part when "multipart" is set) and collect its metadata.
+    With a sha256 whose content the user already stored, nothing is signed:
+    the record points at the existing object and is COMPLETED right away.
+    Returns (response entry, media record kwargs for insert_media).
+    """
+    multipart = isinstance(descriptor, dict) and descriptor.get("multipart") is True
+    validate_file(descriptor, config.MULTIPART_MAX_FILE_SIZE_BYTES if multipart else MAX_FILE_SIZE_BYTES)
+    sha256 = parse_sha256(descriptor)
+
+    content_type = descriptor["contentType"]
+    sanitized_filename = sanitize_filename(descriptor.get("fileName", ""))
+    caption = descriptor.get("caption", "")
+    tags = parse_tags(descriptor.get("tags"), config.MAX_TAGS_PER_MEDIA)
+    location = descriptor.get("location", None)
+    visibility = descriptor.get("visibility", "PUBLIC")
+
+    existing = get_content_hash(user_id, sha256) if sha256 and dedup else None
+    status = "PENDING"
+
+    if existing and existing.get("status") == "COMPLETED":
+        media_id, key = str(uuid.uuid4()), existing["s3Key"]
+        upload = {"deduplicated": True}
+        status = "COMPLETED"
+        multipart_fields = {}
+    elif multipart:
+        part_size, part_count = plan_parts(descriptor)
+        media_id, key, upload_id = create_multipart_upload(user_id, content_type, request_id)
+        part_urls = generate_part_urls(key, upload_id, range(1, part_count + 1))
+        upload = {
+            "uploadId": upload_id,
+            "partSize": part_size,
+            "parts": [{"partNumber": n, "uploadUrl": url} for n, url in enumerate(part_urls, start=1)],
+        }
+        multipart_fields = dict(upload_id=upload_id, part_size=part_size, part_count=part_count)
+    else:
+        # Generate presigned URL
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode() if sha256 else None
+        media_id, key, url = generate_upload_url(user_id, content_type, request_id, checksum)
+        upload = {"uploadUrl": url}
+        if checksum:
+            upload["uploadHeaders"] = {"Content-Type": content_type, "x-amz-checksum-sha256": checksum}
+        multipart_fields = {}
+
+    record = dict(
+        user_id=user_id,
+        media_id=media_id,
+        s3_key=key,
+        request_id=request_id,
+        status=status,
+        caption=caption,
+        tags=tags,
+        location=location,
+        visibility=visibility,
+        content_type=content_type,
+        file_size=descriptor["fileSize"],
+        file_name=sanitized_filename,
+        created_at=timestamp,
+        modified_at=timestamp,
+        created_by=user_id,
+        modified_by=user_id,
+        content_hash=sha256,
+        **multipart_fields
+    )
+
+    entry = {
+        **upload,
+        "mediaId": media_id,
+        "fileName": sanitized_filename,
+        "caption": caption,
+        "tags": tags,
+        "location": location,
+        "visibility": visibility
+    }
+    return entry, record
+
+
+def save_hashed_upload(user_id: str, descriptor: dict, request_id: str, timestamp: int, entry: dict, record: dict):
+    """
+    Persist a record carrying contentHash together with its hash# reference.
+    If a deduplicated write lost its hash item to a concurrent delete, fall
+    back to a regular checksummed upload. Returns the final response entry.
+    """
+    if insert_media_with_hash(build_media_item(**record), entry.get("deduplicated", False)):
+        return entry
+    entry, record = prepare_upload(user_id, descriptor, request_id, timestamp, dedup=False)
+    insert_media_with_hash(build_media_item(**record), False)
+    return entry
+
+
+def upload_many(user_id: str, files: list, request_id: str):
+    """
+    Multi-file upload session: presign every valid file in-process and write
+    all records with one BatchWriteItem pass. Files with a sha256 are
+    written one by one, since each needs a transaction with its hash# item.
+    Returns per-file results.
+    """
+    if not isinstance(files, list) or not files:
+        raise BadRequestError("files must be a non-empty array")
+    if len(files) > config.MAX_FILES_PER_UPLOAD:
+        raise BadRequestError(f"At most {config.MAX_FILES_PER_UPLOAD} files are allowed per request")
+    check_quota(user_id, files)
+
+    timestamp = int(time.time())
+    results = []
+    items = []
+    for index, descriptor in enumerate(files):
+        try:
+            entry, record = prepare_upload(user_id, descriptor, request_id, timestamp)
+        except BadRequestError as e:
+            results.append({"index": index, "error": e.message, "type": e.__class__.__name__})
+            continue
+
+        if not record["content_hash"]:
+            results.append({"index": index, **entry})
+            items.append(build_media_item(**record))
+            continue
+        try:
+            entry = save_hashed_upload(user_id, descriptor, request_id, timestamp, entry, record)
+            results.append({"index": index, **entry})
+        except MediaServiceError:
+            results.append({"index": index, "error": "Failed to save media metadata", "type": "InternalServiceError"})
+
+    failed = set(batch_insert_media(items)) if items else set()
+    for i, entry in enumerate(results):
+        if entry.get("mediaId") in failed:
+            results[i] = {
+                "index": entry["index"],
+                "error": "Failed to save media metadata",
+                "type": "InternalServiceError",
+            }
+    return results
+
+
 @with_request_id
 def lambda_handler(event, context):
     request_id = event["requestId"]
     try:
-        logger.info({"requestId": request_id, "event": "START_UPLOAD_HANDLER", "details": event})
+        logger.debug({"requestId": request_id, "event": "START_UPLOAD_HANDLER", "details": event})
 
         # Extract claims
         claims = extract_jwt_claims(event)
-        logger.info({"requestId": request_id, "step": "JWT_EXTRACTED", "claims": claims})
+        logger.debug({"requestId": request_id, "step": "JWT_EXTRACTED", "userId": claims.get("user_id")})
 
         user_id = claims.get("user_id")
         if not user_id:
@@ -51,66 +271,31 @@ def lambda_handler(event, context):
 
         # Parse body
         body = json.loads(event.get("body", "{}"))
-        content_type = body.get("contentType")
-        file_size = body.get("fileSize")  # expected from client (bytes)
-        original_filename = body.get("fileName", "")
-        caption = body.get("caption", "")
-        tags = body.get("tags", [])
-        location = body.get("location", None)
-        visibility = body.get("visibility", "PUBLIC")
 
-        sanitized_filename = sanitize_filename(original_filename)
-        timestamp = int(time.time())
+        # Multi-file upload session
+        if "files" in body:
+            results = upload_many(user_id, body["files"], request_id)
+            return success({
+                "files": results,
+                "requestId": request_id,
+                "userId": user_id
+            })
 
         # === VALIDATIONS ===
-        if not content_type:
-            return failure("Missing required field: contentType", 400, "BadRequestError")
-
-        if content_type not in ALLOWED_CONTENT_TYPES:
-            return failure(f"Unsupported content type: {content_type}", 400, "BadRequestError")
-
-        if file_size is None:
-            return failure("Missing required field: fileSize", 400, "BadRequestError")
-
-        if not isinstance(file_size, int) or file_size <= 0:
-            return failure("Invalid fileSize: must be a positive integer (bytes)", 400, "BadRequestError")
-
-        if file_size > MAX_FILE_SIZE_BYTES:
-            return failure("File size exceeds the maximum limit of 100 MB", 400, "BadRequestError")
-
-        # Generate presigned URL
-        media_id, key, url = generate_upload_url(user_id, content_type, request_id)
+        check_quota(user_id, [body])
+        entry, record = prepare_upload(user_id, body, request_id, int(time.time()))
 
         # Insert metadata into DynamoDB
-        insert_media(
-            user_id=user_id,
-            media_id=media_id,
-            s3_key=key,
-            request_id=request_id,
-            status="PENDING",
-            caption=caption,
-            tags=tags,
-            location=location,
-            visibility=visibility,
-            content_type=content_type,
-            file_size=file_size,
-            file_name=sanitized_filename,
-            created_at=timestamp,
-            modified_at=timestamp,
-            created_by=user_id,
-            modified_by=user_id
-        )
+        if record["content_hash"]:
+            entry = save_hashed_upload(user_id, body, request_id, record["created_at"], entry, record)
+        else:
+            insert_media(**record)
 
+        # uploadUrl, or uploadId/partSize/parts for multipart uploads
         response_payload = {
-            "uploadUrl": url,
-            "mediaId": media_id,
+            **entry,
             "requestId": request_id,
             "userId": user_id,
-            "fileName": sanitized_filename,
-            "caption": caption,
-            "tags": tags,
-            "location": location,
-            "visibility": visibility
         }
 
         return success(response_payload)
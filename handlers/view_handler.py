@@ -1,10 +1,102 @@
+import json
+import config
 from utils.decorators import with_request_id
 from utils.jwt_utils import extract_jwt_claims
-from services.s3_service import generate_download_url
-from services.dynamo_service import get_media, cache_presigned_url, get_cached_presigned_url
+from utils.cache import TTLCache
+from utils.common import parse_media_ids
+from services.s3_service import generate_download_url, generate_download_urls
+from services.dynamo_service import get_media, batch_get_media, cache_presigned_url, get_cached_presigned_url
+from services.derivatives import ORIGINAL, VARIANT_NAMES, choose_variant
 from utils.response import success, failure
+from utils.errors import MediaServiceError, BadRequestError
 from utils.logger import logger
 
+# Process-level cache of download URLs keyed by (userId, mediaId[, variant]); survives warm invocations
+URL_CACHE_TTL_SECONDS = config.PRESIGNED_URL_EXPIRY_SECONDS - config.URL_CACHE_SAFETY_SECONDS
+url_cache = TTLCache(config.URL_CACHE_MAX_ENTRIES, URL_CACHE_TTL_SECONDS)
+
+
+def parse_variant_request(params):
+    """
+    Read the optional `variant` (a configured name or "original") or
+    `maxWidth` (pixels) selector. Returns (variant, max_width).
+    """
+    variant = params.get("variant")
+    max_width = params.get("maxWidth")
+    if variant is not None and variant != ORIGINAL and variant not in VARIANT_NAMES:
+        names = ", ".join(sorted(VARIANT_NAMES | {ORIGINAL}))
+        raise BadRequestError(f"variant must be one of: {names}")
+    if max_width is not None:
+        if variant is not None:
+            raise BadRequestError("Use either variant or maxWidth, not both")
+        if isinstance(max_width, bool) or not str(max_width).isdigit() or int(max_width) < 1:
+            raise BadRequestError("maxWidth must be a positive integer")
+        max_width = int(max_width)
+    return variant, max_width
+
+
+def _cache_key(user_id, media_id, variant):
+    return (user_id, media_id) if variant == ORIGINAL else (user_id, media_id, variant)
+
+
+def resolve_download_url(user_id, media_id, s3_key=None, variant=ORIGINAL):
+    """
+    Return (url, source) for a media item, where source is LOCAL_CACHE,
+    DYNAMO_CACHE or PRESIGNED. Only a fresh presign populates the caches.
+    `s3_key` is the object to serve: the item's original (which
+    deduplicated media share) or one of its `variant` objects. Only
+    originals are cached in DynamoDB.
+    """
+    cache_key = _cache_key(user_id, media_id, variant)
+    url = url_cache.get(cache_key)
+    if url:
+        return url, "LOCAL_CACHE"
+
+    dynamo_cache = config.DYNAMO_URL_CACHE_ENABLED and variant == ORIGINAL
+    if dynamo_cache:
+        url = get_cached_presigned_url(user_id, media_id)
+        if url:
+            return url, "DYNAMO_CACHE"
+
+    url = generate_download_url(user_id, media_id, s3_key)
+    url_cache.set(cache_key, url)
+    if dynamo_cache:
+        cache_presigned_url(user_id, media_id, url, ttl_seconds=URL_CACHE_TTL_SECONDS)
+    return url, "PRESIGNED"
+
+
+def view_batch(user_id, media_ids, variant=None, max_width=None):
+    """
+    Resolve download URLs for many media items with one BatchGetItem pass.
+    Cache misses are presigned together in a single presign_many call.
+    Returns ({mediaId: url}, {mediaId: {"error", "type"}}, {mediaId: variant served}).
+    """
+    items = batch_get_media(user_id, media_ids)
+
+    urls, errors, served, to_sign = {}, {}, {}, []
+    for media_id in media_ids:
+        item = items.get(media_id)
+        if not item:
+            errors[media_id] = {"error": f"Media not found for id={media_id}", "type": "NotFound"}
+        elif item.get("status") != "COMPLETED":
+            errors[media_id] = {"error": "Media not ready for viewing", "type": "Forbidden"}
+        else:
+            name, key = choose_variant(item, variant, max_width)
+            served[media_id] = name
+            url = url_cache.get(_cache_key(user_id, media_id, name))
+            if url:
+                urls[media_id] = url
+            else:
+                to_sign.append((media_id, key or f"{user_id}/{media_id}"))
+
+    if to_sign:
+        fresh = generate_download_urls([key for _, key in to_sign])
+        for (media_id, _), url in zip(to_sign, fresh):
+            urls[media_id] = url
+            url_cache.set(_cache_key(user_id, media_id, served[media_id]), url)
+    return urls, errors, served
+
+
 @with_request_id
 def lambda_handler(event, context):
     request_id = event["requestId"]
@@ -14,11 +106,27 @@ def lambda_handler(event, context):
         claims = extract_jwt_claims(event)
         user_id = claims.get("user_id")
 
+        # Batch view: POST /view {"mediaIds": [...]}
+        if event.get("httpMethod") == "POST":
+            try:
+                body = json.loads(event.get("body") or "{}")
+            except ValueError:
+                raise BadRequestError("Request body must be valid JSON")
+            media_ids = parse_media_ids(body, config.MAX_BATCH_VIEW)
+            variant, max_width = parse_variant_request(body)
+
+            urls, errors, served = view_batch(user_id, media_ids, variant, max_width)
+            logger.info({"requestId": request_id, "step": "BATCH_VIEW", "resolved": len(urls),
+                         "errors": len(errors), "urlCache": url_cache.stats})
+            return success({"urls": urls, "errors": errors, "variants": served, "requestId": request_id})
+
         # Validate input
         params = event.get("pathParameters") or {}
-        media_id = params.get("mediaId") or (event.get("queryStringParameters") or {}).get("mediaId")
+        query = event.get("queryStringParameters") or {}
+        media_id = params.get("mediaId") or query.get("mediaId")
         if not media_id:
             return failure("Missing required parameter: mediaId", 400, "BadRequest")
+        variant, max_width = parse_variant_request(query)
 
         # Fetch from Dynamo
         item = get_media(user_id, media_id)
@@ -28,18 +136,18 @@ def lambda_handler(event, context):
         if item.get("status") != "COMPLETED":
             return failure("Media not ready for viewing", 403, "Forbidden")
 
-        # 🔥 Try cached presigned URL first
-        cached = get_cached_presigned_url(item)
-        if cached:
-            logger.info({"requestId": request_id, "step": "CACHE_HIT", "mediaId": media_id})
-            return success({"downloadUrl": cached, "requestId": request_id})
+        # Smallest adequate derivative, or the original until variants exist
+        name, key = choose_variant(item, variant, max_width)
 
-        # Otherwise generate new presigned URL
-        url = generate_download_url(user_id, media_id)
-        cache_presigned_url(user_id, media_id, url, ttl_seconds=300)
+        # 🔥 Cached URL first, presign only on a miss
+        url, source = resolve_download_url(user_id, media_id, key, name)
+        logger.info({"requestId": request_id, "step": source, "mediaId": media_id, "variant": name,
+                     "urlCache": url_cache.stats})
 
-        return success({"downloadUrl": url, "requestId": request_id})
+        return success({"downloadUrl": url, "variant": name, "requestId": request_id})
 
+    except MediaServiceError as e:
+        return failure(e.message, e.code, error_type=e.__class__.__name__)
     except Exception as e:
         logger.error({"requestId": request_id, "error": str(e)}, exc_info=True)
         return failure("Failed to generate download URL", 500, "InternalServiceError")
@@ -0,0 +1,189 @@
+"""
+Resized variants ("derivatives") of uploaded images.
+
+When an upload completes, the status update handler hands the new object
+to the derivative function (asynchronous Lambda invoke). That function
+streams each original to /tmp, renders every configured variant narrower
+than the original on a process pool, stores them under
+variants/<s3Key>/<name>.<ext> and records them on the media item:
+
+    variants = {"thumb": {"key": ..., "width": 150, "height": 113, "size": 5120}, ...}
+
+The view handler then serves the smallest adequate variant. Pillow is an
+optional dependency, imported only where images are actually rendered.
+"""
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import config
+from utils.aws_clients import get_lambda
+from utils.errors import MediaServiceError
+from utils.logger import logger
+
+VARIANT_PREFIX = "variants/"
+ORIGINAL = "original"
+
+FORMAT_CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+FORMAT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}
+
+
+def parse_variants(spec):
+    """'thumb:150,small:640' -> [("thumb", 150), ("small", 640)], narrowest first."""
+    variants = {}
+    for part in (spec or "").split(","):
+        name, _, width = part.strip().partition(":")
+        if name and name != ORIGINAL and width.isdigit() and int(width) > 0:
+            variants[name] = int(width)
+    return sorted(variants.items(), key=lambda v: v[1])
+
+
+VARIANTS = parse_variants(config.DERIVATIVE_VARIANTS)
+VARIANT_NAMES = {name for name, _ in VARIANTS}
+
+
+def variant_key(s3_key, name, fmt=None):
+    """Object key of one variant of the original stored at `s3_key`."""
+    return f"{VARIANT_PREFIX}{s3_key}/{name}.{FORMAT_EXTENSIONS[fmt or config.DERIVATIVE_FORMAT]}"
+
+
+def is_variant_key(key):
+    return key.startswith(VARIANT_PREFIX)
+
+
+def variant_keys(item):
+    """Every variant key that may exist for a media item (recorded or configured)."""
+    keys = {v["key"] for v in (item.get("variants") or {}).values()}
+    if item.get("s3Key"):
+        keys.update(variant_key(item["s3Key"], name) for name in VARIANT_NAMES)
+    return sorted(keys)
+
+
+def choose_variant(item, variant=None, max_width=None):
+    """
+    Pick what to serve for a media item: the named `variant`, or the
+    narrowest variant at least `max_width` pixels wide. Falls back to the
+    original when that variant does not exist (not generated yet, or the
+    original is already smaller). Returns (name, s3Key).
+    """
+    available = item.get("variants") or {}
+    if variant and variant != ORIGINAL:
+        if variant in available:
+            return variant, available[variant]["key"]
+    elif max_width:
+        adequate = sorted(
+            (int(v["width"]), name) for name, v in available.items() if int(v["width"]) >= max_width
+        )
+        if adequate:
+            name = adequate[0][1]
+            return name, available[name]["key"]
+    return ORIGINAL, item.get("s3Key")
+
+
+def request_derivatives(jobs):
+    """
+    Hand completed uploads [{"userId", "mediaId", "s3Key"}] to the
+    derivative function with one asynchronous invoke. Best effort: the
+    original is always servable, so failures are only logged.
+    """
+    if not jobs or not config.DERIVATIVES_ENABLED:
+        return
+    try:
+        get_lambda().invoke(
+            FunctionName=config.DERIVATIVE_FUNCTION_NAME,
+            InvocationType="Event",
+            Payload=json.dumps({"items": jobs}).encode(),
+        )
+        logger.info({"event": "DERIVATIVES_REQUESTED", "count": len(jobs)})
+    except Exception as e:
+        logger.error({"event": "DERIVATIVES_REQUEST_FAILED", "count": len(jobs), "error": str(e)})
+
+
+def render_variants(source_path, variants, fmt, quality):
+    """
+    Resize one original into every variant narrower than it, widest first
+    so each step downsamples the previous result. Runs in a worker process.
+    Returns [(name, width, height, encoded bytes)].
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        widest = max(width for _, width in variants)
+        # JPEG only: let the decoder scale down by 1/2..1/8 while decoding
+        original.draft("RGB", (widest, widest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        if fmt == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        outputs = []
+        current = image
+        for name, width in sorted(variants, key=lambda v: -v[1]):
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+            buffer = io.BytesIO()
+            current.save(buffer, fmt, quality=quality)
+            outputs.append((name, width, height, buffer.getvalue()))
+    return outputs
+
+
+def _executor(workers):
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError) as e:
+        # e.g. AWS Lambda has no /dev/shm for multiprocessing primitives; Pillow
+        # releases the GIL while resizing, so threads still use several cores
+        logger.warning({"event": "PROCESS_POOL_UNAVAILABLE", "error": str(e)})
+        return ThreadPoolExecutor(max_workers=workers)
+
+
+def generate_derivatives(jobs):
+    """
+    Render, store and record the variants of every job. Originals are
+    downloaded one after another while earlier ones are rendered.
+    Returns {mediaId: {"variants": [...]} or {"error": ...}}.
+    """
+    from services.s3_service import download_object, put_object, delete_keys
+    from services.dynamo_service import set_media_variants
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise MediaServiceError("Pillow is required to generate derivatives", 500)
+
+    fmt = config.DERIVATIVE_FORMAT
+    workers = min(config.DERIVATIVE_MAX_WORKERS or os.cpu_count() or 1, len(jobs)) or 1
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp, _executor(workers) as pool:
+        futures = {}
+        for index, job in enumerate(jobs):
+            path = os.path.join(tmp, str(index))
+            try:
+                download_object(job["s3Key"], path)
+            except MediaServiceError as e:
+                results[job["mediaId"]] = {"error": e.message}
+                continue
+            futures[pool.submit(render_variants, path, VARIANTS, fmt, config.DERIVATIVE_QUALITY)] = job
+
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                outputs = future.result()
+                variants = {}
+                for name, width, height, data in outputs:
+                    key = variant_key(job["s3Key"], name, fmt)
+                    put_object(key, data, FORMAT_CONTENT_TYPES[fmt])
+                    variants[name] = {"key": key, "width": width, "height": height, "size": len(data)}
+                if variants and not set_media_variants(job["userId"], job["mediaId"], variants):
+                    # Media deleted while rendering
+                    delete_keys([v["key"] for v in variants.values()])
+                results[job["mediaId"]] = {"variants": sorted(variants)}
+            except Exception as e:
+                logger.error({"event": "DERIVATIVE_FAILED", "mediaId": job["mediaId"], "error": str(e)})
+                results[job["mediaId"]] = {"error": str(e)}
+    return results
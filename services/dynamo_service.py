@@ -1,11 +1,130 @@
+import random
 import time
-from boto3.dynamodb.conditions import Key
-from utils.aws_clients import table
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+import config
+from utils.aws_clients import get_table
+from utils.cursor import encode_cursor, decode_cursor
 from utils.logger import logger
-from utils.errors import MediaServiceError
+from utils.errors import MediaServiceError, ConflictError
 
 
-def insert_media(
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+TAG_UPDATE_ATTEMPTS = 3
+
+CREATED_AT_INDEX = "GSI_CreatedAt"
+STATUS_INDEX = "GSI_StatusCreatedAt"
+
+# Attributes that make up LastEvaluatedKey for each access path
+INDEX_KEY_ATTRIBUTES = {
+    None: ("PK", "SK"),
+    CREATED_AT_INDEX: ("PK", "SK", "createdAt"),
+    STATUS_INDEX: ("PK", "SK", "statusKey", "createdAt"),
+}
+
+
+def status_key(user_id, status):
+    """Partition key of the sparse status+createdAt index."""
+    return f"user#{user_id}#status#{status}"
+
+
+def content_hash_key(user_id, sha256):
+    """Key of the hash#<sha256> item mapping a user's content to its S3 object."""
+    return {"PK": f"user#{user_id}", "SK": f"hash#{sha256}"}
+
+
+def stats_key(user_id):
+    """Key of the per-user aggregates item (counts and bytes)."""
+    return {"PK": f"user#{user_id}", "SK": "stats"}
+
+
+def item_bytes(item):
+    """Stored size of a media record: the probed size once known, else the declared one."""
+    return int(item.get("actualFileSize", item.get("fileSize", 0)) or 0)
+
+
+def stats_delta(item, sign=1):
+    """Counter changes for adding (sign=1) or removing (sign=-1) one media record."""
+    return {
+        "mediaCount": sign,
+        "totalBytes": sign * item_bytes(item),
+        f"status_{item.get('status', 'PENDING')}": sign,
+        f"visibility_{item.get('visibility', 'PUBLIC')}": sign,
+    }
+
+
+def merge_deltas(deltas):
+    merged = {}
+    for delta in deltas:
+        for name, value in delta.items():
+            merged[name] = merged.get(name, 0) + value
+    return merged
+
+
+def apply_stats_delta(user_id: str, delta: dict):
+    """
+    ADD every non-zero counter of `delta` to the user's stats item in one
+    UpdateItem. Best effort after the record write: a failure is logged and
+    the drift is fixed by the stats repair job.
+    """
+    delta = {name: value for name, value in delta.items() if value}
+    if not delta:
+        return
+    names = {f"#c{i}": name for i, name in enumerate(delta)}
+    values = {f":c{i}": value for i, value in enumerate(delta.values())}
+    values[":now"] = int(time.time())
+    try:
+        get_table().update_item(
+            Key=stats_key(user_id),
+            UpdateExpression="ADD " + ", ".join(f"#c{i} :c{i}" for i in range(len(delta)))
+            + " SET updatedAt = :now",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except Exception as e:
+        logger.error({"action": "STATS_UPDATE_FAILED", "userId": user_id, "delta": delta, "error": str(e)})
+
+
+def format_stats(item):
+    """Shape a stats item (or None) into {"mediaCount", "totalBytes", "byStatus", "byVisibility"}."""
+    item = item or {}
+    stats = {
+        "mediaCount": int(item.get("mediaCount", 0)),
+        "totalBytes": int(item.get("totalBytes", 0)),
+        "byStatus": {},
+        "byVisibility": {},
+    }
+    for name, value in item.items():
+        group, _, key = name.partition("_")
+        if group in ("status", "visibility") and key and int(value):
+            stats["byStatus" if group == "status" else "byVisibility"][key] = int(value)
+    return stats
+
+
+def get_stats(user_id: str):
+    """The user's aggregates, read from the single stats item."""
+    return format_stats(get_table().get_item(Key=stats_key(user_id)).get("Item"))
+
+
+def tag_posting_key(user_id, tag, created_at, media_id):
+    """
+    Key of one inverted-index entry. Entries of a tag sort by createdAt,
+    then mediaId, so one begins_with query returns a user's media for a tag.
+    """
+    return {"PK": f"user#{user_id}", "SK": f"tag#{tag}#{int(created_at):012d}#{media_id}"}
+
+
+def tag_postings(item, tags=None):
+    """Index entry keys of a media item for its tags (or the given `tags`)."""
+    user_id = item["PK"].split("#", 1)[1]
+    media_id = item["SK"].replace("media#", "")
+    if tags is None:
+        tags = item.get("tags") or []
+    return [tag_posting_key(user_id, tag, item["createdAt"], media_id) for tag in tags]
+
+
+def build_media_item(
     user_id: str,
     media_id: str,
     s3_key: str,
@@ -22,44 +141,75 @@ def insert_media(
     modified_at: int = None,
     created_by: str = None,
     modified_by: str = None,
+    upload_id: str = None,
+    part_size: int = None,
+    part_count: int = None,
+    content_hash: str = None,
 ):
     """
-    Insert or update a media record in DynamoDB.
+    Build a media record.
     Includes extended metadata to support Instagram-like features.
     """
-    try:
-        now = int(time.time())
-        item = {
-            "PK": f"user#{user_id}",
-            "SK": f"media#{media_id}",
-            "s3Key": s3_key,
-            "requestId": request_id,
-            "status": status,
-            "caption": caption or "",
-            "visibility": visibility,
-            "createdAt": created_at or now,
-            "modifiedAt": modified_at or now,
-            "createdBy": created_by or user_id,
-            "modifiedBy": modified_by or user_id,
-        }
+    now = int(time.time())
+    item = {
+        "PK": f"user#{user_id}",
+        "SK": f"media#{media_id}",
+        "s3Key": s3_key,
+        "requestId": request_id,
+        "status": status,
+        "statusKey": status_key(user_id, status),
+        "caption": caption or "",
+        "visibility": visibility,
+        "createdAt": created_at or now,
+        "modifiedAt": modified_at or now,
+        "createdBy": created_by or user_id,
+        "modifiedBy": modified_by or user_id,
+    }
 
-        if tags:
-            item["tags"] = tags
+    if tags:
+        item["tags"] = tags
+
+    if location:
+        item["location"] = location
 
-        if location:
-            item["location"] = location
+    if content_type:
+        item["contentType"] = content_type
 
-        if content_type:
-            item["contentType"] = content_type
+    if file_size is not None:
+        item["fileSize"] = file_size
 
-        if file_size is not None:
-            item["fileSize"] = file_size
+    if file_name:
+        item["fileName"] = file_name
 
-        if file_name:
-            item["fileName"] = file_name
+    # Reference to the hash#<sha256> item that owns the S3 object
+    if content_hash:
+        item["contentHash"] = content_hash
 
-        logger.info({"action": "INSERT_MEDIA", "item": item})
-        table.put_item(Item=item)
+    # Multipart uploads: needed to sign, complete or abort the upload later
+    if upload_id:
+        item["uploadId"] = upload_id
+        item["partSize"] = part_size
+        item["partCount"] = part_count
+
+    return item
+
+
+def insert_media(user_id: str, media_id: str, s3_key: str, request_id: str, **attributes):
+    """
+    Insert or update a media record in DynamoDB.
+    Accepts the same keyword attributes as build_media_item.
+    """
+    try:
+        item = build_media_item(user_id, media_id, s3_key, request_id, **attributes)
+        logger.info({"action": "INSERT_MEDIA", "userId": user_id, "mediaId": media_id})
+        logger.debug({"action": "INSERT_MEDIA_ITEM", "item": item})
+        if item.get("tags"):
+            # Record and its tag index entries in one BatchWriteItem call
+            requests = [{"PutRequest": {"Item": i}} for i in [item] + tag_postings(item)]
+            if _batch_write(requests):
+                raise MediaServiceError("Unprocessed writes", 500)
+        else:
+            get_table().put_item(Item=item)
 
     except Exception as e:
         logger.error(
@@ -67,72 +217,385 @@ def insert_media(
         )
         raise MediaServiceError("Failed to insert media metadata", 500)
 
+    apply_stats_delta(user_id, stats_delta(item))
+
+
+def get_content_hash(user_id: str, sha256: str):
+    """Return the hash#<sha256> item (s3Key, refCount, status) or None."""
+    return get_table().get_item(Key=content_hash_key(user_id, sha256), ConsistentRead=True).get("Item")
+
 
-def list_media(user_id, filters=None):
+def insert_media_with_hash(item: dict, deduplicated: bool) -> bool:
     """
-    List all media items for a user.
-    Supports filtering by status, mediaId, createdAt range.
+    Write a media item carrying contentHash together with its hash# reference
+    in one transaction:
+      - deduplicated: bump refCount of an existing COMPLETED hash item whose
+        object the new record points at;
+      - otherwise: claim the hash for this (new) object with refCount 1.
+    Returns False when a deduplicated write lost its hash item to a
+    concurrent delete; the caller should fall back to a regular upload.
+    A lost claim (someone else is already uploading the same content) just
+    stores the record without contentHash.
     """
-    filters = filters or {}
+    table = get_table()
+    client = table.meta.client
+    user_id = item["PK"].split("#", 1)[1]
+    hash_key = content_hash_key(user_id, item["contentHash"])
 
-    # If createdAt filters exist → use GSI
-    if "createdAfter" in filters or "createdBefore" in filters:
-        expr = Key("PK").eq(f"user#{user_id}")
-        if "createdAfter" in filters and "createdBefore" in filters:
-            expr &= Key("createdAt").between(filters["createdAfter"], filters["createdBefore"])
-        elif "createdAfter" in filters:
-            expr &= Key("createdAt").gte(filters["createdAfter"])
-        elif "createdBefore" in filters:
-            expr &= Key("createdAt").lte(filters["createdBefore"])
-
-        response = table.meta.client.query(
-            TableName=table.name,
-            IndexName="GSI_CreatedAt",
-            KeyConditionExpression=expr,
-        )
-        items = response.get("Items", [])
+    if deduplicated:
+        hash_write = {"Update": {
+            "TableName": table.name,
+            "Key": hash_key,
+            "UpdateExpression": "ADD refCount :one",
+            "ConditionExpression": "attribute_exists(PK) AND #s = :completed AND refCount > :zero",
+            "ExpressionAttributeNames": {"#s": "status"},
+            "ExpressionAttributeValues": {":one": 1, ":zero": 0, ":completed": "COMPLETED"},
+        }}
     else:
-        # Default query by PK
-        response = table.query(
-            KeyConditionExpression=Key("PK").eq(f"user#{user_id}")
-        )
-        items = response.get("Items", [])
-
-    formatted_items = []
-    for item in items:
-        media_id = item["SK"].replace("media#", "")
-        formatted = {
-            "mediaId": media_id,
-            "s3Key": item.get("s3Key"),
-            "status": item.get("status"),
-            "requestId": item.get("requestId"),
-            "createdAt": int(item.get("createdAt", 0)),
-            "modifiedAt": int(item.get("modifiedAt", 0)),
-        }
-        if "fileName" in item:
-            formatted["fileName"] = item["fileName"]
-        if "contentType" in item:
-            formatted["contentType"] = item["contentType"]
-        if "fileSize" in item:
-            formatted["fileSize"] = int(item["fileSize"])
-        if "caption" in item:
-            formatted["caption"] = item["caption"]
-        if "tags" in item:
-            formatted["tags"] = item["tags"]
-        if "location" in item:
-            formatted["location"] = item["location"]
-        if "visibility" in item:
-            formatted["visibility"] = item["visibility"]
-
-        formatted_items.append(formatted)
-
-    # Extra filtering (status, mediaId)
-    if "status" in filters:
-        formatted_items = [i for i in formatted_items if i["status"] == filters["status"]]
+        hash_write = {"Put": {
+            "TableName": table.name,
+            "Item": {
+                **hash_key,
+                "s3Key": item["s3Key"],
+                "mediaId": item["SK"].replace("media#", ""),
+                "refCount": 1,
+                "status": "PENDING",
+                "firstSeenAt": item["createdAt"],
+            },
+            "ConditionExpression": "attribute_not_exists(PK)",
+        }}
+
+    postings = [{"Put": {"TableName": table.name, "Item": key}} for key in tag_postings(item)]
+    try:
+        client.transact_write_items(TransactItems=[
+            {"Put": {"TableName": table.name, "Item": item, "ConditionExpression": "attribute_not_exists(PK)"}},
+            hash_write,
+            *postings,
+        ])
+        logger.info({"action": "INSERT_MEDIA", "userId": user_id, "mediaId": item["SK"].replace("media#", ""),
+                     "contentHash": item["contentHash"], "deduplicated": deduplicated})
+        apply_stats_delta(user_id, stats_delta(item))
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            logger.error({"action": "INSERT_MEDIA_FAILED", "error": str(e), "sk": item["SK"]})
+            raise MediaServiceError("Failed to insert media metadata", 500)
+
+    if deduplicated:
+        return False
+    item = {k: v for k, v in item.items() if k != "contentHash"}
+    try:
+        if _batch_write([{"PutRequest": {"Item": i}} for i in [item] + tag_postings(item)]):
+            raise MediaServiceError("Unprocessed writes", 500)
+        apply_stats_delta(user_id, stats_delta(item))
+        return True
+    except Exception as e:
+        logger.error({"action": "INSERT_MEDIA_FAILED", "error": str(e), "sk": item["SK"]})
+        raise MediaServiceError("Failed to insert media metadata", 500)
+
+
+def release_content_hash(user_id: str, sha256: str) -> bool:
+    """
+    Drop one reference to a hash# item. Returns True when that was the last
+    reference: the hash item is gone and its S3 object may be deleted.
+    """
+    table = get_table()
+    key = content_hash_key(user_id, sha256)
+    try:
+        refs = table.update_item(
+            Key=key,
+            UpdateExpression="ADD refCount :minus_one",
+            ConditionExpression="attribute_exists(PK)",
+            ExpressionAttributeValues={":minus_one": -1},
+            ReturnValues="UPDATED_NEW",
+        )["Attributes"]["refCount"]
+        if refs > 0:
+            return False
+        # Conditional: a concurrent dedup upload may have re-referenced it
+        table.delete_item(Key=key, ConditionExpression="refCount <= :zero",
+                          ExpressionAttributeValues={":zero": 0})
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def batch_insert_media(items: list) -> list:
+    """
+    Write many records built by build_media_item with BatchWriteItem.
+    Returns the mediaIds that could not be written.
+    """
+    try:
+        logger.info({"action": "BATCH_INSERT_MEDIA", "count": len(items)})
+        writes = [item for media in items for item in [media] + tag_postings(media)]
+        unprocessed = _batch_write([{"PutRequest": {"Item": item}} for item in writes])
+        # A record whose index entries were not written counts as failed too
+        failed = list(dict.fromkeys(
+            r["PutRequest"]["Item"]["SK"].rsplit("#", 1)[-1] for r in unprocessed
+        ))
+
+    except Exception as e:
+        logger.error({"action": "BATCH_INSERT_MEDIA_FAILED", "error": str(e)})
+        raise MediaServiceError("Failed to insert media metadata", 500)
+
+    # Counts every record that was written, including those reported failed for their index entries
+    unwritten = {r["PutRequest"]["Item"]["SK"] for r in unprocessed}
+    written = [item for item in items if item["SK"] not in unwritten]
+    if written:
+        user_id = written[0]["PK"].split("#", 1)[1]
+        apply_stats_delta(user_id, merge_deltas(stats_delta(item) for item in written))
+    return failed
+
+
+# Omit the field when its attribute is missing
+_OPTIONAL = object()
+
+# Public list fields, in response order: (item attribute, converter, value when missing)
+MEDIA_FIELDS = {
+    "mediaId": ("SK", lambda sk: sk[len("media#"):], None),
+    "s3Key": ("s3Key", None, None),
+    "status": ("status", None, None),
+    "requestId": ("requestId", None, None),
+    "createdAt": ("createdAt", int, 0),
+    "modifiedAt": ("modifiedAt", int, 0),
+    "fileName": ("fileName", None, _OPTIONAL),
+    "contentType": ("contentType", None, _OPTIONAL),
+    "fileSize": ("fileSize", int, _OPTIONAL),
+    "caption": ("caption", None, _OPTIONAL),
+    "tags": ("tags", None, _OPTIONAL),
+    "location": ("location", None, _OPTIONAL),
+    "visibility": ("visibility", None, _OPTIONAL),
+    # Probed when the upload landed
+    "width": ("width", int, _OPTIONAL),
+    "height": ("height", int, _OPTIONAL),
+    "orientation": ("orientation", int, _OPTIONAL),
+    "detectedContentType": ("detectedContentType", None, _OPTIONAL),
+    "variants": ("variants", sorted, _OPTIONAL),
+}
+
+
+def media_formatter(fields=None):
+    """
+    Build a formatter that shapes raw media items into the public list
+    representation with only `fields` (all fields by default), in one pass
+    over a precomputed field table.
+    """
+    specs = [(name, *MEDIA_FIELDS[name]) for name in MEDIA_FIELDS if fields is None or name in fields]
+
+    def format_item(item):
+        formatted = {}
+        for name, attribute, convert, missing in specs:
+            value = item.get(attribute, _OPTIONAL)
+            if value is _OPTIONAL:
+                if missing is not _OPTIONAL:
+                    formatted[name] = missing
+            else:
+                formatted[name] = convert(value) if convert else value
+        return formatted
+
+    return format_item
+
+
+format_media_item = media_formatter()
+
+
+def media_projection(fields, key_attributes=()):
+    """
+    ProjectionExpression kwargs reading only the attributes behind `fields`
+    plus `key_attributes` (needed to rebuild a cursor or apply filters).
+    """
+    attributes = list(dict.fromkeys([*key_attributes, *(MEDIA_FIELDS[name][0] for name in fields)]))
+    names = {f"#f{i}": attribute for i, attribute in enumerate(attributes)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def _created_at_condition(filters):
+    if "createdAfter" in filters and "createdBefore" in filters:
+        return Key("createdAt").between(filters["createdAfter"], filters["createdBefore"])
+    if "createdAfter" in filters:
+        return Key("createdAt").gte(filters["createdAfter"])
+    if "createdBefore" in filters:
+        return Key("createdAt").lte(filters["createdBefore"])
+    return None
+
+
+def _plan_list_query(user_id, filters, order=None):
+    """
+    Pick the cheapest access path for a list request:
+      - mediaId          -> get_item on SK=media#<id>
+      - status           -> GSI_StatusCreatedAt (or a FilterExpression when the
+                            index is disabled)
+      - createdAt/order  -> GSI_CreatedAt, sorted by createdAt
+      - otherwise        -> PK query on the base table
+    Returns a plan dict: name, index, query kwargs and the cursor scope.
+    """
+    range_cond = _created_at_condition(filters)
+    pk_cond = Key("PK").eq(f"user#{user_id}")
+
     if "mediaId" in filters:
-        formatted_items = [i for i in formatted_items if i["mediaId"] == filters["mediaId"]]
+        plan = {
+            "name": "GET_ITEM",
+            "index": None,
+            "key": {"PK": f"user#{user_id}", "SK": f"media#{filters['mediaId']}"},
+        }
+    elif "status" in filters and config.STATUS_INDEX_ENABLED:
+        expr = Key("statusKey").eq(status_key(user_id, filters["status"]))
+        if range_cond is not None:
+            expr &= range_cond
+        plan = {
+            "name": "STATUS_INDEX_QUERY",
+            "index": STATUS_INDEX,
+            "query": {
+                "IndexName": STATUS_INDEX,
+                "KeyConditionExpression": expr,
+                "ScanIndexForward": order != "desc",
+            },
+        }
+    elif range_cond is not None or order:
+        expr = pk_cond & range_cond if range_cond is not None else pk_cond
+        plan = {
+            "name": "CREATED_AT_INDEX_QUERY",
+            "index": CREATED_AT_INDEX,
+            "query": {
+                "IndexName": CREATED_AT_INDEX,
+                "KeyConditionExpression": expr,
+                "ScanIndexForward": order != "desc",
+            },
+        }
+    else:
+        plan = {
+            "name": "BASE_TABLE_QUERY",
+            "index": None,
+            "query": {"KeyConditionExpression": pk_cond & Key("SK").begins_with("media#")},
+        }
+
+    # Status index disabled: still evaluate status server-side, not in Python
+    if "query" in plan and "status" in filters and plan["index"] != STATUS_INDEX:
+        plan["query"]["FilterExpression"] = Attr("status").eq(filters["status"])
+        plan["name"] += "+STATUS_FILTER"
+
+    partition = filters["status"] if plan["index"] == STATUS_INDEX else ""
+    plan["scope"] = f"{user_id}|{plan['index'] or 'table'}|{partition}|{order or ''}"
+
+    logger.debug({
+        "action": "LIST_QUERY_PLAN",
+        "userId": user_id,
+        "plan": plan["name"],
+        "index": plan["index"],
+        "filters": sorted(filters),
+        "order": order,
+    })
+    return plan
+
+
+def _page_key(item, index_name):
+    """Rebuild the ExclusiveStartKey that resumes a query right after `item`."""
+    return {attr: item[attr] for attr in INDEX_KEY_ATTRIBUTES[index_name]}
 
-    return formatted_items
+
+def _get_single_media(plan, filters, projection=None):
+    """GET_ITEM plan: one read, with the remaining filters checked on that item."""
+    item = get_table().get_item(Key=plan["key"], **(projection or {})).get("Item")
+    if not item:
+        return []
+    if "status" in filters and item.get("status") != filters["status"]:
+        return []
+    created_at = int(item.get("createdAt", 0))
+    if "createdAfter" in filters and created_at < filters["createdAfter"]:
+        return []
+    if "createdBefore" in filters and created_at > filters["createdBefore"]:
+        return []
+    return [item]
+
+
+def _iter_plan_pages(plan, page_size=None, start_key=None):
+    query = dict(plan["query"])
+    if page_size:
+        query["Limit"] = page_size
+
+    while True:
+        if start_key:
+            query["ExclusiveStartKey"] = start_key
+        response = get_table().query(**query)
+        start_key = response.get("LastEvaluatedKey")
+        yield response.get("Items", []), start_key
+        if not start_key:
+            return
+
+
+def iter_media_pages(user_id, filters=None, order=None, page_size=None, start_key=None):
+    """
+    Lazily walk every page of a user's media, yielding (raw_items, last_key)
+    per DynamoDB call. Stops after the page without a LastEvaluatedKey.
+    """
+    filters = filters or {}
+    plan = _plan_list_query(user_id, filters, order)
+    if plan["name"] == "GET_ITEM":
+        yield _get_single_media(plan, filters), None
+        return
+    yield from _iter_plan_pages(plan, page_size, start_key)
+
+
+def iter_media(user_id, filters=None, order=None, page_size=None):
+    """Stream formatted media items across all pages, one query at a time."""
+    for items, _ in iter_media_pages(user_id, filters, order, page_size):
+        for item in items:
+            yield format_media_item(item)
+
+
+def list_media(user_id, filters=None, limit=None, cursor=None, order=None, fields=None):
+    """
+    Return one page of a user's media items.
+    Filters (status, mediaId, createdAt range) are resolved by the query
+    planner; pagination is keyset-based via an opaque `cursor` and ordering
+    is on createdAt ("asc" / "desc"). With `fields` (names of MEDIA_FIELDS)
+    only those attributes are read and returned.
+    Result: {"items": [...], "nextCursor": str | None}
+    """
+    filters = filters or {}
+    limit = limit or config.LIST_DEFAULT_LIMIT
+
+    plan = _plan_list_query(user_id, filters, order)
+    formatter, projection = format_media_item, None
+    if fields:
+        formatter = media_formatter(fields)
+        # Keys rebuild the cursor; GET_ITEM checks the remaining filters itself
+        keys = INDEX_KEY_ATTRIBUTES[plan["index"]]
+        if plan["name"] == "GET_ITEM":
+            keys += ("status", "createdAt")
+        projection = media_projection(fields, keys)
+
+    if plan["name"] == "GET_ITEM":
+        items = _get_single_media(plan, filters, projection)
+        return {"items": [formatter(item) for item in items], "nextCursor": None}
+    if projection:
+        plan["query"] = {**plan["query"], **projection}
+
+    start_key = decode_cursor(cursor, plan["scope"]) if cursor else None
+
+    # Read one item past the page: only a next match earns a cursor, so the last page has none
+    query = dict(plan["query"])
+    collected = []
+    next_key = None
+    while True:
+        query["Limit"] = limit + 1 - len(collected)
+        if start_key:
+            query["ExclusiveStartKey"] = start_key
+        response = get_table().query(**query)
+        collected.extend(response.get("Items", []))
+        start_key = response.get("LastEvaluatedKey")
+        if len(collected) > limit:
+            collected = collected[:limit]
+            next_key = _page_key(collected[-1], plan["index"])
+            break
+        if not start_key:
+            break
+
+    return {
+        "items": [formatter(item) for item in collected],
+        "nextCursor": encode_cursor(next_key, plan["scope"]) if next_key else None,
+    }
 
 
 def get_media(user_id: str, media_id: str):
@@ -140,7 +603,7 @@ def get_media(user_id: str, media_id: str):
     Fetch a single media item for a given user & mediaId.
     Returns the item dict if found, else None.
     """
-    response = table.get_item(
+    response = get_table().get_item(
         Key={
             "PK": f"user#{user_id}",
             "SK": f"media#{media_id}"
@@ -150,41 +613,468 @@ def get_media(user_id: str, media_id: str):
 
 
 def cache_presigned_url(user_id: str, media_id: str, url: str, ttl_seconds: int = 300):
-    """Store presigned URL in DynamoDB with expiry"""
-    expiry = int(time.time()) + ttl_seconds
-    table.update_item(
-        Key={"PK": f"user#{user_id}", "SK": f"media#{media_id}"},
-        UpdateExpression="SET cachedUrl = :url, urlExpiry = :expiry",
-        ExpressionAttributeValues={
-            ":url": url,
-            ":expiry": expiry
-        }
-    )
+    """
+    Store a presigned URL in its own urlcache# item with a native TTL
+    attribute, so the view path never rewrites the media item itself.
+    """
+    get_table().put_item(Item={
+        "PK": f"user#{user_id}",
+        "SK": f"urlcache#{media_id}",
+        "url": url,
+        "ttl": int(time.time()) + ttl_seconds,
+    })
 
 
-def get_cached_presigned_url(item: dict):
-    """Return cached presigned URL if still valid"""
-    url = item.get("cachedUrl")
-    expiry = item.get("urlExpiry")
-    now = int(time.time())
-    if url and expiry and expiry > now:
-        return url
+def get_cached_presigned_url(user_id: str, media_id: str):
+    """Return the cached presigned URL if still valid (TTL deletion is lazy)"""
+    item = get_table().get_item(
+        Key={"PK": f"user#{user_id}", "SK": f"urlcache#{media_id}"}
+    ).get("Item")
+    if item and item.get("ttl", 0) > int(time.time()):
+        return item["url"]
     return None
 
 
 def delete_media(user_id, media_id):
-    """Delete media record for userId + mediaId"""
-    table.delete_item(Key={
-        "PK": f"user#{user_id}",
-        "SK": f"media#{media_id}"
+    """
+    Delete media record for userId + mediaId, then its tag index entries;
+    returns the deleted item or None
+    """
+    response = get_table().delete_item(
+        Key={
+            "PK": f"user#{user_id}",
+            "SK": f"media#{media_id}"
+        },
+        ReturnValues="ALL_OLD",
+    )
+    item = response.get("Attributes")
+    if item:
+        _forget_media(user_id, item)
+    return item
+
+
+def delete_pending_media(user_id: str, media_id: str):
+    """
+    Delete a media record only while it is still PENDING (abandoned upload),
+    then its tag index entries. Returns the deleted item, or None when the
+    record is gone or completed meanwhile.
+    """
+    try:
+        item = get_table().delete_item(
+            Key={"PK": f"user#{user_id}", "SK": f"media#{media_id}"},
+            ConditionExpression="#s = :pending",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={":pending": "PENDING"},
+            ReturnValues="ALL_OLD",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        raise
+    _forget_media(user_id, item)
+    return item
+
+
+def _forget_media(user_id, item):
+    """Counters and tag index entries of a deleted media record."""
+    apply_stats_delta(user_id, stats_delta(item, -1))
+    if item.get("tags"):
+        # Leftovers only cost storage: search drops entries without a record
+        _batch_write([{"DeleteRequest": {"Key": key}} for key in tag_postings(item)])
+
+
+def _backoff(attempt: int):
+    """Exponential backoff with full jitter for throttled batch calls."""
+    time.sleep(random.uniform(0, config.BATCH_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def _batch_write(requests: list) -> list:
+    """
+    Run BatchWriteItem in chunks of 25, retrying UnprocessedItems with backoff.
+    Returns the write requests that were still unprocessed after all retries.
+    """
+    table = get_table()
+    client = table.meta.client
+    unprocessed = []
+    for start in range(0, len(requests), BATCH_WRITE_SIZE):
+        pending = requests[start:start + BATCH_WRITE_SIZE]
+        for attempt in range(config.BATCH_MAX_RETRIES + 1):
+            response = client.batch_write_item(RequestItems={table.name: pending})
+            pending = response.get("UnprocessedItems", {}).get(table.name, [])
+            if not pending:
+                break
+            if attempt < config.BATCH_MAX_RETRIES:
+                _backoff(attempt)
+        unprocessed.extend(pending)
+    return unprocessed
+
+
+def batch_delete_media(user_id: str, media_ids: list, items: dict = None) -> list:
+    """
+    Delete many media records for one user with BatchWriteItem, plus the
+    tag index entries of those found in `items` ({mediaId: item}).
+    Returns the mediaIds that could not be deleted.
+    """
+    items = items or {}
+    requests = [
+        {"DeleteRequest": {"Key": {"PK": f"user#{user_id}", "SK": f"media#{media_id}"}}}
+        for media_id in media_ids
+    ]
+    requests += [
+        {"DeleteRequest": {"Key": key}}
+        for media_id in media_ids if media_id in items
+        for key in tag_postings(items[media_id])
+    ]
+    unprocessed = _batch_write(requests)
+    failed = [
+        r["DeleteRequest"]["Key"]["SK"].replace("media#", "")
+        for r in unprocessed if r["DeleteRequest"]["Key"]["SK"].startswith("media#")
+    ]
+    # Only records known from `items` can be subtracted; the repair job covers the rest
+    deleted = [items[m] for m in media_ids if m in items and m not in failed]
+    if deleted:
+        apply_stats_delta(user_id, merge_deltas(stats_delta(item, -1) for item in deleted))
+    return failed
+
+
+def batch_get_media(user_id: str, media_ids: list) -> dict:
+    """
+    Fetch many media items for one user with BatchGetItem (100 keys per call),
+    retrying UnprocessedKeys with backoff. Returns {mediaId: item} for the
+    items that exist.
+    """
+    table = get_table()
+    client = table.meta.client
+    found = {}
+    for start in range(0, len(media_ids), BATCH_GET_SIZE):
+        keys = [
+            {"PK": f"user#{user_id}", "SK": f"media#{media_id}"}
+            for media_id in media_ids[start:start + BATCH_GET_SIZE]
+        ]
+        request = {table.name: {"Keys": keys}}
+        for attempt in range(config.BATCH_MAX_RETRIES + 1):
+            response = client.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(table.name, []):
+                found[item["SK"].replace("media#", "")] = item
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            if attempt < config.BATCH_MAX_RETRIES:
+                _backoff(attempt)
+        if request:
+            raise MediaServiceError("Failed to fetch media metadata", 500)
+    return found
+
+
+def upload_mismatches(declared: dict, metadata: dict) -> list:
+    """Differences between what the client declared and what landed in S3."""
+    mismatches = []
+    detected = metadata.get("detectedContentType")
+    if detected and declared.get("contentType") and detected != declared["contentType"]:
+        mismatches.append(f"contentType declared {declared['contentType']}, detected {detected}")
+    size = metadata.get("actualFileSize")
+    if size is not None and declared.get("fileSize") is not None and int(declared["fileSize"]) != size:
+        mismatches.append(f"fileSize declared {int(declared['fileSize'])}, actual {size}")
+    return mismatches
+
+
+def _metadata_updates(user_id, media_id, metadata, mismatches):
+    """SET clauses and values storing `metadata` and, if any, the upload `mismatches`."""
+    updates, values = [], {}
+    for name, value in metadata.items():
+        updates.append(f"{name} = :{name}")
+        values[f":{name}"] = value
+    if mismatches:
+        logger.warning({"action": "UPLOAD_MISMATCH", "userId": user_id, "mediaId": media_id,
+                        "mismatches": mismatches})
+        updates.append("uploadMismatches = :mismatches")
+        values[":mismatches"] = mismatches
+    return updates, values
+
+
+def mark_media_completed(user_id: str, media_id: str, metadata: dict = None, declared: dict = None):
+    """
+    Mark a media item as COMPLETED after upload, storing `metadata`
+    (actualFileSize, detectedContentType, width, height, orientation) in the
+    same write. When the record is already known (`declared`), differences
+    from its declared contentType/fileSize go into that write as
+    uploadMismatches. The idempotency check and the write happen in one
+    conditional UpdateItem; returns the record as completed, or None when
+    the item is missing or already COMPLETED.
+    Uses the low-level client, which is safe to share across threads.
+    A content hash claimed by this upload becomes usable for deduplication.
+    """
+    table = get_table()
+    metadata = metadata or {}
+    mismatches = upload_mismatches(declared, metadata) if declared else []
+    updates, values = _metadata_updates(user_id, media_id, metadata, mismatches)
+    updates += ["#s = :status", "statusKey = :statusKey"]
+    values.update({
+        ":status": "COMPLETED",
+        ":statusKey": status_key(user_id, "COMPLETED"),
     })
 
+    try:
+        old = table.meta.client.update_item(
+            TableName=table.name,
+            Key={"PK": f"user#{user_id}", "SK": f"media#{media_id}"},
+            UpdateExpression="SET " + ", ".join(updates),
+            ConditionExpression="attribute_exists(PK) AND #s <> :status",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_OLD",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        raise
 
-def mark_media_completed(user_id: str, media_id: str):
-    """Mark a media item as COMPLETED after upload"""
-    table.update_item(
-        Key={"PK": f"user#{user_id}", "SK": f"media#{media_id}"},
-        UpdateExpression="SET #s = :status",
-        ExpressionAttributeNames={"#s": "status"},
-        ExpressionAttributeValues={":status": "COMPLETED"},
-    )
+    if "contentHash" in old:
+        _mark_content_hash_completed(user_id, old["contentHash"], media_id)
+
+    completed = {**old, **metadata, "status": "COMPLETED"}
+    apply_stats_delta(user_id, merge_deltas([stats_delta(old, -1), stats_delta(completed)]))
+    return completed
+
+
+def set_media_metadata(user_id: str, media_id: str, completed: dict, metadata: dict) -> bool:
+    """
+    Store probed `metadata` on a record returned by mark_media_completed,
+    with any uploadMismatches against its declared values, in one UpdateItem
+    that only applies while the record is still COMPLETED. Attributes the
+    record already holds are not rewritten, and nothing is written when no
+    change is left. Returns False when the record was deleted meanwhile.
+    """
+    mismatches = upload_mismatches(completed, metadata)
+    changed = {name: value for name, value in metadata.items() if completed.get(name) != value}
+    updates, values = _metadata_updates(user_id, media_id, changed, mismatches)
+    if not updates:
+        return True
+    values[":status"] = "COMPLETED"
+    try:
+        get_table().update_item(
+            Key={"PK": f"user#{user_id}", "SK": f"media#{media_id}"},
+            UpdateExpression="SET " + ", ".join(updates),
+            ConditionExpression="#s = :status",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def _mark_content_hash_completed(user_id: str, sha256: str, media_id: str):
+    """Flip a hash# item claimed by `media_id` from PENDING to COMPLETED."""
+    table = get_table()
+    try:
+        table.meta.client.update_item(
+            TableName=table.name,
+            Key=content_hash_key(user_id, sha256),
+            UpdateExpression="SET #s = :completed",
+            ConditionExpression="mediaId = :mediaId AND #s = :pending",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":completed": "COMPLETED",
+                ":pending": "PENDING",
+                ":mediaId": media_id,
+            },
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def set_media_variants(user_id: str, media_id: str, variants: dict) -> bool:
+    """
+    Record generated derivatives on a media item:
+    {name: {"key", "width", "height", "size"}}. Returns False when the item
+    was deleted in the meantime.
+    """
+    try:
+        get_table().update_item(
+            Key={"PK": f"user#{user_id}", "SK": f"media#{media_id}"},
+            UpdateExpression="SET variants = :variants",
+            ConditionExpression="attribute_exists(PK)",
+            ExpressionAttributeValues={":variants": variants},
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def set_media_tags(user_id: str, media_id: str, tags: list, modified_by: str = None):
+    """
+    Replace a media item's tags and move its tag index entries in one
+    transaction. The write is conditional on the tags read just before, so
+    concurrent updates cannot leave stale entries; a lost race is retried.
+    Returns the updated item, or None when the media does not exist.
+    """
+    table = get_table()
+    key = {"PK": f"user#{user_id}", "SK": f"media#{media_id}"}
+
+    for _ in range(TAG_UPDATE_ATTEMPTS):
+        item = table.get_item(Key=key, ConsistentRead=True).get("Item")
+        if not item:
+            return None
+        old = item.get("tags") or []
+        now = int(time.time())
+
+        values = {":now": now, ":by": modified_by or user_id}
+        if old:
+            condition = "tags = :old"
+            values[":old"] = old
+        else:
+            condition = "attribute_exists(PK) AND attribute_not_exists(tags)"
+        if tags:
+            update = "SET tags = :tags, modifiedAt = :now, modifiedBy = :by"
+            values[":tags"] = tags
+        else:
+            update = "SET modifiedAt = :now, modifiedBy = :by REMOVE tags"
+
+        removed = [tag for tag in old if tag not in tags]
+        added = [tag for tag in tags if tag not in old]
+        writes = [{"Update": {
+            "TableName": table.name,
+            "Key": key,
+            "UpdateExpression": update,
+            "ConditionExpression": condition,
+            "ExpressionAttributeValues": values,
+        }}]
+        writes += [{"Delete": {"TableName": table.name, "Key": k}} for k in tag_postings(item, removed)]
+        writes += [{"Put": {"TableName": table.name, "Item": k}} for k in tag_postings(item, added)]
+
+        try:
+            table.meta.client.transact_write_items(TransactItems=writes)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            logger.info({"action": "SET_MEDIA_TAGS_RETRY", "userId": user_id, "mediaId": media_id})
+            continue
+
+        logger.info({"action": "SET_MEDIA_TAGS", "userId": user_id, "mediaId": media_id,
+                     "added": len(added), "removed": len(removed)})
+        updated = {k: v for k, v in item.items() if k != "tags"}
+        updated.update(modifiedAt=now, modifiedBy=values[":by"])
+        if tags:
+            updated["tags"] = tags
+        return updated
+
+    raise ConflictError("Tags were modified concurrently, please retry")
+
+
+def query_tag_postings(user_id: str, tag: str, order=None, after=None, start_key=None, limit=None):
+    """
+    One page of a tag's index entries as sort tokens "<createdAt>#<mediaId>"
+    in `order`, starting at token `after` (inclusive) when given, or right
+    after `start_key` (a previous page's LastEvaluatedKey).
+    Returns (tokens, last_key).
+    """
+    prefix = f"tag#{tag}#"
+    pk_cond = Key("PK").eq(f"user#{user_id}")
+    if after is None:
+        sk_cond = Key("SK").begins_with(prefix)
+    elif order == "desc":
+        sk_cond = Key("SK").between(prefix, prefix + after)
+    else:
+        # "$" sorts right after "#": the upper bound of this tag's entries
+        sk_cond = Key("SK").between(prefix + after, f"tag#{tag}$")
+
+    query = {
+        "KeyConditionExpression": pk_cond & sk_cond,
+        "ScanIndexForward": order != "desc",
+        "Limit": limit or config.SEARCH_PAGE_SIZE,
+    }
+    if start_key:
+        query["ExclusiveStartKey"] = start_key
+    response = get_table().query(**query)
+    tokens = [item["SK"][len(prefix):] for item in response.get("Items", [])]
+    return tokens, response.get("LastEvaluatedKey")
+
+
+def scan_stats_sources(segment: int, total_segments: int):
+    """
+    Yield the media records and stats items of one parallel-scan segment,
+    page by page. Used by the stats repair job only.
+    """
+    scan = {
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "FilterExpression": Attr("SK").begins_with("media#") | Attr("SK").eq("stats"),
+    }
+    while True:
+        response = get_table().scan(**scan)
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        scan["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def read_stats_sources(user_id: str):
+    """
+    One user's media records (only the attributes stats are built from) and
+    stats item, read with strongly consistent reads. Used by the stats
+    repair job to confirm drift. Returns (records, stats item or None).
+    """
+    table = get_table()
+    query = {
+        "KeyConditionExpression": Key("PK").eq(f"user#{user_id}") & Key("SK").begins_with("media#"),
+        "ConsistentRead": True,
+        "ProjectionExpression": "#s, #v, #f, #a",
+        "ExpressionAttributeNames": {"#s": "status", "#v": "visibility", "#f": "fileSize", "#a": "actualFileSize"},
+    }
+    records = []
+    while True:
+        response = table.query(**query)
+        records.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    stats = table.get_item(Key=stats_key(user_id), ConsistentRead=True).get("Item")
+    return records, stats
+
+
+def scan_stale_pending(segment: int, total_segments: int, cutoff: int, start_key=None):
+    """
+    Yield (items, last_key) per page of one parallel-scan segment of the
+    sparse status index, keeping PENDING records created before `cutoff`.
+    Only media records are in the index, so the scan skips everything else.
+    """
+    scan = {
+        "IndexName": STATUS_INDEX,
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "FilterExpression": Attr("status").eq("PENDING") & Attr("createdAt").lt(cutoff),
+    }
+    if start_key:
+        scan["ExclusiveStartKey"] = start_key
+    while True:
+        response = get_table().scan(**scan)
+        last_key = response.get("LastEvaluatedKey")
+        yield response.get("Items", []), last_key
+        if not last_key:
+            return
+        scan["ExclusiveStartKey"] = last_key
+
+
+def checkpoint_key(job: str):
+    """Key of a maintenance job's progress item (outside every user partition)."""
+    return {"PK": "reaper", "SK": f"checkpoint#{job}"}
+
+
+def get_checkpoint(job: str):
+    """Saved progress of `job`, or None."""
+    item = get_table().get_item(Key=checkpoint_key(job), ConsistentRead=True).get("Item")
+    return item.get("state") if item else None
+
+
+def save_checkpoint(job: str, state: dict):
+    get_table().put_item(Item={**checkpoint_key(job), "state": state, "updatedAt": int(time.time())})
+
+
+def clear_checkpoints(jobs: list):
+    _batch_write([{"DeleteRequest": {"Key": checkpoint_key(job)}} for job in jobs])
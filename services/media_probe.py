@@ -0,0 +1,195 @@
+"""
+Header-only image probing.
+
+Reads just enough of an object (ranged GETs) to identify its real format
+from the magic bytes and to parse width and height of JPEG, PNG, GIF and
+WebP files, plus the EXIF orientation of JPEGs. A JPEG whose SOF marker sits behind a large
+EXIF block is followed segment by segment with further small ranged reads,
+never the full object.
+"""
+import struct
+import config
+from services.s3_service import read_range
+from utils.logger import logger
+
+# EXIF orientations 5-8 rotate the image by 90 degrees
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Bytes of an APP1 block scanned for the orientation tag
+EXIF_SCAN_BYTES = 4096
+
+# JPEG start-of-frame markers carrying the frame dimensions (not DHT/JPG/DAC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class _RangeReader:
+    """Cached ranged reads of one object, within MEDIA_PROBE_MAX_BYTES in total."""
+
+    def __init__(self, read_range, size=None):
+        self.read_range = read_range
+        self.size = size
+        self.chunks = []  # [(start, bytes)]
+        self.fetched = 0
+
+    def get(self, start, length):
+        """Bytes [start, start + length); shorter at the end of the object or budget."""
+        end = start + length
+        for chunk_start, chunk in self.chunks:
+            if chunk_start <= start and end <= chunk_start + len(chunk):
+                return chunk[start - chunk_start:end - chunk_start]
+
+        # Read ahead MEDIA_PROBE_BYTES so neighbouring lookups hit the cache
+        fetch_end = min(max(end, start + config.MEDIA_PROBE_BYTES),
+                        start + config.MEDIA_PROBE_MAX_BYTES - self.fetched)
+        if self.size is not None:
+            fetch_end = min(fetch_end, self.size)
+        if fetch_end <= start:
+            return b""
+        chunk = self.read_range(start, fetch_end - 1)
+        self.fetched += len(chunk)
+        self.chunks.append((start, chunk))
+        return chunk[:length]
+
+
+def _exif_orientation(tiff):
+    """Orientation tag (0x0112) from a TIFF/EXIF block, or None."""
+    if len(tiff) < 8 or tiff[:2] not in (b"II", b"MM"):
+        return None
+    endian = "<" if tiff[:2] == b"II" else ">"
+    ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+    if ifd + 2 > len(tiff):
+        return None
+    count = struct.unpack(endian + "H", tiff[ifd:ifd + 2])[0]
+    for i in range(count):
+        entry = ifd + 2 + i * 12
+        if entry + 12 > len(tiff):
+            return None
+        tag, _type, _count = struct.unpack(endian + "HHI", tiff[entry:entry + 8])
+        if tag == 0x0112:
+            value = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+            return value if 1 <= value <= 8 else None
+    return None
+
+
+def _probe_jpeg(reader):
+    """Walk JPEG segments to the SOF marker, skipping large ones without reading them."""
+    orientation = None
+    offset = 2
+    while True:
+        head = reader.get(offset, 4)
+        if len(head) < 4 or head[0] != 0xFF:
+            return None
+        marker = head[1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # markers without a length
+            offset += 2
+            continue
+        length = struct.unpack(">H", head[2:4])[0]
+
+        if marker in SOF_MARKERS:
+            frame = reader.get(offset + 5, 4)
+            if len(frame) < 4:
+                return None
+            height, width = struct.unpack(">HH", frame)
+            return {"contentType": "image/jpeg", "width": width, "height": height,
+                    "orientation": orientation or 1}
+        if marker == 0xE1 and orientation is None:
+            # IFD0 (with the orientation tag) sits at the start of the EXIF block
+            segment = reader.get(offset + 4, min(length - 2, EXIF_SCAN_BYTES))
+            if segment[:6] == b"Exif\x00\x00":
+                orientation = _exif_orientation(segment[6:])
+        if marker == 0xDA:  # start of scan: no SOF before the image data
+            return None
+        offset += 2 + length
+
+
+def _probe_png(data):
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", data[16:24])
+    return {"contentType": "image/png", "width": width, "height": height, "orientation": 1}
+
+
+def _probe_gif(data):
+    if len(data) < 10:
+        return None
+    width, height = struct.unpack("<HH", data[6:10])
+    return {"contentType": "image/gif", "width": width, "height": height, "orientation": 1}
+
+
+def _probe_webp(data):
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[26:30])
+        width, height = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b"VP8L" and data[20] == 0x2F:
+        bits = struct.unpack("<I", data[21:25])[0]
+        width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+    else:
+        return None
+    return {"contentType": "image/webp", "width": width, "height": height, "orientation": 1}
+
+
+def probe_image(read_range, size=None):
+    """
+    Identify an image and its dimensions from its leading bytes.
+    `read_range(start, end)` returns bytes start..end (inclusive) of the
+    object. Returns {"contentType", "width", "height", "orientation"} with
+    width/height as displayed (EXIF rotation applied), or None when the
+    bytes are not a recognised image.
+    """
+    reader = _RangeReader(read_range, size)
+    data = reader.get(0, 32)
+
+    if data[:3] == b"\xff\xd8\xff":
+        info = _probe_jpeg(reader)
+    elif data[:8] == b"\x89PNG\r\n\x1a\n":
+        info = _probe_png(data)
+    elif data[:6] in (b"GIF87a", b"GIF89a"):
+        info = _probe_gif(data)
+    elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        info = _probe_webp(data)
+    else:
+        info = None
+
+    if info and info["orientation"] in ROTATED_ORIENTATIONS:
+        info["width"], info["height"] = info["height"], info["width"]
+    return info
+
+
+def probe_object(key, size=None):
+    """
+    Probe an S3 object with ranged reads. Returns the metadata to store
+    with the completed media item (actual size and, for recognised images,
+    detected type, dimensions and orientation). Probe failures never block
+    completion; they just yield less metadata.
+    """
+    metadata = {}
+    if size is not None:
+        metadata["actualFileSize"] = size
+    if not config.MEDIA_PROBE_ENABLED or size == 0:
+        return metadata
+
+    try:
+        info = probe_image(lambda start, end: read_range(key, start, end), size)
+    except Exception as e:
+        logger.warning({"event": "MEDIA_PROBE_FAILED", "key": key, "error": str(e)})
+        return metadata
+
+    if info is None:
+        metadata["detectedContentType"] = "unknown"
+    else:
+        metadata.update(
+            detectedContentType=info["contentType"],
+            width=info["width"],
+            height=info["height"],
+            orientation=info["orientation"],
+        )
+    return metadata
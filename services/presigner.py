@@ -0,0 +1,143 @@
+"""
+Local SigV4 query-string presigner for S3.
+
+botocore's generate_presigned_url builds a full request object, walks the
+event system and re-derives the signing key for every URL. This module
+signs GET/PUT URLs directly: the signing key is derived once per
+(secret, date, region) and reused, and presign_many() signs a whole batch
+of keys against the same timestamp and scope. Output is byte-for-byte
+identical to botocore's S3SigV4QueryAuth for path-style endpoints.
+"""
+import datetime
+import hashlib
+import hmac
+from functools import lru_cache
+from urllib.parse import quote, urlsplit
+
+import config
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+SERVICE = "s3"
+
+
+def _uri_encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+@lru_cache(maxsize=32)
+def signing_key(secret_key: str, date_stamp: str, region: str, service: str = SERVICE) -> bytes:
+    """Derive (and memoize) the SigV4 signing key for one day/region/credential set."""
+    key = hmac.new(f"AWS4{secret_key}".encode(), date_stamp.encode(), hashlib.sha256).digest()
+    for part in (region, service, "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+class Presigner:
+    """
+    Presigns path-style S3 URLs against one endpoint and region.
+    `credentials` is a callable returning an object with access_key,
+    secret_key and token (botocore frozen credentials), so rotated
+    session credentials are picked up on every call.
+    """
+
+    def __init__(self, endpoint: str, region: str, credentials):
+        parts = urlsplit(endpoint)
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.region = region
+        self._credentials = credentials
+
+    def presign(self, key, method="GET", bucket=None, expires_in=None,
+                headers=None, params=None, now=None):
+        """Return one presigned URL; see presign_many for the arguments."""
+        return self.presign_many([key], method, bucket, expires_in, headers, params, now)[0]
+
+    def presign_many(self, keys, method="GET", bucket=None, expires_in=None,
+                     headers=None, params=None, now=None):
+        """
+        Presign `method` for every key in `keys`.
+        `headers` are signed headers the client must send (e.g. content-type);
+        `params` are extra query parameters (e.g. uploadId, partNumber).
+        Everything except the key-dependent path is computed once per batch.
+        """
+        bucket = bucket or config.MEDIA_BUCKET
+        ctx = self._context(expires_in, headers, now)
+        query, canonical_query = self._query(ctx, params)
+        request_tail = f"\n{canonical_query}\n{ctx['canonical_headers']}\n{ctx['signed_headers']}\n{UNSIGNED_PAYLOAD}"
+
+        urls = []
+        for key in keys:
+            path = _uri_encode(f"{self.base_path}/{bucket}/{key}", safe="/~")
+            signature = self._signature(ctx, f"{method}\n{path}{request_tail}")
+            urls.append(f"{ctx['url_prefix']}{path}?{query}&X-Amz-Signature={signature}")
+        return urls
+
+    def presign_parts(self, key, upload_id, part_numbers, bucket=None,
+                      expires_in=None, now=None):
+        """
+        Presign UploadPart PUTs for one multipart upload, one URL per part
+        number. Only the query string differs between parts, so the scope,
+        signing key and canonical path are shared.
+        """
+        bucket = bucket or config.MEDIA_BUCKET
+        ctx = self._context(expires_in, None, now)
+        path = _uri_encode(f"{self.base_path}/{bucket}/{key}", safe="/~")
+        header_tail = f"\n{ctx['canonical_headers']}\n{ctx['signed_headers']}\n{UNSIGNED_PAYLOAD}"
+
+        urls = []
+        for part_number in part_numbers:
+            query, canonical_query = self._query(ctx, {"uploadId": upload_id, "partNumber": part_number})
+            signature = self._signature(ctx, f"PUT\n{path}\n{canonical_query}{header_tail}")
+            urls.append(f"{ctx['url_prefix']}{path}?{query}&X-Amz-Signature={signature}")
+        return urls
+
+    def _context(self, expires_in, headers, now):
+        """Per-batch signing state: timestamp, scope, signed headers, auth params, key."""
+        expires_in = expires_in or config.PRESIGNED_URL_EXPIRY_SECONDS
+        creds = self._credentials()
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = amz_date[:8]
+        scope = f"{date_stamp}/{self.region}/{SERVICE}/aws4_request"
+
+        signed = {"host": self.host}
+        for name, value in (headers or {}).items():
+            signed[name.lower()] = " ".join(str(value).split())
+        signed_names = sorted(signed)
+        signed_headers = ";".join(signed_names)
+
+        auth_params = [
+            ("X-Amz-Algorithm", ALGORITHM),
+            ("X-Amz-Credential", f"{creds.access_key}/{scope}"),
+            ("X-Amz-Date", amz_date),
+            ("X-Amz-Expires", str(expires_in)),
+            ("X-Amz-SignedHeaders", signed_headers),
+        ]
+        if creds.token:
+            auth_params.append(("X-Amz-Security-Token", creds.token))
+
+        return {
+            "auth_params": [(_uri_encode(k), _uri_encode(v)) for k, v in auth_params],
+            "signed_headers": signed_headers,
+            "canonical_headers": "".join(f"{name}:{signed[name]}\n" for name in signed_names),
+            "key": signing_key(creds.secret_key, date_stamp, self.region),
+            "sts_prefix": f"{ALGORITHM}\n{amz_date}\n{scope}\n",
+            "url_prefix": f"{self.scheme}://{self.host}",
+        }
+
+    @staticmethod
+    def _query(ctx, params):
+        """Return (url query, canonical query). Operation params come first, auth params after (same as botocore)."""
+        encoded = [(_uri_encode(k), _uri_encode(str(v))) for k, v in (params or {}).items()]
+        encoded += ctx["auth_params"]
+        query = "&".join(f"{k}={v}" for k, v in encoded)
+        canonical_query = "&".join(f"{k}={v}" for k, v in sorted(encoded))
+        return query, canonical_query
+
+    @staticmethod
+    def _signature(ctx, canonical_request):
+        string_to_sign = ctx["sts_prefix"] + hashlib.sha256(canonical_request.encode()).hexdigest()
+        return hmac.new(ctx["key"], string_to_sign.encode(), hashlib.sha256).hexdigest()
@@ -0,0 +1,256 @@
+"""
+Scheduled clean-up of what the upload flow can leave behind.
+
+  - "pending": media records still PENDING long after their upload URL
+    expired. A parallel Scan of the sparse status index finds them; a record
+    whose object did land (its S3 event was lost) is completed instead, the
+    rest are deleted with a conditional DeleteItem (still PENDING) after
+    aborting their multipart upload. Multipart uploads can legitimately run
+    until the bucket's 2-day abort rule (part URLs are re-signed on demand),
+    so they are only reaped after REAPER_MULTIPART_MAX_AGE_SECONDS.
+  - "objects": S3 objects without a media record (e.g. an S3 delete that
+    failed after the record was removed). ListObjectsV2 pages are checked
+    against the table with BatchGetItem and the orphans removed with
+    DeleteObjects. Deduplicated content outlives its first record, so an
+    object still referenced by its hash# item is kept.
+
+Both jobs run until the invocation's deadline, rate-limit their deletes
+and save a checkpoint after every page; the next run resumes from it. A
+finished job clears its checkpoints so the following run starts over.
+Dry runs report what would be done without writing anything, checkpoints
+included.
+"""
+import base64
+import binascii
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+from services.dynamo_service import (
+    scan_stale_pending, delete_pending_media, release_content_hash, mark_media_completed,
+    batch_get_media, get_content_hash, get_checkpoint, save_checkpoint, clear_checkpoints,
+)
+from services.s3_service import head_object, list_object_pages, delete_keys, abort_multipart_upload
+from services.media_probe import probe_object
+from services.derivatives import VARIANT_PREFIX, VARIANT_NAMES, is_variant_key, variant_key, request_derivatives
+from utils.errors import MediaServiceError
+from utils.logger import logger
+from utils.tracing import bind
+
+JOBS = ("pending", "objects")
+
+
+class RateLimiter:
+    """Spaces operations `1/rate` seconds apart across threads; rate <= 0 disables it."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self, count=1):
+        if not self.interval:
+            return
+        with self._lock:
+            now = self._clock()
+            start = max(self._next, now)
+            self._next = start + count * self.interval
+        if start > now:
+            self._sleep(start - now)
+
+
+def _media_ids(item):
+    return item["PK"].split("#", 1)[1], item["SK"].replace("media#", "")
+
+
+def reap_stale_item(item, dry_run, limiter, multipart_cutoff=None):
+    """
+    Resolve one stale PENDING record. Returns "recovered" (object found,
+    record completed), "deleted", "skipped" (completed or gone meanwhile),
+    "in_progress" (a multipart upload created after `multipart_cutoff`)
+    or, in dry runs, "stale".
+    """
+    if multipart_cutoff is None:
+        multipart_cutoff = int(time.time()) - config.REAPER_MULTIPART_MAX_AGE_SECONDS
+    if item.get("uploadId") and int(item.get("createdAt", 0)) >= multipart_cutoff:
+        return "in_progress"
+    user_id, media_id = _media_ids(item)
+    head = head_object(item["s3Key"])
+    if head is not None:
+        # The upload landed but its completion event never arrived
+        if dry_run:
+            return "recovered"
+        metadata = probe_object(item["s3Key"], head.get("ContentLength"))
+        if mark_media_completed(user_id, media_id, metadata, declared=item):
+            if metadata.get("detectedContentType", "image/").startswith("image/"):
+                request_derivatives([{"userId": user_id, "mediaId": media_id, "s3Key": item["s3Key"]}])
+            return "recovered"
+        return "skipped"
+    if dry_run:
+        return "stale"
+
+    limiter.acquire()
+    if item.get("uploadId"):
+        abort_multipart_upload(item["s3Key"], item["uploadId"])
+    deleted = delete_pending_media(user_id, media_id)
+    if not deleted:
+        return "skipped"
+    if deleted.get("contentHash"):
+        # The claim never produced an object, so there is nothing to delete in S3
+        release_content_hash(user_id, deleted["contentHash"])
+    return "deleted"
+
+
+def reap_pending_segment(segment, total_segments, cutoff, deadline, dry_run, limiter, multipart_cutoff=None):
+    """Work through one scan segment. Returns (counts, finished)."""
+    job = f"pending#{segment}"
+    state = None if dry_run else get_checkpoint(job)
+    if state and state.get("totalSegments") != total_segments:
+        state = None  # segments changed: the old position means nothing
+    counts = {}
+    if state and state.get("done"):
+        return counts, True
+
+    start_key = state.get("lastKey") if state else None
+    for items, last_key in scan_stale_pending(segment, total_segments, cutoff, start_key):
+        for item in items:
+            try:
+                outcome = reap_stale_item(item, dry_run, limiter, multipart_cutoff)
+            except Exception as e:
+                logger.error({"event": "REAP_PENDING_FAILED", "sk": item.get("SK"), "pk": item.get("PK"),
+                              "error": getattr(e, "message", str(e))})
+                outcome = "failed"
+            counts[outcome] = counts.get(outcome, 0) + 1
+        if not dry_run:
+            save_checkpoint(job, {"totalSegments": total_segments, "lastKey": last_key, "done": not last_key})
+        if last_key and time.monotonic() >= deadline:
+            return counts, False
+    return counts, True
+
+
+def reap_pending(total_segments, cutoff, deadline, dry_run=False, limiter=None, multipart_cutoff=None):
+    """Run every segment concurrently. Returns counts plus "complete"."""
+    limiter = limiter or RateLimiter(config.REAPER_DELETES_PER_SECOND)
+    summary, finished = {}, True
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        futures = [
+            pool.submit(bind(reap_pending_segment), segment, total_segments, cutoff, deadline, dry_run, limiter,
+                        multipart_cutoff)
+            for segment in range(total_segments)
+        ]
+        for future in futures:
+            counts, done = future.result()
+            finished = finished and done
+            for outcome, count in counts.items():
+                summary[outcome] = summary.get(outcome, 0) + count
+    if finished and not dry_run:
+        clear_checkpoints([f"pending#{segment}" for segment in range(total_segments)])
+    return {**summary, "complete": finished}
+
+
+def _base_key(key):
+    """Original object key behind an object key (itself, or the original of a variant)."""
+    return key[len(VARIANT_PREFIX):].rsplit("/", 1)[0] if is_variant_key(key) else key
+
+
+def _still_referenced(user_id, key):
+    """True when deduplicated records still share the object through its hash# item."""
+    head = head_object(key, checksum=True)
+    if head is None:
+        return False
+    checksum = head.get("ChecksumSHA256") or ""
+    if "-" in checksum:
+        return False  # composite multipart checksum; such uploads are never deduplicated
+    try:
+        sha256 = base64.b64decode(checksum, validate=True).hex()
+    except (binascii.Error, ValueError):
+        return False
+    if not sha256:
+        return False
+    content = get_content_hash(user_id, sha256)
+    return bool(content and content.get("s3Key") == key and int(content.get("refCount", 0)) > 0)
+
+
+def find_orphans(objects, cutoff):
+    """
+    Keys among one ListObjectsV2 page that no media record accounts for.
+    Objects newer than `cutoff` and keys outside the <userId>/<mediaId>
+    layout are never reported.
+    """
+    by_user = {}
+    for obj in objects:
+        if obj["LastModified"].timestamp() >= cutoff:
+            continue
+        user_id, _, media_id = _base_key(obj["Key"]).partition("/")
+        if not user_id or not media_id or "/" in media_id:
+            continue
+        by_user.setdefault(user_id, {}).setdefault(media_id, []).append(obj["Key"])
+
+    orphans = []
+    for user_id, media in by_user.items():
+        found = batch_get_media(user_id, list(media))
+        for media_id, keys in media.items():
+            if media_id in found:
+                continue
+            base = f"{user_id}/{media_id}"
+            # Variants of a kept original stay; the original is listed on its own
+            if not _still_referenced(user_id, base):
+                orphans.extend(keys)
+    return orphans
+
+
+def reap_orphans(cutoff, deadline, dry_run=False, limiter=None):
+    """Walk the bucket listing from the checkpoint. Returns counts plus "complete"."""
+    limiter = limiter or RateLimiter(config.REAPER_DELETES_PER_SECOND)
+    state = None if dry_run else get_checkpoint("objects")
+    start_after = state.get("startAfter") if state else None
+    summary = {"listed": 0, "orphaned": 0, "deleted": 0, "failed": 0}
+
+    for objects in list_object_pages(start_after):
+        summary["listed"] += len(objects)
+        orphans = find_orphans(objects, cutoff)
+        summary["orphaned"] += len(orphans)
+        if orphans and not dry_run:
+            limiter.acquire(len(orphans))
+            # Variants sort elsewhere in the listing; remove them with their original
+            keys = orphans + [
+                variant_key(key, name) for key in orphans if not is_variant_key(key) for name in VARIANT_NAMES
+            ]
+            try:
+                errors = delete_keys(list(dict.fromkeys(keys)))
+            except MediaServiceError as e:
+                errors = {key: e.message for key in orphans}
+            errors = {key: error for key, error in errors.items() if key in orphans}
+            if errors:
+                logger.error({"event": "REAP_OBJECTS_FAILED", "count": len(errors),
+                              "errors": dict(list(errors.items())[:10])})
+            summary["failed"] += len(errors)
+            summary["deleted"] += len(orphans) - len(errors)
+        if orphans:
+            logger.info({"event": "ORPHANS_FOUND", "keys": orphans[:50], "count": len(orphans), "dryRun": dry_run})
+        if not dry_run:
+            save_checkpoint("objects", {"startAfter": objects[-1]["Key"]})
+        if time.monotonic() >= deadline:
+            return {**summary, "complete": False}
+
+    if not dry_run:
+        clear_checkpoints(["objects"])
+    return {**summary, "complete": True}
+
+
+def run_reaper(jobs=JOBS, total_segments=None, dry_run=False, deadline=None, now=None):
+    """Run the selected jobs side by side until `deadline` (time.monotonic()). Returns a summary per job."""
+    total_segments = total_segments or config.REAPER_SEGMENTS
+    deadline = deadline or time.monotonic() + config.REAPER_MAX_RUN_SECONDS
+    now = now or int(time.time())
+    runs = {
+        "pending": lambda: reap_pending(total_segments, now - config.REAPER_PENDING_MAX_AGE_SECONDS,
+                                        deadline, dry_run,
+                                        multipart_cutoff=now - config.REAPER_MULTIPART_MAX_AGE_SECONDS),
+        "objects": lambda: reap_orphans(now - config.REAPER_ORPHAN_MIN_AGE_SECONDS, deadline, dry_run),
+    }
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = {job: pool.submit(bind(runs[job])) for job in jobs}
+        return {job: future.result() for job, future in futures.items()}
@@ -1,68 +1,277 @@
 import uuid
+from botocore.exceptions import ClientError
 import config
-from utils.aws_clients import s3
-from utils.common import make_public_url
-from utils.errors import MediaServiceError
+from utils.aws_clients import get_s3, frozen_credentials
+from utils.errors import MediaServiceError, BadRequestError, NotFoundError
+from utils.tracing import span
+from services.presigner import Presigner
 
+DELETE_OBJECTS_MAX_KEYS = 1000
 
-def generate_upload_url(user_id, content_type="image/jpeg", request_id=None):
+# S3 multipart limits
+MIN_PART_SIZE_BYTES = 5 * 1024 * 1024
+MAX_PART_SIZE_BYTES = 5 * 1024 ** 3
+MAX_PARTS = 10000
+
+
+def client_presigner():
     """
-    Generate a presigned URL for uploading an object to S3.
-    Also replaces 'localstack' with 'localhost' for client-friendly usage.
+    Presigner for the URLs handed to clients. SigV4 signs the Host header,
+    so URLs are signed for the public endpoint itself; rewriting the host
+    of a signed URL would invalidate it.
+    """
+    return Presigner(config.PUBLIC_ENDPOINT, config.REGION, frozen_credentials)
+
+
+presigner = client_presigner()
+
+
+def generate_upload_url(user_id, content_type="image/jpeg", request_id=None, checksum_sha256=None):
+    """
+    Generate a presigned URL for uploading an object to S3 (PUBLIC_ENDPOINT).
+    The client must send the signed Content-Type header, plus
+    x-amz-checksum-sha256 (base64 digest) when `checksum_sha256` is given;
+    S3 then rejects bodies that do not match the digest.
     """
     media_id = str(uuid.uuid4())
     key = f"{user_id}/{media_id}"
 
-    extra_metadata = {}
+    params = {}
     if request_id:
-        extra_metadata["x-amz-meta-request-id"] = request_id
-
-    try:
-        url = s3.generate_presigned_url(
-            "put_object",
-            Params={
-                "Bucket": config.MEDIA_BUCKET,
-                "Key": key,
-                "ContentType": content_type,
-                "Metadata": extra_metadata,
-            },
-            ExpiresIn=300,
-        )
+        params["x-amz-meta-request-id"] = request_id
 
-        # Replace container hostname with localhost for client use
-        url = url.replace("localstack", "localhost")
+    headers = {"content-type": content_type}
+    if checksum_sha256:
+        headers["x-amz-checksum-sha256"] = checksum_sha256
 
-        return media_id, key, make_public_url(url)
+    try:
+        with span("presign"):
+            url = presigner.presign(
+                key,
+                "PUT",
+                headers=headers,
+                params=params,
+            )
+        return media_id, key, url
 
     except Exception as e:
         raise MediaServiceError(f"Failed to generate upload URL: {str(e)}", 500)
 
 
-def generate_download_url(user_id, media_id):
+def create_multipart_upload(user_id, content_type="image/jpeg", request_id=None):
     """
-    Generate a presigned URL for downloading an object from S3.
+    Start a multipart upload for a new media object.
+    Returns (media_id, key, upload_id).
     """
+    media_id = str(uuid.uuid4())
     key = f"{user_id}/{media_id}"
+
+    kwargs = {"Bucket": config.MEDIA_BUCKET, "Key": key, "ContentType": content_type}
+    if request_id:
+        kwargs["Metadata"] = {"request-id": request_id}
+
+    try:
+        upload_id = get_s3().create_multipart_upload(**kwargs)["UploadId"]
+        return media_id, key, upload_id
+
+    except Exception as e:
+        raise MediaServiceError(f"Failed to start multipart upload: {str(e)}", 500)
+
+
+def generate_part_urls(key, upload_id, part_numbers):
+    """
+    Presign UploadPart URLs for the given part numbers in one pass.
+    Returns the URLs in the order of `part_numbers`.
+    """
     try:
-        url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": config.MEDIA_BUCKET, "Key": key},
-            ExpiresIn=300,
+        with span("presign"):
+            return presigner.presign_parts(
+                key, upload_id, part_numbers, expires_in=config.MULTIPART_URL_EXPIRY_SECONDS
+            )
+
+    except Exception as e:
+        raise MediaServiceError(f"Failed to generate part upload URLs: {str(e)}", 500)
+
+
+def complete_multipart_upload(key, upload_id, parts):
+    """
+    Assemble an upload from client-reported parts: [(partNumber, eTag), ...]
+    in ascending part order.
+    """
+    try:
+        get_s3().complete_multipart_upload(
+            Bucket=config.MEDIA_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": etag} for n, etag in parts]},
         )
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        if code == "NoSuchUpload":
+            raise NotFoundError(f"Multipart upload not found: {upload_id}")
+        if code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall"):
+            raise BadRequestError(f"Cannot complete upload: {e.response['Error'].get('Message', code)}")
+        raise MediaServiceError(f"Failed to complete multipart upload: {str(e)}", 500)
+    except Exception as e:
+        raise MediaServiceError(f"Failed to complete multipart upload: {str(e)}", 500)
+
+
+def abort_multipart_upload(key, upload_id):
+    """Abort a multipart upload and free its parts; already-gone uploads are ignored."""
+    try:
+        get_s3().abort_multipart_upload(Bucket=config.MEDIA_BUCKET, Key=key, UploadId=upload_id)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+            raise MediaServiceError(f"Failed to abort multipart upload: {str(e)}", 500)
+    except Exception as e:
+        raise MediaServiceError(f"Failed to abort multipart upload: {str(e)}", 500)
+
+
+def generate_download_url(user_id, media_id, key=None):
+    """
+    Generate a presigned URL for downloading an object from S3.
+    `key` overrides the default userId/mediaId key (deduplicated media).
+    """
+    return generate_download_urls([key or f"{user_id}/{media_id}"])[0]
+
 
-        return make_public_url(url)
+def generate_download_urls(keys):
+    """
+    Presign GET URLs for many object keys in one pass (same timestamp,
+    scope and signing key). Returns the URLs in the order of `keys`.
+    """
+    try:
+        with span("presign"):
+            return presigner.presign_many(keys, "GET")
 
     except Exception as e:
         raise MediaServiceError(f"Failed to generate download URL: {str(e)}", 500)
 
 
+def read_range(key, start, end):
+    """
+    Read bytes start..end (inclusive) of an object with a ranged GET.
+    Shorter objects return what exists; a range past the end returns b"".
+    """
+    try:
+        response = get_s3().get_object(Bucket=config.MEDIA_BUCKET, Key=key, Range=f"bytes={start}-{end}")
+        return response["Body"].read()
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "InvalidRange":
+            return b""
+        raise MediaServiceError(f"Failed to read from S3: {str(e)}", 500)
+
+
+def head_object(key, checksum=False):
+    """
+    HEAD an object; with `checksum` the stored SHA-256 (if any) is returned
+    as ChecksumSHA256. Returns None when the object does not exist.
+    """
+    params = {"Bucket": config.MEDIA_BUCKET, "Key": key}
+    if checksum:
+        params["ChecksumMode"] = "ENABLED"
+    try:
+        return get_s3().head_object(**params)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise MediaServiceError(f"Failed to read object metadata: {str(e)}", 500)
+    except Exception as e:
+        raise MediaServiceError(f"Failed to read object metadata: {str(e)}", 500)
+
+
+def list_object_pages(start_after=None, page_size=1000):
+    """
+    Yield the bucket's objects one ListObjectsV2 page at a time, in key
+    order, starting after `start_after`.
+    """
+    params = {"Bucket": config.MEDIA_BUCKET, "PaginationConfig": {"PageSize": page_size}}
+    if start_after:
+        params["StartAfter"] = start_after
+    try:
+        for page in get_s3().get_paginator("list_objects_v2").paginate(**params):
+            if page.get("Contents"):
+                yield page["Contents"]
+    except Exception as e:
+        raise MediaServiceError(f"Failed to list objects: {str(e)}", 500)
+
+
+def download_object(key, path):
+    """Stream an object to a local file (managed, multi-threaded for large objects)."""
+    try:
+        get_s3().download_file(config.MEDIA_BUCKET, key, path)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            raise NotFoundError(f"Object not found: {key}")
+        raise MediaServiceError(f"Failed to download from S3: {str(e)}", 500)
+
+
+def put_object(key, body, content_type):
+    """Store a generated object; derivative keys are immutable, so cache them long."""
+    try:
+        get_s3().put_object(
+            Bucket=config.MEDIA_BUCKET,
+            Key=key,
+            Body=body,
+            ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable",
+        )
+    except Exception as e:
+        raise MediaServiceError(f"Failed to upload to S3: {str(e)}", 500)
+
+
 def delete_object(user_id: str, media_id: str):
     """
     Delete an object from S3 bucket.
     """
     key = f"{user_id}/{media_id}"
     try:
-        s3.delete_object(Bucket=config.MEDIA_BUCKET, Key=key)
+        get_s3().delete_object(Bucket=config.MEDIA_BUCKET, Key=key)
         return key
     except Exception as e:
         raise MediaServiceError(f"Failed to delete from S3: {str(e)}", 500)
+
+
+def delete_objects(user_id: str, media_ids: list) -> dict:
+    """
+    Delete many objects with one DeleteObjects call per 1000 keys.
+    Returns {mediaId: error message} for the keys S3 failed to delete.
+    """
+    errors = {}
+    try:
+        for start in range(0, len(media_ids), DELETE_OBJECTS_MAX_KEYS):
+            chunk = media_ids[start:start + DELETE_OBJECTS_MAX_KEYS]
+            response = get_s3().delete_objects(
+                Bucket=config.MEDIA_BUCKET,
+                Delete={
+                    "Objects": [{"Key": f"{user_id}/{media_id}"} for media_id in chunk],
+                    "Quiet": True,
+                },
+            )
+            for error in response.get("Errors", []):
+                errors[error["Key"].split("/", 1)[-1]] = error.get("Message", error.get("Code"))
+        return errors
+    except Exception as e:
+        raise MediaServiceError(f"Failed to delete from S3: {str(e)}", 500)
+
+
+def delete_keys(keys: list) -> dict:
+    """
+    Delete arbitrary object keys (e.g. derivatives) in DeleteObjects calls.
+    Missing keys count as deleted. Returns {key: error message}.
+    """
+    errors = {}
+    try:
+        for start in range(0, len(keys), DELETE_OBJECTS_MAX_KEYS):
+            response = get_s3().delete_objects(
+                Bucket=config.MEDIA_BUCKET,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[start:start + DELETE_OBJECTS_MAX_KEYS]],
+                    "Quiet": True,
+                },
+            )
+            for error in response.get("Errors", []):
+                errors[error["Key"]] = error.get("Message", error.get("Code"))
+        return errors
+    except Exception as e:
+        raise MediaServiceError(f"Failed to delete from S3: {str(e)}", 500)
@@ -0,0 +1,101 @@
+"""
+Recompute per-user stats from the media records and reconcile drift.
+
+The stats items are maintained with ADD updates issued after each record
+write, so a failed or interrupted update leaves them off. This job scans
+the table in parallel segments and rebuilds every user's counters.
+
+The scan is neither a snapshot nor consistent: a user's records and stats
+item are read at different moments, so an upload or delete in between
+looks like drift. Each user the scan flags is therefore read again with
+consistent reads, and only a difference that both reads agree on is
+corrected, by ADDing it to the stats item. Anything else has changed since
+the scan and is left for the next run.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import config
+from services.dynamo_service import (
+    scan_stats_sources, read_stats_sources, stats_delta, merge_deltas, apply_stats_delta,
+)
+from utils.logger import logger
+from utils.tracing import bind
+
+COUNTERS = {"mediaCount", "totalBytes"}
+COUNTER_PREFIXES = ("status_", "visibility_")
+
+
+def _stored_counters(item):
+    return {
+        name: int(value) for name, value in item.items()
+        if name in COUNTERS or name.startswith(COUNTER_PREFIXES)
+    }
+
+
+def scan_segment(segment, total_segments):
+    """Counters rebuilt from one segment's media records, plus the stats items it holds."""
+    computed, stored = {}, {}
+    for item in scan_stats_sources(segment, total_segments):
+        user_id = item["PK"].split("#", 1)[1]
+        if item["SK"] == "stats":
+            stored[user_id] = _stored_counters(item)
+        else:
+            computed[user_id] = merge_deltas([computed.get(user_id, {}), stats_delta(item)])
+    return computed, stored
+
+
+def recompute_stats(total_segments=None):
+    """Scan all segments concurrently. Returns (computed, stored) counters per user."""
+    total_segments = total_segments or config.STATS_REPAIR_SEGMENTS
+    computed, stored = {}, {}
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        segments = pool.map(bind(scan_segment), range(total_segments), [total_segments] * total_segments)
+        for segment_computed, segment_stored in segments:
+            # A user's records can be spread over several segments
+            for user_id, counters in segment_computed.items():
+                computed[user_id] = merge_deltas([computed.get(user_id, {}), counters])
+            stored.update(segment_stored)
+    return computed, stored
+
+
+def stats_drift(computed, stored):
+    """{userId: {counter: correction}} for every user whose stats item is off."""
+    drift = {}
+    for user_id in set(computed) | set(stored):
+        actual, recorded = computed.get(user_id, {}), stored.get(user_id, {})
+        delta = {
+            name: actual.get(name, 0) - recorded.get(name, 0)
+            for name in set(actual) | set(recorded)
+        }
+        delta = {name: value for name, value in delta.items() if value}
+        if delta:
+            drift[user_id] = delta
+    return drift
+
+
+def recheck_drift(user_id):
+    """The user's drift ({counter: correction}) from consistent reads of their records and stats item."""
+    records, stats = read_stats_sources(user_id)
+    computed = {user_id: merge_deltas(stats_delta(item) for item in records)}
+    stored = {user_id: _stored_counters(stats)} if stats else {}
+    return stats_drift(computed, stored).get(user_id, {})
+
+
+def repair_stats(total_segments=None, dry_run=False):
+    """Recompute every user's stats and correct the confirmed drift (unless dry_run)."""
+    computed, stored = recompute_stats(total_segments)
+    drift = stats_drift(computed, stored)
+    confirmed = 0
+    for user_id, delta in drift.items():
+        if recheck_drift(user_id) != delta:
+            logger.info({"event": "STATS_DRIFT_UNCONFIRMED", "userId": user_id, "delta": delta})
+            continue
+        logger.warning({"event": "STATS_DRIFT", "userId": user_id, "delta": delta, "dryRun": dry_run})
+        if not dry_run:
+            apply_stats_delta(user_id, delta)
+        confirmed += 1
+    return {
+        "users": len(set(computed) | set(stored)),
+        "drifted": confirmed,
+        "unconfirmed": len(drift) - confirmed,
+        "corrected": 0 if dry_run else confirmed,
+    }
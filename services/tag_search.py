@@ -0,0 +1,129 @@
+"""
+Tag search over the inverted index (tag#<tag>#<createdAt>#<mediaId> items).
+
+Every tag is a stream of sort tokens "<createdAt>#<mediaId>" read page by
+page in createdAt order. Multi-tag queries merge the streams lazily:
+  - "or":  k-way merge, dropping duplicates;
+  - "and": leapfrog intersection; a stream that falls behind seeks straight
+           to the current candidate with a new key condition instead of
+           reading the entries in between.
+Only one page of media is fetched per request (BatchGetItem), and the
+cursor is the last token returned, so no result set is ever materialized.
+"""
+import heapq
+import config
+from services.dynamo_service import query_tag_postings, batch_get_media, format_media_item
+from utils.cursor import encode_cursor, decode_cursor
+
+MODES = {"and", "or"}
+
+
+class TagStream:
+    """Sort tokens of one tag, buffered one query page at a time."""
+
+    def __init__(self, user_id, tag, order=None, after=None):
+        self.user_id = user_id
+        self.tag = tag
+        self.order = order
+        self._fetch(after=after)
+        # Resuming from a cursor: the cursor token itself was already returned
+        if after is not None and self.peek() == after:
+            self.advance()
+
+    def _behind(self, token, target):
+        return token > target if self.order == "desc" else token < target
+
+    def _fetch(self, after=None, start_key=None):
+        self.after = after
+        self.buffer, self.last_key = query_tag_postings(
+            self.user_id, self.tag, self.order, after=after, start_key=start_key
+        )
+        self.position = 0
+
+    def peek(self):
+        """Current token, or None when the stream is exhausted."""
+        while self.position >= len(self.buffer):
+            if not self.last_key:
+                return None
+            # Next page of the same key condition
+            self._fetch(after=self.after, start_key=self.last_key)
+        return self.buffer[self.position]
+
+    def advance(self):
+        self.position += 1
+
+    def seek(self, target):
+        """Skip to the first token not behind `target`."""
+        if self.buffer and not self._behind(self.buffer[-1], target):
+            while self._behind(self.buffer[self.position], target):
+                self.position += 1
+        elif self.last_key:
+            # Jump with a new key condition instead of paging through the gap
+            self._fetch(after=target)
+        else:
+            self.position = len(self.buffer)
+
+    def __iter__(self):
+        while True:
+            token = self.peek()
+            if token is None:
+                return
+            yield token
+            self.advance()
+
+
+def intersect(streams, order=None):
+    """Tokens present in every stream, in stream order."""
+    if not streams:
+        return
+    ahead = max if order != "desc" else min
+    while True:
+        heads = [stream.peek() for stream in streams]
+        if any(head is None for head in heads):
+            return
+        target = ahead(heads)
+        if all(head == target for head in heads):
+            yield target
+            for stream in streams:
+                stream.advance()
+            continue
+        for stream, head in zip(streams, heads):
+            if head != target:
+                stream.seek(target)
+
+
+def union(streams, order=None):
+    """Tokens present in any stream, in stream order, without duplicates."""
+    previous = None
+    for token in heapq.merge(*streams, reverse=order == "desc"):
+        if token != previous:
+            yield token
+            previous = token
+
+
+def search_media(user_id, tags, mode="and", limit=None, cursor=None, order=None):
+    """
+    Return one page of a user's media carrying all ("and") or any ("or")
+    of `tags`, newest first for order="desc".
+    Result: {"items": [...], "nextCursor": str | None}
+    """
+    limit = limit or config.LIST_DEFAULT_LIMIT
+    scope = f"{user_id}|tags|{mode}|{','.join(sorted(tags))}|{order or ''}"
+    after = decode_cursor(cursor, scope)["after"] if cursor else None
+
+    streams = [TagStream(user_id, tag, order, after) for tag in tags]
+    merged = intersect(streams, order) if mode == "and" else union(streams, order)
+
+    tokens = []
+    for token in merged:
+        tokens.append(token)
+        if len(tokens) > limit:
+            break
+    next_cursor = encode_cursor({"after": tokens[limit - 1]}, scope) if len(tokens) > limit else None
+    tokens = tokens[:limit]
+
+    media_ids = [token.split("#", 1)[1] for token in tokens]
+    found = batch_get_media(user_id, media_ids) if media_ids else {}
+    # Entries whose record is gone (deleted mid-cleanup) are skipped
+    items = [format_media_item(found[m]) for m in media_ids if m in found]
+    return {"items": items, "nextCursor": next_cursor}
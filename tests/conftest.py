@@ -7,3 +7,16 @@ def dummy_jwt():
     payload = {"user_id": "123"}
     token = jwt.encode(payload, config.JWT_SECRET, algorithm="HS256")
     return f"Bearer {token}"
+
+
+@pytest.fixture
+def aws():
+    """Table and bucket served in-process by moto (benchmarks/load_backend.py)."""
+    pytest.importorskip("moto")
+    from benchmarks.load_backend import Backend
+    from utils import aws_clients
+    backend = Backend().start()
+    yield backend
+    backend.stop()
+    # Clients built under moto keep its fake credentials; later tests start fresh
+    aws_clients._clients.clear()
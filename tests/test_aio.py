@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import threading
+import time
+import pytest
+from utils import aio
+
+request = contextvars.ContextVar("request", default=None)
+
+
+def test_independent_calls_take_as_long_as_the_slowest():
+    started = time.perf_counter()
+    results = aio.run(aio.gather(
+        aio.to_thread(lambda: time.sleep(0.2) or "db"),
+        aio.to_thread(lambda: time.sleep(0.2) or "s3"),
+        aio.to_thread(lambda: time.sleep(0.1) or "variants"),
+    ))
+    assert results == ["db", "s3", "variants"]
+    assert time.perf_counter() - started < 0.35
+
+
+def test_map_limited_bounds_calls_in_flight_and_keeps_order():
+    lock, state = threading.Lock(), {"now": 0, "peak": 0}
+
+    def call(n):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.02)
+        with lock:
+            state["now"] -= 1
+        return n * n
+
+    async def square(n):
+        return await aio.to_thread(call, n)
+
+    assert aio.run(aio.map_limited(square, range(10), limit=3)) == [n * n for n in range(10)]
+    assert state["peak"] == 3
+
+
+def test_failure_cancels_siblings_and_propagates():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    def fail():
+        raise ValueError("throttled")
+
+    started = time.perf_counter()
+    with pytest.raises(ValueError):
+        aio.run(aio.gather(slow(), aio.to_thread(fail)))
+    assert cancelled and time.perf_counter() - started < 1
+
+    outcomes = aio.run(aio.map_limited(lambda n: aio.to_thread(fail) if n else asyncio.sleep(0, "ok"),
+                                       [0, 1], limit=2, return_exceptions=True))
+    assert outcomes[0] == "ok" and isinstance(outcomes[1], ValueError)
+
+
+def test_caller_context_reaches_pool_threads_and_nested_run_is_refused():
+    def inner():
+        return request.get(), aio.run(asyncio.sleep(0))
+
+    token = request.set("req-1")
+    try:
+        seen = aio.run(aio.gather(aio.to_thread(request.get), aio.to_thread(inner), return_exceptions=True))
+    finally:
+        request.reset(token)
+
+    assert seen[0] == "req-1"
+    assert isinstance(seen[1], RuntimeError)
@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import re
+import threading
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+from wsgiref.util import setup_testing_defaults
+from container import router, sqs_consumer
+from container.server import PooledWSGIServer, listen
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "template.yaml")
+
+
+def call(method, path, query="", body=b"", headers=None):
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": path, "QUERY_STRING": query,
+               "CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body)}
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    setup_testing_defaults(environ)
+    started = {}
+
+    def start_response(status, response_headers):
+        started["status"], started["headers"] = status, dict(response_headers)
+
+    chunks = router.application(environ, start_response)
+    return started["status"], started["headers"], b"".join(chunks)
+
+
+def test_routes_mirror_template_api_events():
+    with open(TEMPLATE) as f:
+        template = f.read()
+    expected = set()
+    for function in re.split(r"\n  (?=\w+Function:)", template):
+        handler = re.search(r"Handler: handlers/(\w+)\.lambda_handler", function)
+        for path, method in re.findall(r"Type: Api\s+Properties:\s+Path: (\S+)\s+Method: (\w+)", function):
+            expected.add((method.upper(), path, f"handlers.{handler.group(1)}"))
+    assert {(r.method, r.path, r.handler) for r in router.ROUTES} == expected
+
+
+def test_request_becomes_api_gateway_event_and_response_is_sent():
+    seen = {}
+
+    def handler(event, context):
+        seen["event"], seen["remaining"] = event, context.get_remaining_time_in_millis()
+        return {"statusCode": 201, "body": json.dumps({"ok": True}), "headers": {"X-Cache": "hit"}}
+
+    with patch("container.router.load_handler", return_value=handler) as mock_load:
+        status, headers, body = call("GET", "/view/m-1", "variant=thumb&a=1&a=2",
+                                     headers={"Authorization": "Bearer t", "X-Debug-Profile": "cpu.1.x"})
+
+    mock_load.assert_called_once_with("handlers.view_handler")
+    event = seen["event"]
+    assert (status, headers["X-Cache"], headers["Content-Type"], json.loads(body)) == \
+        ("201 Created", "hit", "application/json", {"ok": True})
+    assert (event["httpMethod"], event["resource"], event["pathParameters"]) == ("GET", "/view/{mediaId}", {"mediaId": "m-1"})
+    assert event["queryStringParameters"] == {"variant": "thumb", "a": "2"}
+    assert event["multiValueQueryStringParameters"]["a"] == ["1", "2"]
+    assert event["headers"]["Authorization"] == "Bearer t" and event["headers"]["X-Debug-Profile"] == "cpu.1.x"
+    assert event["body"] is None and event["requestContext"]["requestId"]
+    assert 0 < seen["remaining"] <= 29000
+
+
+def test_unknown_routes_methods_and_oversized_bodies():
+    assert call("GET", "/nope")[0] == "404 Not Found"
+    status, headers, _ = call("GET", "/delete")
+    assert (status, headers["Allow"]) == ("405 Method Not Allowed", "POST")
+    with patch("config.CONTAINER_MAX_BODY_BYTES", 4):
+        assert call("POST", "/upload", body=b"12345")[0] == "413 Request Entity Too Large"
+
+
+def test_real_handler_behind_pooled_server():
+    sock = listen("127.0.0.1", 0)
+    server = PooledWSGIServer(sock, router.application, threads=2)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/list"
+        try:
+            urllib.request.urlopen(url)
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, json.loads(e.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert status == 401 and payload["requestId"]
+
+
+def test_consumer_deletes_only_processed_messages():
+    messages = [{"MessageId": m, "ReceiptHandle": f"rh-{m}", "Body": "{}"} for m in ("a", "b")]
+    url = "https://sqs.us-east-1.amazonaws.com/123456789012/media-upload-events"
+    with patch("handlers.status_update_handler.lambda_handler",
+               return_value={"batchItemFailures": [{"itemIdentifier": "b"}]}) as mock_handler, \
+         patch("container.sqs_consumer.get_sqs") as mock_sqs:
+        assert sqs_consumer.process_batch(messages, url) == (1, 1)
+
+    record = mock_handler.call_args.args[0]["Records"][0]
+    assert (record["eventSource"], record["eventSourceARN"]) == \
+        ("aws:sqs", "arn:aws:sqs:us-east-1:123456789012:media-upload-events")
+    mock_sqs.return_value.delete_message_batch.assert_called_once_with(
+        QueueUrl=url, Entries=[{"Id": "0", "ReceiptHandle": "rh-a"}])
+    assert sqs_consumer.failed_ids(messages, {"statusCode": 500}) == {"a", "b"}
@@ -1,7 +1,16 @@
 import json
 import pytest
+import config
 from unittest.mock import patch
 from handlers import delete_handler
+from utils.errors import MediaServiceError
+
+
+@pytest.fixture(autouse=True)
+def mock_delete_keys():
+    with patch("handlers.delete_handler.delete_keys", return_value={}) as mock_keys:
+        yield mock_keys
+
 
 @pytest.fixture
 def api_event(dummy_jwt):
@@ -14,6 +23,7 @@ def test_delete_success(api_event):
     with patch("handlers.delete_handler.delete_object") as mock_s3, \
          patch("handlers.delete_handler.delete_media") as mock_db:
 
+        mock_db.return_value = {"s3Key": "user123/media123"}
         mock_s3.return_value = "user123/media123"
         result = delete_handler.lambda_handler(api_event, None)
         body = json.loads(result["body"])
@@ -25,3 +35,141 @@ def test_delete_missing_media(dummy_jwt):
     event = {"headers": {"Authorization": dummy_jwt}, "pathParameters": {}}
     result = delete_handler.lambda_handler(event, None)
     assert result["statusCode"] == 400
+
+
+def batch_event(dummy_jwt, body):
+    return {
+        "httpMethod": "POST",
+        "headers": {"Authorization": dummy_jwt},
+        "body": json.dumps(body),
+    }
+
+
+def test_batch_delete_reports_per_item_results(dummy_jwt):
+    items = {m: {"s3Key": f"123/{m}"} for m in ("m1", "m2", "m3")}
+    event = batch_event(dummy_jwt, {"mediaIds": ["m1", "m2", "m3", "m4", "m1"]})
+    with patch("handlers.delete_handler.batch_get_media", return_value=items), \
+         patch("handlers.delete_handler.batch_delete_media", return_value=["m2"]) as mock_db, \
+         patch("handlers.delete_handler.delete_objects", return_value={"m3": "AccessDenied"}) as mock_s3:
+
+        result = delete_handler.lambda_handler(event, None)
+        body = json.loads(result["body"])
+
+        assert result["statusCode"] == 200
+        mock_db.assert_called_once_with("123", ["m1", "m2", "m3"], items)
+        mock_s3.assert_called_once_with("123", ["m1", "m2", "m3"])
+        assert body["deleted"] == 1 and body["failed"] == 3
+        assert [r["status"] for r in body["results"]] == ["DELETED", "FAILED", "FAILED", "FAILED"]
+        assert body["results"][2]["error"] == "AccessDenied"
+        assert body["results"][3]["error"] == "Media not found"
+
+
+@pytest.mark.parametrize("body,error", [
+    ({}, "mediaIds must be a non-empty array"),
+    ([], "mediaIds must be a non-empty array"),
+    ("m1", "mediaIds must be a non-empty array"),
+    ({"mediaIds": [""]}, "non-empty strings"),
+    ({"mediaIds": [f"m{i}" for i in range(1001)]}, "At most 1000 mediaIds"),
+])
+def test_batch_delete_validation(dummy_jwt, body, error):
+    result = delete_handler.lambda_handler(batch_event(dummy_jwt, body), None)
+    assert result["statusCode"] == 400
+    assert error in result["body"]
+
+
+def test_delete_keeps_object_still_referenced(api_event):
+    item = {"s3Key": "123/original", "contentHash": "ab" * 32}
+    with patch("handlers.delete_handler.delete_media", return_value=item), \
+         patch("handlers.delete_handler.release_content_hash", return_value=False) as mock_release, \
+         patch("handlers.delete_handler.delete_object") as mock_s3:
+
+        result = delete_handler.lambda_handler(api_event, None)
+
+    assert result["statusCode"] == 200
+    assert "still referenced" in json.loads(result["body"])["message"]
+    mock_release.assert_called_once_with("123", "ab" * 32)
+    mock_s3.assert_not_called()
+
+
+def test_delete_last_reference_removes_shared_object(api_event):
+    item = {"s3Key": "123/original", "contentHash": "ab" * 32}
+    with patch("handlers.delete_handler.delete_media", return_value=item), \
+         patch("handlers.delete_handler.release_content_hash", return_value=True), \
+         patch("handlers.delete_handler.delete_object", return_value="123/original") as mock_s3:
+
+        result = delete_handler.lambda_handler(api_event, None)
+
+    assert result["statusCode"] == 200
+    mock_s3.assert_called_once_with("123", "original")
+
+
+def test_delete_removes_variants(api_event, mock_delete_keys):
+    item = {"s3Key": "user123/media123",
+            "variants": {"thumb": {"key": "variants/user123/media123/thumb.webp", "width": 150}}}
+    with patch("handlers.delete_handler.delete_media", return_value=item), \
+         patch("handlers.delete_handler.delete_object", return_value="user123/media123"), \
+         patch("services.derivatives.VARIANT_NAMES", {"thumb", "large"}):
+        result = delete_handler.lambda_handler(api_event, None)
+
+    assert result["statusCode"] == 200
+    mock_delete_keys.assert_called_once_with([
+        "variants/user123/media123/large.webp",
+        "variants/user123/media123/thumb.webp",
+    ])
+
+
+def test_batch_delete_releases_shared_content_per_item(dummy_jwt):
+    items = {m: {"s3Key": f"123/{m}", "contentHash": m * 32} for m in ("h1", "h2")}
+    items["p1"] = {"s3Key": "123/p1"}
+
+    def delete_object(user_id, media_id):
+        if media_id == "h1":
+            raise MediaServiceError("Failed to delete from S3: denied", 500)
+        return f"{user_id}/{media_id}"
+
+    event = batch_event(dummy_jwt, {"mediaIds": ["h1", "p1", "h2"]})
+    with patch("handlers.delete_handler.batch_get_media", return_value=items), \
+         patch("handlers.delete_handler.batch_delete_media", return_value=[]) as mock_db, \
+         patch("handlers.delete_handler.delete_objects", return_value={}), \
+         patch("handlers.delete_handler.delete_media", side_effect=lambda user_id, m: items[m]), \
+         patch("handlers.delete_handler.release_content_hash", return_value=True), \
+         patch("handlers.delete_handler.delete_object", side_effect=delete_object):
+
+        result = delete_handler.lambda_handler(event, None)
+        body = json.loads(result["body"])
+
+    mock_db.assert_called_once_with("123", ["p1"], items)
+    assert [r["status"] for r in body["results"]] == ["FAILED", "DELETED", "DELETED"]
+    assert body["results"][0]["error"] == "Failed to delete from S3: denied"
+
+
+SHA256 = "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
+
+
+def test_deleting_dedup_owner_twice_keeps_shared_object(aws, dummy_jwt):
+    from handlers import upload_handler
+    from services.dynamo_service import mark_media_completed, get_content_hash, get_media
+    from utils.aws_clients import get_s3
+
+    def upload():
+        body = {"contentType": "image/png", "fileSize": 5, "sha256": SHA256}
+        result = upload_handler.lambda_handler({"headers": {"Authorization": dummy_jwt},
+                                                "body": json.dumps(body)}, None)
+        return json.loads(result["body"])
+
+    owner = upload()["mediaId"]
+    get_s3().put_object(Bucket=config.MEDIA_BUCKET, Key=f"123/{owner}", Body=b"hello")
+    assert mark_media_completed("123", owner)
+    copy = upload()
+    assert copy["deduplicated"] is True
+
+    delete = {"headers": {"Authorization": dummy_jwt}, "pathParameters": {"mediaId": owner}}
+    first = delete_handler.lambda_handler(delete, None)
+    assert "still referenced" in json.loads(first["body"])["message"]
+    assert delete_handler.lambda_handler(delete, None)["statusCode"] == 404
+    batch = json.loads(delete_handler.lambda_handler(batch_event(dummy_jwt, {"mediaIds": [owner]}), None)["body"])
+    assert batch["results"] == [{"mediaId": owner, "status": "FAILED", "error": "Media not found"}]
+
+    get_s3().head_object(Bucket=config.MEDIA_BUCKET, Key=f"123/{owner}")
+    assert get_media("123", copy["mediaId"])["s3Key"] == f"123/{owner}"
+    assert get_content_hash("123", SHA256)["refCount"] == 1
@@ -0,0 +1,61 @@
+import io
+import json
+import pytest
+from unittest.mock import patch
+from services import derivatives
+from handlers import derivative_handler
+
+
+def test_parse_variants_sorts_and_ignores_bad_entries():
+    spec = "large:1080, thumb:150,bad,zero:0,original:500,small:640"
+    assert derivatives.parse_variants(spec) == [("thumb", 150), ("small", 640), ("large", 1080)]
+
+
+def test_choose_variant_falls_back_to_original():
+    item = {"s3Key": "u/m", "variants": {"thumb": {"key": "variants/u/m/thumb.webp", "width": 150}}}
+    assert derivatives.choose_variant(item, max_width=120) == ("thumb", "variants/u/m/thumb.webp")
+    assert derivatives.choose_variant(item, max_width=151) == ("original", "u/m")
+    assert derivatives.choose_variant({"s3Key": "u/m"}, variant="thumb") == ("original", "u/m")
+
+
+def test_render_variants_never_upscales_and_applies_orientation(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "original.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # displayed rotated by 90 degrees
+    Image.new("RGB", (800, 400), "red").save(path, "JPEG", exif=exif)
+
+    outputs = derivatives.render_variants(str(path), [("thumb", 100), ("small", 300), ("large", 1080)], "WEBP", 80)
+
+    assert [(name, width, height) for name, width, height, _ in outputs] == [("small", 300, 600), ("thumb", 100, 200)]
+    with Image.open(io.BytesIO(outputs[-1][3])) as thumb:
+        assert thumb.format == "WEBP" and thumb.size == (100, 200)
+
+
+def test_request_derivatives_invokes_asynchronously():
+    jobs = [{"userId": "u", "mediaId": "m", "s3Key": "u/m"}]
+    with patch("services.derivatives.get_lambda") as mock_lambda:
+        derivatives.request_derivatives(jobs)
+        derivatives.request_derivatives([])
+
+    mock_lambda.return_value.invoke.assert_called_once()
+    kwargs = mock_lambda.return_value.invoke.call_args.kwargs
+    assert kwargs["InvocationType"] == "Event"
+    assert json.loads(kwargs["Payload"]) == {"items": jobs}
+
+
+def test_derivative_handler_validates_items():
+    result = derivative_handler.lambda_handler({"items": [{"userId": "u"}]}, None)
+    assert result["statusCode"] == 400
+
+
+def test_derivative_handler_reports_failures():
+    jobs = [{"userId": "u", "mediaId": "m1", "s3Key": "u/m1"}, {"userId": "u", "mediaId": "m2", "s3Key": "u/m2"}]
+    results = {"m1": {"variants": ["small", "thumb"]}, "m2": {"error": "Object not found: u/m2"}}
+    with patch("handlers.derivative_handler.generate_derivatives", return_value=results) as mock_generate:
+        result = derivative_handler.lambda_handler({"items": jobs}, None)
+
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200
+    assert body["failed"] == 1 and body["results"] == results
+    mock_generate.assert_called_once_with(jobs)
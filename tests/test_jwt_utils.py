@@ -0,0 +1,58 @@
+import time
+import pytest
+import jwt
+from unittest.mock import patch
+import config
+from utils import jwt_utils
+from utils.errors import UnauthorizedError
+
+
+@pytest.fixture(autouse=True)
+def clear_claims_cache():
+    jwt_utils.claims_cache.clear()
+
+
+def bearer(payload, secret=None):
+    return {"headers": {"Authorization": f"Bearer {jwt.encode(payload, secret or config.JWT_SECRET, algorithm='HS256')}"}}
+
+
+def test_claims_cached_between_invocations():
+    event = bearer({"user_id": "u1"})
+    hits_before = jwt_utils.claims_cache.stats()["hits"]
+    with patch("utils.jwt_utils.jwt.decode", wraps=jwt.decode) as mock_decode:
+        first = jwt_utils.extract_jwt_claims(dict(event))
+        second_event = dict(event)
+        second = jwt_utils.extract_jwt_claims(second_event)
+
+    assert first == second == {"user_id": "u1"}
+    assert mock_decode.call_count == 1
+    assert second_event["userId"] == "u1"
+    assert jwt_utils.claims_cache.stats()["hits"] == hits_before + 1
+
+
+def test_cached_claims_expire_with_token():
+    event = bearer({"user_id": "u1", "exp": int(time.time()) + 10})
+    jwt_utils.extract_jwt_claims(dict(event))
+
+    # Entry lifetime follows `exp`, not the (longer) max-age
+    with patch("time.monotonic", return_value=time.monotonic() + 11), \
+            patch("utils.jwt_utils.jwt.decode", side_effect=jwt.ExpiredSignatureError):
+        with pytest.raises(UnauthorizedError, match="expired"):
+            jwt_utils.extract_jwt_claims(dict(event))
+
+
+def test_secret_rotation_invalidates_cache():
+    event = bearer({"user_id": "u1"})
+    jwt_utils.extract_jwt_claims(dict(event))
+
+    with patch("config.JWT_SECRET", "rotated-secret"):
+        with pytest.raises(UnauthorizedError, match="Invalid token"):
+            jwt_utils.extract_jwt_claims(dict(event))
+
+
+def test_get_user_id_reuses_decoded_claims():
+    event = bearer({"user_id": "u1"})
+    assert jwt_utils.get_user_id(event) == "u1"
+    with patch("utils.jwt_utils.verify_token") as mock_verify:
+        assert jwt_utils.get_user_id(event) == "u1"
+        mock_verify.assert_not_called()
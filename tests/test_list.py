@@ -15,7 +15,7 @@ def make_event(token="Bearer test.jwt.token", query=None):
 
 def test_list_success():
     with patch("handlers.list_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
-         patch("handlers.list_handler.list_media", return_value=[{"mediaId": "1"}]):
+         patch("handlers.list_handler.list_media", return_value={"items": [{"mediaId": "1"}], "nextCursor": None}):
         result = list_handler.lambda_handler(make_event(), None)
         body = json.loads(result["body"])
 
@@ -28,7 +28,7 @@ def test_list_with_filters():
     filters = {"status": "COMPLETED", "createdAfter": "1700000000"}
     with patch("handlers.list_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
          patch("handlers.list_handler.list_media") as mock_list:
-        mock_list.return_value = [{"mediaId": "2", "status": "COMPLETED"}]
+        mock_list.return_value = {"items": [{"mediaId": "2", "status": "COMPLETED"}], "nextCursor": None}
 
         result = list_handler.lambda_handler(make_event(query=filters), None)
         body = json.loads(result["body"])
@@ -38,6 +38,48 @@ def test_list_with_filters():
         assert body["items"][0]["status"] == "COMPLETED"
 
 
+def test_list_pagination_params():
+    query = {"limit": "10", "cursor": "abc.def", "order": "desc"}
+    with patch("handlers.list_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.list_handler.list_media") as mock_list:
+        mock_list.return_value = {"items": [{"mediaId": "3"}], "nextCursor": "next.sig"}
+
+        result = list_handler.lambda_handler(make_event(query=query), None)
+        body = json.loads(result["body"])
+
+        assert result["statusCode"] == 200
+        assert body["nextCursor"] == "next.sig"
+        mock_list.assert_called_once_with("user123", {}, limit=10, cursor="abc.def", order="desc", fields=None)
+
+
+@pytest.mark.parametrize("query,error", [
+    ({"limit": "abc"}, "limit must be an integer"),
+    ({"limit": "0"}, "limit must be between"),
+    ({"order": "sideways"}, "order must be one of"),
+])
+def test_list_invalid_pagination(query, error):
+    with patch("handlers.list_handler.extract_jwt_claims", return_value={"user_id": "user123"}):
+        result = list_handler.lambda_handler(make_event(query=query), None)
+        assert result["statusCode"] == 400
+        assert error in result["body"]
+
+
+def test_cursor_round_trip_and_scope():
+    from utils.cursor import encode_cursor, decode_cursor
+    from utils.errors import BadRequestError
+
+    key = {"PK": "user#user123", "SK": "media#1", "createdAt": 1700000000}
+    cursor = encode_cursor(key, "user123|GSI_CreatedAt|desc")
+
+    assert decode_cursor(cursor, "user123|GSI_CreatedAt|desc") == key
+    with pytest.raises(BadRequestError):
+        decode_cursor(cursor, "other|GSI_CreatedAt|desc")
+    with pytest.raises(BadRequestError):
+        decode_cursor(cursor[:-2] + "xx", "user123|GSI_CreatedAt|desc")
+    with pytest.raises(BadRequestError):
+        decode_cursor(cursor[:-2] + "é", "user123|GSI_CreatedAt|desc")
+
+
 def test_list_missing_user_id():
     with patch("handlers.list_handler.extract_jwt_claims", return_value={}):
         result = list_handler.lambda_handler(make_event(), None)
@@ -56,3 +98,99 @@ def test_list_media_service_error():
         result = list_handler.lambda_handler(make_event(), None)
         assert result["statusCode"] == 500
         assert "InternalServiceError" in result["body"]
+
+
+@pytest.mark.parametrize("filters,order,plan_name", [
+    ({}, None, "BASE_TABLE_QUERY"),
+    ({}, "desc", "CREATED_AT_INDEX_QUERY"),
+    ({"createdAfter": 1}, None, "CREATED_AT_INDEX_QUERY"),
+    ({"status": "PENDING", "createdBefore": 2}, None, "STATUS_INDEX_QUERY"),
+    ({"mediaId": "m1", "status": "PENDING"}, None, "GET_ITEM"),
+])
+def test_list_query_planner(filters, order, plan_name):
+    from services.dynamo_service import _plan_list_query
+
+    assert _plan_list_query("user123", filters, order)["name"] == plan_name
+
+
+def test_list_query_planner_status_filter_fallback():
+    from services.dynamo_service import _plan_list_query
+
+    with patch("config.STATUS_INDEX_ENABLED", False):
+        plan = _plan_list_query("user123", {"status": "PENDING"})
+
+    assert plan["name"] == "BASE_TABLE_QUERY+STATUS_FILTER"
+    assert "FilterExpression" in plan["query"]
+
+
+def test_list_fields_projection():
+    with patch("handlers.list_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.list_handler.list_media", return_value={"items": [], "nextCursor": None}) as mock_list:
+        result = list_handler.lambda_handler(make_event(query={"fields": "createdAt, status,createdAt"}), None)
+
+    assert result["statusCode"] == 200
+    assert mock_list.call_args.kwargs["fields"] == ["mediaId", "createdAt", "status"]
+
+    with patch("handlers.list_handler.extract_jwt_claims", return_value={"user_id": "user123"}):
+        result = list_handler.lambda_handler(make_event(query={"fields": "createdBy"}), None)
+    assert result["statusCode"] == 400
+    assert "Unsupported field: createdBy" in result["body"]
+
+
+def test_media_formatter_builds_only_requested_fields():
+    from services.dynamo_service import media_formatter, media_projection, format_media_item
+
+    item = {"PK": "user#u", "SK": "media#m1", "status": "COMPLETED", "createdAt": 5, "fileSize": 10,
+            "createdBy": "u", "variants": {"thumb": {}, "large": {}}}
+    assert media_formatter(["mediaId", "createdAt", "status"])(item) == {
+        "mediaId": "m1", "status": "COMPLETED", "createdAt": 5}
+    assert format_media_item(item) == {
+        "mediaId": "m1", "s3Key": None, "status": "COMPLETED", "requestId": None, "createdAt": 5,
+        "modifiedAt": 0, "fileSize": 10, "variants": ["large", "thumb"]}
+
+    projection = media_projection(["mediaId", "status"], ("PK", "SK", "createdAt"))
+    assert projection["ProjectionExpression"] == "#f0, #f1, #f2, #f3"
+    assert list(projection["ExpressionAttributeNames"].values()) == ["PK", "SK", "createdAt", "status"]
+
+
+def seed_media(count, status=lambda n: "COMPLETED"):
+    from services.dynamo_service import insert_media
+
+    for n in range(count):
+        insert_media("u1", f"m{n:02d}", f"u1/m{n:02d}", "req", status=status(n), created_at=1700000000 + n)
+
+
+def list_all(limit, **kwargs):
+    from services.dynamo_service import list_media
+
+    pages, cursor = [], None
+    while True:
+        page = list_media("u1", limit=limit, cursor=cursor, **kwargs)
+        pages.append([item["mediaId"] for item in page["items"]])
+        cursor = page["nextCursor"]
+        if not cursor:
+            return pages
+
+
+@pytest.mark.parametrize("order,expected", [
+    (None, [f"m{n:02d}" for n in range(7)]),
+    ("desc", [f"m{n:02d}" for n in reversed(range(7))]),
+])
+def test_list_media_pages_through_query_results(aws, order, expected):
+    seed_media(7)
+
+    pages = list_all(3, order=order)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == expected
+
+
+def test_list_media_fills_pages_past_filtered_query_pages(aws):
+    # Every third item matches; each Limit=3 query page holds at most one of them
+    seed_media(10, status=lambda n: "PENDING" if n % 3 == 0 else "COMPLETED")
+
+    with patch("config.STATUS_INDEX_ENABLED", False):
+        pages = list_all(2, filters={"status": "PENDING"})
+    indexed = list_all(2, filters={"status": "PENDING"})
+
+    assert pages == indexed == [["m00", "m03"], ["m06", "m09"]]
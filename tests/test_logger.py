@@ -0,0 +1,43 @@
+import json
+import logging
+from unittest.mock import MagicMock
+from utils.logger import JsonFormatter, SamplingFilter, parse_sample_rates
+
+
+def make_record(msg, level=logging.INFO):
+    return logging.LogRecord("media-service", level, __file__, 1, msg, None, None)
+
+
+def test_formatter_redacts_and_caps_fields():
+    event = {"headers": {"Authorization": "Bearer secret"}, "body": "x" * 50}
+    line = JsonFormatter(max_field_chars=10).format(make_record({"event": "RAW_EVENT", "payload": event}))
+    doc = json.loads(line)
+
+    assert doc["level"] == "INFO"
+    assert doc["payload"]["headers"]["Authorization"] == "[REDACTED]"
+    assert doc["payload"]["body"].startswith("x" * 10 + "...(truncated 40 chars)")
+    assert event["headers"]["Authorization"] == "Bearer secret"
+
+
+def test_lazy_fields_only_evaluated_when_emitted():
+    expensive = MagicMock(return_value={"size": 1})
+    logger = logging.getLogger("media-service")
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        logger.debug({"event": "CACHE", "stats": expensive})
+        expensive.assert_not_called()
+    finally:
+        logger.setLevel(level)
+
+    doc = json.loads(JsonFormatter(100).format(make_record({"event": "CACHE", "stats": expensive})))
+    assert doc["stats"] == {"size": 1}
+
+
+def test_sampling_drops_only_configured_info_events():
+    sampler = SamplingFilter(parse_sample_rates("EXIT=0, ENTER=1,bad"))
+
+    assert not sampler.filter(make_record({"event": "EXIT"}))
+    assert sampler.filter(make_record({"event": "ENTER"}))
+    assert sampler.filter(make_record({"action": "INSERT_MEDIA"}))
+    assert sampler.filter(make_record({"event": "EXIT"}, logging.ERROR))
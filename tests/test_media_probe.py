@@ -0,0 +1,78 @@
+import struct
+import pytest
+from unittest.mock import patch
+from services import media_probe
+from services.media_probe import probe_image
+
+
+class FakeObject:
+    """Serves ranged reads from bytes and records the requested ranges."""
+
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def __call__(self, start, end):
+        self.ranges.append((start, end))
+        return self.data[start:end + 1]
+
+
+def jpeg(width, height, orientation=None, padding=0):
+    parts = [b"\xff\xd8"]
+    if orientation:
+        ifd = struct.pack(">H", 1) + struct.pack(">HHIHH", 0x0112, 3, 1, orientation, 0) + b"\x00" * 4
+        exif = b"Exif\x00\x00" + b"MM\x00\x2a" + struct.pack(">I", 8) + ifd
+        parts.append(b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif)
+    if padding:
+        parts.append(b"\xff\xe2" + struct.pack(">H", padding + 2) + b"\x00" * padding)
+    parts.append(b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00")
+    parts.append(b"\xff\xda" + b"\x00" * 100)
+    return b"".join(parts)
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 640, 480) + b"\x08\x06\x00\x00\x00"
+GIF = b"GIF89a" + struct.pack("<HH", 32, 16) + b"\x00" * 10
+WEBP_VP8X = b"RIFF\x00\x00\x00\x00WEBPVP8X" + b"\x0a\x00\x00\x00" + b"\x00" * 4 + (1999).to_bytes(3, "little") + (999).to_bytes(3, "little")
+WEBP_VP8L = b"RIFF\x00\x00\x00\x00WEBPVP8L" + b"\x00" * 4 + b"\x2f" + struct.pack("<I", (99 << 14) | 199) + b"\x00" * 8
+
+
+@pytest.mark.parametrize("data,expected", [
+    (PNG, ("image/png", 640, 480)),
+    (GIF, ("image/gif", 32, 16)),
+    (WEBP_VP8X, ("image/webp", 2000, 1000)),
+    (WEBP_VP8L, ("image/webp", 200, 100)),
+    (jpeg(800, 600), ("image/jpeg", 800, 600)),
+])
+def test_probe_formats(data, expected):
+    info = probe_image(FakeObject(data), len(data))
+    assert (info["contentType"], info["width"], info["height"]) == expected
+
+
+def test_probe_jpeg_orientation_swaps_display_dimensions():
+    info = probe_image(FakeObject(jpeg(800, 600, orientation=6)))
+    assert (info["width"], info["height"], info["orientation"]) == (600, 800, 6)
+
+
+def test_probe_jpeg_skips_large_segments_with_ranged_reads():
+    data = jpeg(1024, 768, padding=60000)
+    obj = FakeObject(data)
+    with patch("config.MEDIA_PROBE_BYTES", 4096):
+        info = probe_image(obj, len(data))
+
+    assert (info["width"], info["height"]) == (1024, 768)
+    assert sum(end - start + 1 for start, end in obj.ranges) < 10000
+
+
+def test_probe_unknown_bytes():
+    assert probe_image(FakeObject(b"%PDF-1.7 not an image"), 21) is None
+
+
+def test_probe_object_reports_size_and_survives_read_errors():
+    with patch("services.media_probe.read_range", side_effect=Exception("boom")):
+        assert media_probe.probe_object("u1/m1", 123) == {"actualFileSize": 123}
+
+    with patch("services.media_probe.read_range", side_effect=lambda key, s, e: PNG[s:e + 1]):
+        assert media_probe.probe_object("u1/m1", len(PNG)) == {
+            "actualFileSize": len(PNG), "detectedContentType": "image/png",
+            "width": 640, "height": 480, "orientation": 1,
+        }
@@ -0,0 +1,73 @@
+import json
+import pytest
+from unittest.mock import patch
+from handlers import multipart_handler
+
+ITEM = {"s3Key": "user123/m1", "uploadId": "up-1", "partCount": 3, "status": "PENDING"}
+
+
+def make_event(action, body, media_id="m1"):
+    return {
+        "headers": {"Authorization": "Bearer test.jwt.token"},
+        "pathParameters": {"mediaId": media_id, "action": action},
+        "body": json.dumps(body),
+    }
+
+
+@pytest.fixture
+def claims():
+    with patch("handlers.multipart_handler.extract_jwt_claims", return_value={"user_id": "user123"}):
+        yield
+
+
+def test_complete_sends_sorted_quoted_etags(claims):
+    parts = [{"partNumber": 2, "eTag": "b"}, {"partNumber": 1, "eTag": '"a"'}, {"partNumber": 3, "eTag": "c"}]
+    with patch("handlers.multipart_handler.get_media", return_value=ITEM), \
+         patch("handlers.multipart_handler.complete_multipart_upload") as mock_complete:
+        result = multipart_handler.lambda_handler(make_event("complete", {"uploadId": "up-1", "parts": parts}), None)
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["status"] == "UPLOADED"
+    mock_complete.assert_called_once_with("user123/m1", "up-1", [(1, '"a"'), (2, '"b"'), (3, '"c"')])
+
+
+@pytest.mark.parametrize("parts,error", [
+    ([{"partNumber": 1, "eTag": "a"}], "Missing parts: [2, 3]"),
+    ([{"partNumber": 4, "eTag": "a"}], "partNumber must be an integer between 1 and 3"),
+    ([{"partNumber": 1, "eTag": "a"}, {"partNumber": 1, "eTag": "b"}], "Duplicate partNumber: 1"),
+    ([{"partNumber": 1}], "Missing eTag for part 1"),
+])
+def test_complete_validates_parts(claims, parts, error):
+    with patch("handlers.multipart_handler.get_media", return_value=ITEM):
+        result = multipart_handler.lambda_handler(make_event("complete", {"uploadId": "up-1", "parts": parts}), None)
+
+    assert result["statusCode"] == 400
+    assert error in json.loads(result["body"])["error"]
+
+
+def test_parts_resigns_requested_parts(claims):
+    with patch("handlers.multipart_handler.get_media", return_value=ITEM), \
+         patch("handlers.multipart_handler.generate_part_urls", return_value=["u1", "u3"]) as mock_sign:
+        result = multipart_handler.lambda_handler(make_event("parts", {"uploadId": "up-1", "partNumbers": [3, 1, 3]}), None)
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["parts"] == [{"partNumber": 1, "uploadUrl": "u1"}, {"partNumber": 3, "uploadUrl": "u3"}]
+    mock_sign.assert_called_once_with("user123/m1", "up-1", [1, 3])
+
+
+def test_abort_removes_upload_and_record(claims):
+    with patch("handlers.multipart_handler.get_media", return_value=ITEM), \
+         patch("handlers.multipart_handler.abort_multipart_upload") as mock_abort, \
+         patch("handlers.multipart_handler.delete_media") as mock_delete:
+        result = multipart_handler.lambda_handler(make_event("abort", {"uploadId": "up-1"}), None)
+
+    assert result["statusCode"] == 200
+    mock_abort.assert_called_once_with("user123/m1", "up-1")
+    mock_delete.assert_called_once_with("user123", "m1")
+
+
+def test_unknown_upload_id_is_not_found(claims):
+    with patch("handlers.multipart_handler.get_media", return_value=ITEM):
+        result = multipart_handler.lambda_handler(make_event("abort", {"uploadId": "other"}), None)
+
+    assert result["statusCode"] == 404
@@ -0,0 +1,95 @@
+import datetime
+import pytest
+from unittest.mock import patch
+import boto3
+from botocore.config import Config
+from botocore.credentials import ReadOnlyCredentials
+from urllib.parse import parse_qsl, urlsplit
+from services import s3_service
+from services.presigner import Presigner, signing_key
+
+ENDPOINT = "http://localhost:4566"
+NOW = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+def botocore_url(operation, params, token=None, endpoint=ENDPOINT, now=NOW, expires_in=300):
+    client = boto3.client(
+        "s3",
+        region_name="us-east-1",
+        endpoint_url=endpoint,
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="secret",
+        aws_session_token=token,
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+    )
+    with patch("botocore.auth.get_current_datetime", return_value=now.replace(tzinfo=None)):
+        return client.generate_presigned_url(operation, Params=params, ExpiresIn=expires_in)
+
+
+def make_presigner(token=None):
+    creds = ReadOnlyCredentials("AKIDEXAMPLE", "secret", token)
+    return Presigner(ENDPOINT, "us-east-1", lambda: creds)
+
+
+@pytest.mark.parametrize("token", [None, "session/token+="])
+def test_get_matches_botocore(token):
+    key = "user 1/media~1+x"
+    expected = botocore_url("get_object", {"Bucket": "media-bucket", "Key": key}, token)
+    assert make_presigner(token).presign(key, "GET", "media-bucket", 300, now=NOW) == expected
+
+
+def test_put_with_signed_content_type_matches_botocore():
+    params = {"Bucket": "media-bucket", "Key": "u1/m1", "ContentType": "image/jpeg"}
+    expected = botocore_url("put_object", params)
+    url = make_presigner().presign(
+        "u1/m1", "PUT", "media-bucket", 300, headers={"Content-Type": "image/jpeg"}, now=NOW
+    )
+    assert url == expected
+
+
+def test_upload_part_query_params_match_botocore():
+    params = {"Bucket": "media-bucket", "Key": "u1/m1", "UploadId": "abc/def", "PartNumber": 3}
+    expected = botocore_url("upload_part", params)
+    url = make_presigner().presign(
+        "u1/m1", "PUT", "media-bucket", 300, params={"uploadId": "abc/def", "partNumber": 3}, now=NOW
+    )
+    assert url == expected
+
+
+def test_presign_many_reuses_signing_key():
+    signing_key.cache_clear()
+    keys = [f"u1/m{i}" for i in range(50)]
+    urls = make_presigner().presign_many(keys, "GET", "media-bucket", 300, now=NOW)
+
+    assert len(set(urls)) == 50
+    assert urls[7] == botocore_url("get_object", {"Bucket": "media-bucket", "Key": "u1/m7"})
+    assert signing_key.cache_info().misses == 1
+
+
+def test_presign_parts_matches_botocore():
+    urls = make_presigner().presign_parts("u1/m1", "abc/def", [1, 2, 3], "media-bucket", 300, now=NOW)
+
+    params = {"Bucket": "media-bucket", "Key": "u1/m1", "UploadId": "abc/def"}
+    assert urls == [botocore_url("upload_part", dict(params, PartNumber=n)) for n in (1, 2, 3)]
+
+
+def test_client_urls_verify_against_the_host_they_are_served_on():
+    creds = ReadOnlyCredentials("AKIDEXAMPLE", "secret", None)
+    with patch("config.ENDPOINT", "http://localstack:4566"), \
+         patch("config.PUBLIC_ENDPOINT", "https://media.example.com"), \
+         patch("config.REGION", "us-east-1"), patch("config.MEDIA_BUCKET", "media-bucket"):
+        with patch("services.s3_service.presigner", s3_service.client_presigner()) as presigner, \
+             patch.object(presigner, "_credentials", lambda: creds):
+            _, key, upload_url = s3_service.generate_upload_url("u1", "image/png")
+            download_url = s3_service.generate_download_url("u1", "m1")
+
+    for url, operation, params in (
+        (upload_url, "put_object", {"Bucket": "media-bucket", "Key": key, "ContentType": "image/png"}),
+        (download_url, "get_object", {"Bucket": "media-bucket", "Key": "u1/m1"}),
+    ):
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+        signed_at = datetime.datetime.strptime(query["X-Amz-Date"], "%Y%m%dT%H%M%SZ")
+        assert parts.netloc == "media.example.com"
+        assert url == botocore_url(operation, params, endpoint=f"{parts.scheme}://{parts.netloc}",
+                                   now=signed_at, expires_in=int(query["X-Amz-Expires"]))
@@ -0,0 +1,81 @@
+import json
+import threading
+import tracemalloc
+from unittest.mock import patch
+from utils import profiling
+from utils.decorators import with_request_id
+from utils.response import success
+
+
+@with_request_id
+def lambda_handler(event, context):
+    return success({"items": [{"id": str(i)} for i in range(200)]})
+
+
+def test_signed_header_selects_mode_until_it_expires():
+    with patch("config.PROFILE_SECRET", "s3cret"):
+        header = profiling.profile_header("memory", 60, now=1000)
+        assert profiling._header_mode({"headers": {"X-Debug-Profile": header}}, now=1030) == "memory"
+        assert profiling._header_mode({"headers": {"x-debug-profile": header}}, now=1061) is None
+        assert profiling._header_mode({"headers": {"X-Debug-Profile": header.replace("memory", "all")}},
+                                      now=1030) is None
+        assert profiling._header_mode({"headers": {"X-Debug-Profile": "cpu.x"}}, now=1030) is None
+    with patch("config.PROFILE_SECRET", "other"):
+        assert profiling._header_mode({"headers": {"X-Debug-Profile": header}}, now=1030) is None
+
+
+def test_disabled_profiling_never_runs_a_profiler():
+    with patch("config.PROFILE_SAMPLE_RATE", 0), patch("config.PROFILE_SECRET", ""), \
+         patch("utils.profiling.run") as mock_run:
+        header = {"X-Debug-Profile": "cpu.9999999999.abc"}
+        assert lambda_handler({"requestId": "r", "headers": header}, None)["statusCode"] == 200
+    mock_run.assert_not_called()
+
+
+def test_sampled_request_writes_pstats_and_summary(tmp_path):
+    with patch("config.PROFILE_SAMPLE_RATE", 1.0), patch("config.PROFILE_MODE", "all"), \
+         patch("config.PROFILE_OUTPUT", str(tmp_path)):
+        result = lambda_handler({"requestId": "../req-1"}, None)
+
+    assert result["statusCode"] == 200
+    directory = tmp_path / "test_profiling"
+    assert (directory / ".._req-1.pstats").exists()
+    summary = json.loads((directory / ".._req-1.json").read_text())
+    assert (summary["requestId"], summary["mode"]) == ("../req-1", "all")
+    assert any("lambda_handler" in entry["function"] for entry in summary["functions"])
+    assert summary["allocations"] and summary["peakBytes"] > 0
+
+
+def test_artifacts_go_to_s3_prefix_and_failures_are_swallowed():
+    with patch("config.PROFILE_OUTPUT", "s3://profiles/media/"), \
+         patch("utils.aws_clients.get_s3") as mock_s3:
+        mock_s3.return_value.put_object.side_effect = [None, RuntimeError("denied")]
+        assert profiling.run("cpu", "list_handler", "req-2", sum, [1, 2]) == 3
+
+    keys = [call.kwargs["Key"] for call in mock_s3.return_value.put_object.call_args_list]
+    assert keys == ["media/list_handler/req-2.pstats", "media/list_handler/req-2.json"]
+
+
+def test_overlapping_memory_profiles_share_the_tracer(tmp_path):
+    b_running, a_finished, results = threading.Event(), threading.Event(), {}
+
+    def request_b():
+        b_running.set()
+        a_finished.wait(5)
+        return "b"
+
+    def request_a():
+        thread = threading.Thread(target=lambda: results.update(b=profiling.run("memory", "h", "b", request_b)))
+        thread.start()
+        b_running.wait(5)
+        return thread
+
+    with patch("config.PROFILE_OUTPUT", str(tmp_path)):
+        thread = profiling.run("memory", "h", "a", request_a)
+        # A finished first; B still relies on the tracer A started
+        assert tracemalloc.is_tracing()
+        a_finished.set()
+        thread.join()
+
+    assert results == {"b": "b"} and not tracemalloc.is_tracing()
+    assert json.loads((tmp_path / "h" / "b.json").read_text())["allocations"]
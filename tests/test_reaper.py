@@ -0,0 +1,141 @@
+import base64
+import datetime
+import pytest
+from unittest.mock import patch
+from handlers import reaper_handler
+from services import reaper
+
+OLD = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+NEW = datetime.datetime(2026, 6, 1, tzinfo=datetime.timezone.utc)
+CUTOFF = int(datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def pending(media_id, **extra):
+    return {"PK": "user#u", "SK": f"media#{media_id}", "s3Key": f"u/{media_id}", "status": "PENDING", **extra}
+
+
+def test_rate_limiter_spaces_operations():
+    clock, sleeps = [100.0], []
+    limiter = reaper.RateLimiter(10, clock=lambda: clock[0], sleep=sleeps.append)
+    limiter.acquire()
+    limiter.acquire(5)
+    limiter.acquire()
+    assert sleeps == [pytest.approx(0.1), pytest.approx(0.6)]
+    reaper.RateLimiter(0, sleep=sleeps.append).acquire(1000)
+    assert len(sleeps) == 2
+
+
+def test_stale_upload_that_landed_is_completed():
+    with patch("services.reaper.head_object", return_value={"ContentLength": 7}), \
+         patch("services.reaper.probe_object", return_value={"actualFileSize": 7}), \
+         patch("services.reaper.mark_media_completed", return_value=True) as mock_complete, \
+         patch("services.reaper.request_derivatives") as mock_derive, \
+         patch("services.reaper.delete_pending_media") as mock_delete:
+        assert reaper.reap_stale_item(pending("m"), False, reaper.RateLimiter(0)) == "recovered"
+
+    mock_complete.assert_called_once_with("u", "m", {"actualFileSize": 7}, declared=pending("m"))
+    mock_derive.assert_called_once_with([{"userId": "u", "mediaId": "m", "s3Key": "u/m"}])
+    mock_delete.assert_not_called()
+
+
+def test_abandoned_multipart_upload_is_aborted_and_deleted():
+    item = pending("m", uploadId="up-1", contentHash="ab" * 32)
+    with patch("services.reaper.head_object", return_value=None), \
+         patch("services.reaper.abort_multipart_upload") as mock_abort, \
+         patch("services.reaper.delete_pending_media", return_value=item) as mock_delete, \
+         patch("services.reaper.release_content_hash") as mock_release:
+        assert reaper.reap_stale_item(item, True, reaper.RateLimiter(0)) == "stale"
+        mock_delete.assert_not_called()
+        assert reaper.reap_stale_item(item, False, reaper.RateLimiter(0)) == "deleted"
+
+    mock_abort.assert_called_once_with("u/m", "up-1")
+    mock_delete.assert_called_once_with("u", "m")
+    mock_release.assert_called_once_with("u", "ab" * 32)
+
+
+def test_multipart_upload_is_left_alone_within_the_abort_window():
+    item = pending("m", uploadId="up-1", createdAt=CUTOFF + 3600)
+    single = pending("s", createdAt=CUTOFF + 3600)
+    with patch("services.reaper.head_object", return_value=None) as mock_head, \
+         patch("services.reaper.abort_multipart_upload") as mock_abort, \
+         patch("services.reaper.delete_pending_media", return_value=single) as mock_delete:
+        assert reaper.reap_stale_item(item, False, reaper.RateLimiter(0), CUTOFF) == "in_progress"
+        mock_head.assert_not_called()
+        # A single PUT of the same age is past its URL expiry and gets reaped
+        assert reaper.reap_stale_item(single, False, reaper.RateLimiter(0), CUTOFF) == "deleted"
+
+    mock_abort.assert_not_called()
+    mock_delete.assert_called_once_with("u", "s")
+
+
+def test_pending_segment_resumes_from_checkpoint_and_stops_at_deadline():
+    pages = [([pending("a")], {"PK": "user#u", "SK": "media#a"}), ([pending("b")], {"PK": "user#u", "SK": "media#b"})]
+    checkpoint = {"totalSegments": 2, "lastKey": {"PK": "user#u", "SK": "media#0"}, "done": False}
+    with patch("services.reaper.get_checkpoint", return_value=checkpoint), \
+         patch("services.reaper.scan_stale_pending", return_value=iter(pages)) as mock_scan, \
+         patch("services.reaper.reap_stale_item", return_value="deleted"), \
+         patch("services.reaper.save_checkpoint") as mock_save:
+        counts, finished = reaper.reap_pending_segment(1, 2, CUTOFF, 0, False, reaper.RateLimiter(0))
+
+    assert (counts, finished) == ({"deleted": 1}, False)
+    mock_scan.assert_called_once_with(1, 2, CUTOFF, {"PK": "user#u", "SK": "media#0"})
+    mock_save.assert_called_once_with("pending#1", {"totalSegments": 2, "lastKey": pages[0][1], "done": False})
+
+
+def test_find_orphans_keeps_recorded_recent_and_shared_objects():
+    objects = [
+        {"Key": "u/kept", "LastModified": OLD},
+        {"Key": "u/gone", "LastModified": OLD},
+        {"Key": "u/young", "LastModified": NEW},
+        {"Key": "u/shared", "LastModified": OLD},
+        {"Key": "variants/u/gone/thumb.webp", "LastModified": OLD},
+        {"Key": "variants/u/shared/thumb.webp", "LastModified": OLD},
+        {"Key": "exports/2026/report.csv", "LastModified": OLD},
+    ]
+    digest = base64.b64encode(b"\x01" * 32).decode()
+
+    def head(key, checksum=False):
+        return {"ChecksumSHA256": digest} if key == "u/shared" else {}
+
+    with patch("services.reaper.batch_get_media", return_value={"kept": {}}) as mock_get, \
+         patch("services.reaper.head_object", side_effect=head), \
+         patch("services.reaper.get_content_hash", return_value={"s3Key": "u/shared", "refCount": 2}) as mock_hash:
+        orphans = reaper.find_orphans(objects, CUTOFF)
+
+    assert orphans == ["u/gone", "variants/u/gone/thumb.webp"]
+    mock_get.assert_called_once_with("u", ["kept", "gone", "shared"])
+    mock_hash.assert_called_once_with("u", "01" * 32)
+
+
+def test_orphans_are_deleted_with_their_variants():
+    objects = [{"Key": "u/gone", "LastModified": OLD}]
+    with patch("services.reaper.get_checkpoint", return_value={"startAfter": "u/a"}), \
+         patch("services.reaper.list_object_pages", return_value=iter([objects])) as mock_list, \
+         patch("services.reaper.find_orphans", return_value=["u/gone"]), \
+         patch("services.reaper.VARIANT_NAMES", {"thumb"}), \
+         patch("services.reaper.delete_keys", return_value={}) as mock_delete, \
+         patch("services.reaper.save_checkpoint") as mock_save, \
+         patch("services.reaper.clear_checkpoints") as mock_clear:
+        summary = reaper.reap_orphans(CUTOFF, float("inf"), limiter=reaper.RateLimiter(0))
+
+    assert summary == {"listed": 1, "orphaned": 1, "deleted": 1, "failed": 0, "complete": True}
+    mock_list.assert_called_once_with("u/a")
+    mock_delete.assert_called_once_with(["u/gone", "variants/u/gone/thumb.webp"])
+    mock_save.assert_called_once_with("objects", {"startAfter": "u/gone"})
+    mock_clear.assert_called_once_with(["objects"])
+
+
+@pytest.mark.parametrize("event", [{"jobs": []}, {"jobs": ["pending", "other"]}, {"jobs": "pending"},
+                                   {"totalSegments": 0}, {"totalSegments": True}])
+def test_reaper_handler_validation(event):
+    assert reaper_handler.lambda_handler(event, None)["statusCode"] == 400
+
+
+def test_reaper_handler_runs_selected_jobs():
+    summary = {"pending": {"deleted": 2, "complete": True}}
+    with patch("handlers.reaper_handler.run_reaper", return_value=summary) as mock_run:
+        result = reaper_handler.lambda_handler({"jobs": ["pending"], "totalSegments": 8, "dryRun": True}, None)
+
+    assert result["statusCode"] == 200
+    assert mock_run.call_args.args == (["pending"], 8)
+    assert mock_run.call_args.kwargs["dry_run"] is True
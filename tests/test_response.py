@@ -0,0 +1,39 @@
+import json
+from decimal import Decimal
+import pytest
+from utils import response
+from utils.decorators import with_request_id
+
+
+@pytest.mark.parametrize("backend", sorted(response.JSON_BACKENDS))
+def test_backends_produce_same_document(backend):
+    payload = {"items": [{"fileSize": Decimal("2048"), "ratio": Decimal("1.5"), "name": "café"}], "n": None}
+    body = response.JSON_BACKENDS[backend](payload)
+    assert json.loads(body) == {"items": [{"fileSize": 2048, "ratio": 1.5, "name": "café"}], "n": None}
+
+
+def test_decorator_renders_once_with_request_id():
+    @with_request_id
+    def handler(event, context):
+        return response.success({"items": []}, 201)
+
+    result = handler({"requestContext": {"requestId": "req-1"}}, None)
+
+    assert result["statusCode"] == 201
+    assert json.loads(result["body"]) == {"items": [], "requestId": "req-1"}
+
+
+def test_decorator_unhandled_error_includes_request_id():
+    @with_request_id
+    def handler(event, context):
+        raise RuntimeError("boom")
+
+    result = handler({"requestId": "req-2"}, None)
+
+    assert result["statusCode"] == 500
+    assert json.loads(result["body"]) == {"error": "Internal server error", "type": "RuntimeError", "requestId": "req-2"}
+
+
+def test_non_response_results_pass_through():
+    failures = {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert response.render(failures, "req-3") is failures
@@ -0,0 +1,99 @@
+import json
+import pytest
+from unittest.mock import patch
+from handlers import search_handler, tags_handler
+from services import tag_search
+from utils.common import parse_tags
+from utils.errors import BadRequestError
+
+
+def fake_index(postings, page_size=2):
+    """query_tag_postings over {tag: [tokens]}, honouring order, bounds and paging."""
+    def query(user_id, tag, order=None, after=None, start_key=None, limit=None):
+        tokens = sorted(postings.get(tag, []), reverse=order == "desc")
+        if after is not None:
+            tokens = [t for t in tokens if (t <= after if order == "desc" else t >= after)]
+        start = start_key["i"] if start_key else 0
+        page = tokens[start:start + page_size]
+        more = start + page_size < len(tokens)
+        return page, {"i": start + page_size} if more else None
+    return query
+
+
+POSTINGS = {
+    "beach": ["001#a", "002#b", "003#c", "005#e", "008#h", "009#i"],
+    "sunset": ["002#b", "004#d", "005#e", "009#i"],
+    "cat": ["005#e", "006#f", "009#i"],
+}
+
+
+@pytest.mark.parametrize("tags, mode, order, expected", [
+    (["beach", "sunset"], "and", None, ["002#b", "005#e", "009#i"]),
+    (["beach", "sunset", "cat"], "and", "desc", ["009#i", "005#e"]),
+    (["sunset", "cat"], "or", None, ["002#b", "004#d", "005#e", "006#f", "009#i"]),
+    (["beach", "nothing"], "and", None, []),
+])
+def test_merge_streams(tags, mode, order, expected):
+    with patch("services.tag_search.query_tag_postings", side_effect=fake_index(POSTINGS)):
+        streams = [tag_search.TagStream("u", tag, order) for tag in tags]
+        merge = tag_search.intersect if mode == "and" else tag_search.union
+        assert list(merge(streams, order)) == expected
+
+
+def test_search_media_paginates_with_cursor():
+    def batch_get(user_id, media_ids):
+        return {m: {"SK": f"media#{m}", "status": "COMPLETED"} for m in media_ids if m != "e"}
+
+    with patch("services.tag_search.query_tag_postings", side_effect=fake_index(POSTINGS)), \
+         patch("services.tag_search.batch_get_media", side_effect=batch_get):
+        first = tag_search.search_media("u", ["beach", "sunset"], "or", limit=3)
+        second = tag_search.search_media("u", ["beach", "sunset"], "or", limit=3, cursor=first["nextCursor"])
+        last = tag_search.search_media("u", ["beach", "sunset"], "or", limit=3, cursor=second["nextCursor"])
+
+    assert [i["mediaId"] for i in first["items"]] == ["a", "b", "c"]
+    # "e" has no record any more and is skipped
+    assert [i["mediaId"] for i in second["items"]] == ["d", "h"]
+    assert [i["mediaId"] for i in last["items"]] == ["i"] and last["nextCursor"] is None
+
+    with pytest.raises(BadRequestError):
+        tag_search.search_media("u", ["beach"], "or", limit=3, cursor=first["nextCursor"])
+
+
+def test_parse_tags_normalizes():
+    assert parse_tags(["#Beach", "beach ", "Sonnenuntergang", "ＣＡＴ"], 5) == ["beach", "sonnenuntergang", "cat"]
+    for bad in (["two words"], ["a#b"], [""], "beach", ["x"] * 6):
+        with pytest.raises(BadRequestError):
+            parse_tags(bad, 5)
+
+
+def test_search_handler(dummy_jwt):
+    event = {"headers": {"Authorization": dummy_jwt},
+             "queryStringParameters": {"tags": "#Beach,sunset", "mode": "or", "limit": "10"}}
+    page = {"items": [{"mediaId": "m1"}], "nextCursor": None}
+    with patch("handlers.search_handler.search_media", return_value=page) as mock_search:
+        result = search_handler.lambda_handler(event, None)
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["items"] == [{"mediaId": "m1"}]
+    mock_search.assert_called_once_with("123", ["beach", "sunset"], "or", limit=10, cursor=None, order=None)
+
+
+@pytest.mark.parametrize("params", [{}, {"tags": ","}, {"tags": "a b"}, {"tags": "a", "mode": "xor"},
+                                    {"tags": "a,b,c,d,e,f"}])
+def test_search_handler_validation(dummy_jwt, params):
+    event = {"headers": {"Authorization": dummy_jwt}, "queryStringParameters": params}
+    assert search_handler.lambda_handler(event, None)["statusCode"] == 400
+
+
+def test_tags_handler_replaces_tags(dummy_jwt):
+    event = {"headers": {"Authorization": dummy_jwt}, "pathParameters": {"mediaId": "m1"},
+             "body": json.dumps({"tags": ["Beach", "#sunset"]})}
+    with patch("handlers.tags_handler.set_media_tags", return_value={"modifiedAt": 5}) as mock_set:
+        result = tags_handler.lambda_handler(event, None)
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["tags"] == ["beach", "sunset"]
+    mock_set.assert_called_once_with("123", "m1", ["beach", "sunset"])
+
+    with patch("handlers.tags_handler.set_media_tags", return_value=None):
+        assert tags_handler.lambda_handler(dict(event), None)["statusCode"] == 404
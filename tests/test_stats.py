@@ -0,0 +1,92 @@
+import json
+import pytest
+from unittest.mock import patch
+from handlers import stats_handler, stats_repair_handler, upload_handler
+from services import dynamo_service, stats_repair
+
+
+def media(user_id, media_id, status="PENDING", size=100, visibility="PUBLIC", **extra):
+    return {"PK": f"user#{user_id}", "SK": f"media#{media_id}", "status": status,
+            "fileSize": size, "visibility": visibility, **extra}
+
+
+def test_completion_moves_status_and_corrects_bytes():
+    old = media("u", "m", size=100)
+    new = {**old, "actualFileSize": 120, "status": "COMPLETED"}
+    delta = dynamo_service.merge_deltas([dynamo_service.stats_delta(old, -1), dynamo_service.stats_delta(new)])
+    assert {k: v for k, v in delta.items() if v} == {"totalBytes": 20, "status_PENDING": -1, "status_COMPLETED": 1}
+
+
+def test_format_stats_hides_empty_groups():
+    item = {"PK": "user#u", "SK": "stats", "mediaCount": 3, "totalBytes": 300, "status_PENDING": 0,
+            "status_COMPLETED": 3, "visibility_PUBLIC": 2, "visibility_PRIVATE": 1, "updatedAt": 1}
+    assert dynamo_service.format_stats(item) == {
+        "mediaCount": 3, "totalBytes": 300,
+        "byStatus": {"COMPLETED": 3}, "byVisibility": {"PUBLIC": 2, "PRIVATE": 1},
+    }
+    assert dynamo_service.format_stats(None)["mediaCount"] == 0
+
+
+def test_repair_adds_the_difference_per_user():
+    segments = {
+        0: [media("a", "1", "COMPLETED", 10), {"PK": "user#b", "SK": "stats", "mediaCount": 2, "totalBytes": 5,
+                                                "status_PENDING": 2, "visibility_PUBLIC": 2}],
+        1: [media("a", "2", size=30, visibility="PRIVATE"),
+            {"PK": "user#a", "SK": "stats", "mediaCount": 2, "totalBytes": 40, "status_COMPLETED": 1,
+             "status_PENDING": 1, "visibility_PUBLIC": 1, "visibility_PRIVATE": 1}],
+    }
+    with patch("services.stats_repair.scan_stats_sources", side_effect=lambda s, total: iter(segments[s])), \
+         patch("services.stats_repair.read_stats_sources", return_value=([], segments[0][1])) as mock_read, \
+         patch("services.stats_repair.apply_stats_delta") as mock_apply:
+        summary = stats_repair.repair_stats(2)
+
+    # "a" is consistent across segments; "b" has a stats item but no media left
+    assert summary == {"users": 2, "drifted": 1, "unconfirmed": 0, "corrected": 1}
+    mock_read.assert_called_once_with("b")
+    mock_apply.assert_called_once_with("b", {"mediaCount": -2, "totalBytes": -5, "status_PENDING": -2,
+                                             "visibility_PUBLIC": -2})
+
+
+def test_repair_skips_drift_the_consistent_reads_do_not_confirm():
+    # The scan read the stats item before an upload's record landed and the record after it
+    stats = {"PK": "user#a", "SK": "stats", "mediaCount": 1, "totalBytes": 10, "status_COMPLETED": 1,
+             "visibility_PUBLIC": 1}
+    scanned = [media("a", "1", "COMPLETED", 10), stats, media("a", "2", size=30)]
+    settled = {**stats, "mediaCount": 2, "totalBytes": 40, "status_PENDING": 1, "visibility_PUBLIC": 2}
+    with patch("services.stats_repair.scan_stats_sources", return_value=iter(scanned)), \
+         patch("services.stats_repair.read_stats_sources", return_value=(scanned[::2], settled)), \
+         patch("services.stats_repair.apply_stats_delta") as mock_apply:
+        summary = stats_repair.repair_stats(1)
+
+    assert summary == {"users": 1, "drifted": 0, "unconfirmed": 1, "corrected": 0}
+    mock_apply.assert_not_called()
+
+
+def test_stats_handler(dummy_jwt):
+    stats = {"mediaCount": 1, "totalBytes": 10, "byStatus": {"COMPLETED": 1}, "byVisibility": {"PUBLIC": 1}}
+    with patch("handlers.stats_handler.get_stats", return_value=stats) as mock_get:
+        result = stats_handler.lambda_handler({"headers": {"Authorization": dummy_jwt}}, None)
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["totalBytes"] == 10
+    mock_get.assert_called_once_with("123")
+
+
+@pytest.mark.parametrize("event", [{"totalSegments": 0}, {"totalSegments": "4"}, {"totalSegments": 65}])
+def test_stats_repair_handler_validation(event):
+    assert stats_repair_handler.lambda_handler(event, None)["statusCode"] == 400
+
+
+def test_upload_rejected_over_quota():
+    stats = {"mediaCount": 9, "totalBytes": 1000, "byStatus": {}, "byVisibility": {}}
+    body = {"files": [{"contentType": "image/jpeg", "fileSize": 10}, {"contentType": "image/png", "fileSize": 10}]}
+    event = {"headers": {"Authorization": "Bearer t"}, "body": json.dumps(body)}
+    with patch("config.MAX_MEDIA_PER_USER", 10), \
+         patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.upload_handler.get_stats", return_value=stats), \
+         patch("handlers.upload_handler.generate_upload_url") as mock_sign:
+        result = upload_handler.lambda_handler(event, None)
+
+    assert result["statusCode"] == 403
+    assert json.loads(result["body"])["type"] == "QuotaExceededError"
+    mock_sign.assert_not_called()
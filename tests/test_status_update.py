@@ -2,6 +2,25 @@ import json
 import pytest
 from unittest.mock import patch
 from handlers import status_update_handler
+from utils.errors import MediaServiceError
+
+
+@pytest.fixture(autouse=True)
+def no_probe():
+    with patch("handlers.status_update_handler.probe_object", return_value={}) as mock_probe:
+        yield mock_probe
+
+
+@pytest.fixture(autouse=True)
+def metadata_write():
+    with patch("handlers.status_update_handler.set_media_metadata", return_value=True) as mock_write:
+        yield mock_write
+
+
+@pytest.fixture(autouse=True)
+def no_derivatives():
+    with patch("handlers.status_update_handler.request_derivatives") as mock_request:
+        yield mock_request
 
 
 def test_status_update_no_records():
@@ -31,7 +50,7 @@ def test_status_update_success():
 
         assert result["statusCode"] == 200
         assert body["message"] == "Media status updated"
-        mock_mark.assert_called_once_with("user123", "media123")
+        mock_mark.assert_called_once_with("user123", "media123", None)
 
 
 def test_status_update_invalid_key_format():
@@ -61,3 +80,141 @@ def test_status_update_unexpected_error():
 
         assert result["statusCode"] == 500
         assert "InternalServiceError" in body["type"]
+
+
+def sqs_message(message_id, keys):
+    notification = {"Records": [
+        {"s3": {"bucket": {"name": "media-bucket"}, "object": {"key": key}}} for key in keys
+    ]}
+    return {"eventSource": "aws:sqs", "messageId": message_id, "body": json.dumps(notification)}
+
+
+def test_status_update_sqs_partial_batch_failure():
+    event = {"Records": [
+        sqs_message("msg-1", ["user123/media1"]),
+        sqs_message("msg-2", ["badkey"]),
+        {"eventSource": "aws:sqs", "messageId": "msg-3", "body": "not-json"},
+        sqs_message("msg-4", ["user123/media4", "user123/media5"]),
+    ]}
+
+    def mark(user_id, media_id, metadata):
+        if media_id == "media4":
+            raise MediaServiceError("Throttled", 500)
+        return True
+
+    with patch("handlers.status_update_handler.mark_media_completed", side_effect=mark) as mock_mark:
+        result = status_update_handler.lambda_handler(event, None)
+
+    # Malformed msg-2 and msg-3 are acknowledged; only the retryable msg-4 comes back
+    assert result == {"batchItemFailures": [{"itemIdentifier": "msg-4"}]}
+    assert mock_mark.call_count == 2
+
+
+def test_status_update_processes_valid_records_despite_bad_key():
+    event = {
+        "Records": [
+            {"s3": {"bucket": {"name": "media-bucket"}, "object": {"key": "badkey"}}},
+            {"s3": {"bucket": {"name": "media-bucket"}, "object": {"key": "user123/media123"}}},
+        ]
+    }
+
+    with patch("handlers.status_update_handler.mark_media_completed", return_value=False) as mock_mark:
+        result = status_update_handler.lambda_handler(event, None)
+
+    assert result["statusCode"] == 400
+    mock_mark.assert_called_once_with("user123", "media123", None)
+
+
+def test_status_update_handles_multipart_completion_and_ignores_removals():
+    def record(name, key):
+        return {"eventName": name, "s3": {"bucket": {"name": "media-bucket"}, "object": {"key": key}}}
+
+    event = {"Records": [
+        record("ObjectCreated:CompleteMultipartUpload", "user123/big"),
+        record("ObjectRemoved:Delete", "user123/gone"),
+    ]}
+
+    with patch("handlers.status_update_handler.mark_media_completed") as mock_mark:
+        result = status_update_handler.lambda_handler(event, None)
+
+    assert result["statusCode"] == 200
+    mock_mark.assert_called_once_with("user123", "big", None)
+
+
+def test_status_update_requests_derivatives_for_completed_images(no_probe, no_derivatives):
+    def record(key):
+        return {"s3": {"bucket": {"name": "media-bucket"}, "object": {"key": key, "size": 10}}}
+
+    event = {"Records": [record("user123/img"), record("user123/doc"), record("variants/user123/img/thumb.webp")]}
+    no_probe.side_effect = lambda key, size: (
+        {"detectedContentType": "image/png"} if key.endswith("img") else {"detectedContentType": "unknown"}
+    )
+
+    with patch("handlers.status_update_handler.mark_media_completed", return_value=True) as mock_mark:
+        result = status_update_handler.lambda_handler(event, None)
+
+    assert result["statusCode"] == 200
+    # Derivative objects never reach the media table
+    assert mock_mark.call_count == 2
+    no_derivatives.assert_called_once_with([{"userId": "user123", "mediaId": "img", "s3Key": "user123/img"}])
+
+
+def test_status_update_skips_probe_for_completed_or_missing_items(no_probe, metadata_write):
+    event = {"Records": [sqs_message("msg-1", ["user123/done"]), sqs_message("msg-2", ["user123/gone"])]}
+
+    # The conditional write rejects both, so no S3 read or metadata write follows
+    with patch("handlers.status_update_handler.mark_media_completed", return_value=None) as mock_mark:
+        result = status_update_handler.lambda_handler(event, None)
+
+    assert result == {"batchItemFailures": []}
+    assert mock_mark.call_count == 2
+    no_probe.assert_not_called()
+    metadata_write.assert_not_called()
+
+
+def test_status_update_stores_probed_metadata_after_completion(no_probe, metadata_write, no_derivatives):
+    record = {"s3": {"bucket": {"name": "media-bucket"}, "object": {"key": "user123/img", "size": 10}}}
+    completed = {"status": "COMPLETED", "actualFileSize": 10, "contentType": "image/jpeg"}
+    no_probe.return_value = {"actualFileSize": 10, "detectedContentType": "image/png"}
+    metadata_write.side_effect = Exception("Throttled")
+
+    with patch("handlers.status_update_handler.mark_media_completed", return_value=completed) as mock_mark:
+        result = status_update_handler.lambda_handler({"Records": [record]}, None)
+
+    # A failed metadata write is not retried: the completion already happened
+    assert result["statusCode"] == 200
+    mock_mark.assert_called_once_with("user123", "img", {"actualFileSize": 10})
+    no_probe.assert_called_once_with("user123/img", 10)
+    metadata_write.assert_called_once_with("user123", "img", completed, no_probe.return_value)
+    no_derivatives.assert_called_once_with([{"userId": "user123", "mediaId": "img", "s3Key": "user123/img"}])
+
+
+def test_completion_write_then_one_conditional_metadata_write(aws, no_probe):
+    from services.dynamo_service import insert_media, get_media, delete_media, set_media_metadata
+    from utils.aws_clients import get_table
+
+    insert_media("u1", "m1", "u1/m1", "req-1", content_type="image/jpeg", file_size=10)
+    no_probe.return_value = {"actualFileSize": 12, "detectedContentType": "image/png", "width": 4, "height": 3}
+    record = {"s3": {"bucket": {"name": "media-bucket"}, "object": {"key": "u1/m1", "size": 12}}}
+
+    calls = []
+    get_table().meta.client.meta.events.register(
+        "provide-client-params.dynamodb.UpdateItem", lambda params, **kwargs: calls.append(params))
+    with patch("handlers.status_update_handler.set_media_metadata", set_media_metadata):
+        for _ in range(2):  # the second notification is a redelivery
+            status_update_handler.lambda_handler({"Records": [record]}, None)
+
+    item = get_media("u1", "m1")
+    assert (item["status"], item["actualFileSize"], item["width"], item["detectedContentType"]) == (
+        "COMPLETED", 12, 4, "image/png")
+    assert item["uploadMismatches"] == ["contentType declared image/jpeg, detected image/png",
+                                        "fileSize declared 10, actual 12"]
+    assert no_probe.call_count == 1
+    media_updates = [c for c in calls if "media#" in json.dumps(c.get("Key", ""))]
+    assert len(media_updates) == 3  # completion, metadata, rejected redelivery
+
+    # A record deleted before its metadata lands is not brought back
+    completed = item
+    delete_media("u1", "m1")
+    assert not set_media_metadata("u1", "m1", completed, {"width": 5, "detectedContentType": "x"})
+    assert get_media("u1", "m1") is None
@@ -0,0 +1,83 @@
+import json
+import threading
+from unittest.mock import patch
+import boto3
+from botocore.stub import Stubber
+from utils import tracing
+from utils.decorators import with_request_id
+from utils.response import success
+
+
+def emf_lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+
+
+def traced_client():
+    session = tracing.instrument(boto3.session.Session())
+    return session.client("dynamodb", region_name="us-east-1",
+                          aws_access_key_id="test", aws_secret_access_key="test")
+
+
+def test_invocation_emits_one_emf_line_with_calls_spans_and_cold_start(capsys):
+    client = traced_client()
+    stubber = Stubber(client)
+    for _ in range(4):
+        stubber.add_response(
+            "get_item",
+            {"Item": {"PK": {"S": "user#1"}}, "ConsumedCapacity": {"TableName": "media", "CapacityUnits": 0.5}},
+            {"TableName": "media", "Key": {"PK": {"S": "user#1"}}, "ReturnConsumedCapacity": "TOTAL"},
+        )
+
+    @with_request_id
+    def lambda_handler(event, context):
+        with tracing.span("jwt"):
+            client.get_item(TableName="media", Key={"PK": {"S": "user#1"}})
+        worker = threading.Thread(target=tracing.bind(client.get_item),
+                                  kwargs={"TableName": "media", "Key": {"PK": {"S": "user#1"}}})
+        worker.start()
+        worker.join()
+        return success({"ok": True})
+
+    with stubber, patch("utils.tracing._cold_start", True):
+        assert lambda_handler({"requestId": "req-1"}, None)["statusCode"] == 200
+        lambda_handler({"requestId": "req-2"}, None)
+
+    first, second = emf_lines(capsys)
+    metrics = {m["Name"] for m in first["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert {"DurationMs", "ColdStart", "DynamoDBCalls", "S3Calls", "ConsumedRCU", "JwtMs", "SerializeMs"} <= metrics
+    assert first["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Handler"]]
+    assert (first["Handler"], first["requestId"], first["statusCode"]) == ("test_tracing", "req-1", 200)
+    assert (first["ColdStart"], second["ColdStart"]) == (1, 0)
+    assert (first["DynamoDBCalls"], first["S3Calls"], first["ConsumedRCU"], first["ConsumedWCU"]) == (2, 0, 1.0, 0.0)
+    assert first["operations"]["dynamodb.GetItem"]["count"] == 2
+    assert first["operations"]["dynamodb.GetItem"]["retries"] == 0
+    assert tracing.current() is None
+
+
+def test_failed_invocation_is_still_reported(capsys):
+    @with_request_id
+    def lambda_handler(event, context):
+        raise RuntimeError("boom")
+
+    assert lambda_handler({"requestId": "req-3"}, None)["statusCode"] == 500
+    line, = emf_lines(capsys)
+    assert (line["statusCode"], line["DynamoDBCalls"]) == (500, 0)
+
+
+def test_batch_capacity_is_split_by_operation():
+    entries = [{"TableName": "media", "CapacityUnits": 2.0}, {"TableName": "other", "CapacityUnits": 1.0}]
+    assert tracing.consumed_capacity("BatchGetItem", entries) == (3.0, 0.0)
+    assert tracing.consumed_capacity("TransactWriteItems", entries) == (0.0, 3.0)
+    assert tracing.consumed_capacity("PutItem", None) == (0.0, 0.0)
+
+
+def test_disabled_tracing_emits_nothing(capsys):
+    @with_request_id
+    def lambda_handler(event, context):
+        with tracing.span("jwt"):
+            assert tracing.current() is None
+        return success({})
+
+    with patch("config.TRACE_ENABLED", False):
+        lambda_handler({}, None)
+    assert emf_lines(capsys) == []
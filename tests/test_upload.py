@@ -58,3 +58,111 @@ def test_upload_exception():
         result = upload_handler.lambda_handler(make_event(), None)
         assert result["statusCode"] == 500
         assert "InternalServiceError" in result["body"]
+
+
+def test_upload_many_files_with_per_file_errors():
+    files = [
+        {"contentType": "image/jpeg", "fileSize": 1024, "fileName": "a b.jpg"},
+        {"contentType": "video/mp4", "fileSize": 1024},
+        {"contentType": "image/png", "fileSize": 2048, "fileName": "c.png"},
+    ]
+    urls = iter([("m1", "user123/m1", "http://u1"), ("m3", "user123/m3", "http://u3")])
+
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.upload_handler.generate_upload_url", side_effect=lambda *a: next(urls)), \
+         patch("handlers.upload_handler.batch_insert_media", return_value=["m3"]) as mock_batch:
+
+        result = upload_handler.lambda_handler(make_event(body={"files": files}), None)
+        body = json.loads(result["body"])
+
+        assert result["statusCode"] == 200
+        items = mock_batch.call_args[0][0]
+        assert [i["SK"] for i in items] == ["media#m1", "media#m3"]
+        first, second, third = body["files"]
+        assert first["mediaId"] == "m1" and first["fileName"] == "a_b.jpg"
+        assert "Unsupported content type" in second["error"]
+        assert third["index"] == 2 and third["type"] == "InternalServiceError"
+
+
+def test_upload_many_files_cap():
+    files = [{"contentType": "image/jpeg", "fileSize": 1}] * 51
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}):
+        result = upload_handler.lambda_handler(make_event(body={"files": files}), None)
+        assert result["statusCode"] == 400
+        assert "At most 50 files" in result["body"]
+
+
+def test_upload_multipart_presigns_every_part():
+    body = {"contentType": "image/jpeg", "fileSize": 20 * 1024 * 1024 + 1, "multipart": True,
+            "partSize": 5 * 1024 * 1024}
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.upload_handler.create_multipart_upload", return_value=("m1", "user123/m1", "up-1")), \
+         patch("handlers.upload_handler.generate_part_urls",
+               side_effect=lambda key, upload_id, numbers: [f"http://part/{n}" for n in numbers]), \
+         patch("handlers.upload_handler.insert_media") as mock_insert:
+
+        result = upload_handler.lambda_handler(make_event(body=body), None)
+        payload = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert payload["uploadId"] == "up-1"
+    assert [p["partNumber"] for p in payload["parts"]] == [1, 2, 3, 4, 5]
+    assert "uploadUrl" not in payload
+    record = mock_insert.call_args.kwargs
+    assert (record["upload_id"], record["part_size"], record["part_count"]) == ("up-1", 5 * 1024 * 1024, 5)
+
+
+def test_upload_multipart_rejects_small_part_size():
+    body = {"contentType": "image/jpeg", "fileSize": 1024, "multipart": True, "partSize": 1024}
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}):
+        result = upload_handler.lambda_handler(make_event(body=body), None)
+
+    assert result["statusCode"] == 400
+    assert "Invalid partSize" in result["body"]
+
+
+SHA256 = "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
+
+
+def test_upload_duplicate_content_is_deduplicated():
+    body = {"contentType": "image/jpeg", "fileSize": 5, "sha256": SHA256}
+    existing = {"s3Key": "user123/original", "status": "COMPLETED", "refCount": 1}
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.upload_handler.get_content_hash", return_value=existing), \
+         patch("handlers.upload_handler.generate_upload_url") as mock_presign, \
+         patch("handlers.upload_handler.insert_media_with_hash", return_value=True) as mock_insert:
+
+        result = upload_handler.lambda_handler(make_event(body=body), None)
+        payload = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert payload["deduplicated"] is True and "uploadUrl" not in payload
+    mock_presign.assert_not_called()
+    item, deduplicated = mock_insert.call_args.args
+    assert deduplicated is True
+    assert (item["s3Key"], item["status"], item["contentHash"]) == ("user123/original", "COMPLETED", SHA256)
+
+
+def test_upload_new_content_signs_checksum_header():
+    body = {"contentType": "image/jpeg", "fileSize": 5, "sha256": SHA256.upper()}
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.upload_handler.get_content_hash", return_value=None), \
+         patch("handlers.upload_handler.generate_upload_url", return_value=("m1", "user123/m1", "http://u")) as mock_presign, \
+         patch("handlers.upload_handler.insert_media_with_hash", return_value=True) as mock_insert:
+
+        result = upload_handler.lambda_handler(make_event(body=body), None)
+        payload = json.loads(result["body"])
+
+    checksum = "LPJNul+wow4m6DsqxbninhsWHlwfp0JecwQzYpOLmCQ="
+    assert payload["uploadHeaders"]["x-amz-checksum-sha256"] == checksum
+    assert mock_presign.call_args.args[3] == checksum
+    assert mock_insert.call_args.args[1] is False
+
+
+def test_upload_invalid_sha256():
+    body = {"contentType": "image/jpeg", "fileSize": 5, "sha256": "abc"}
+    with patch("handlers.upload_handler.extract_jwt_claims", return_value={"user_id": "user123"}):
+        result = upload_handler.lambda_handler(make_event(body=body), None)
+
+    assert result["statusCode"] == 400
+    assert "Invalid sha256" in result["body"]
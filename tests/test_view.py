@@ -4,6 +4,11 @@ from unittest.mock import patch
 from handlers import view_handler
 
 
+@pytest.fixture(autouse=True)
+def clear_url_cache():
+    view_handler.url_cache.clear()
+
+
 @pytest.fixture
 def api_event(dummy_jwt):
     return {
@@ -14,9 +19,9 @@ def api_event(dummy_jwt):
 
 def test_view_success(api_event):
     with patch("handlers.view_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
-         patch("handlers.view_handler.get_media", return_value={"mediaId": "media123"}), \
+         patch("handlers.view_handler.get_media", return_value={"mediaId": "media123", "status": "COMPLETED"}), \
          patch("handlers.view_handler.get_cached_presigned_url", return_value=None), \
-         patch("handlers.view_handler.generate_download_url", return_value="http://download-url"), \
+         patch("handlers.view_handler.generate_download_url", return_value="http://download-url") as mock_presign, \
          patch("handlers.view_handler.cache_presigned_url") as mock_cache:
 
         result = view_handler.lambda_handler(api_event, None)
@@ -24,19 +29,43 @@ def test_view_success(api_event):
 
         assert result["statusCode"] == 200
         assert body["downloadUrl"] == "http://download-url"
-        mock_cache.assert_called_once()
+        # The read path no longer writes to DynamoDB by default
+        mock_cache.assert_not_called()
+
+        # Warm invocation is served from the in-process cache
+        result = view_handler.lambda_handler(dict(api_event), None)
+        assert json.loads(result["body"])["downloadUrl"] == "http://download-url"
+        mock_presign.assert_called_once()
+        assert view_handler.url_cache.stats()["hits"] == 1
 
 
 def test_view_with_cached_url(api_event):
-    with patch("handlers.view_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
-         patch("handlers.view_handler.get_media", return_value={"mediaId": "media123", "cachedUrl": "http://cached"}), \
-         patch("handlers.view_handler.get_cached_presigned_url", return_value="http://cached"):
+    with patch("config.DYNAMO_URL_CACHE_ENABLED", True), \
+         patch("handlers.view_handler.extract_jwt_claims", return_value={"user_id": "user123"}), \
+         patch("handlers.view_handler.get_media", return_value={"mediaId": "media123", "status": "COMPLETED"}), \
+         patch("handlers.view_handler.get_cached_presigned_url", return_value="http://cached"), \
+         patch("handlers.view_handler.generate_download_url") as mock_presign:
 
         result = view_handler.lambda_handler(api_event, None)
         body = json.loads(result["body"])
 
         assert result["statusCode"] == 200
         assert body["downloadUrl"] == "http://cached"
+        mock_presign.assert_not_called()
+
+
+def test_url_cache_lru_and_ttl():
+    from utils.cache import TTLCache
+
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts least recently used "b"
+    cache.set("d", 4, ttl=0)  # never stored
+
+    assert cache.get("b") is None and cache.get("d") is None
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 2, "evictions": 1}
 
 
 def test_view_missing_media_id(dummy_jwt):
@@ -66,3 +95,86 @@ def test_view_internal_error(api_event):
         result = view_handler.lambda_handler(api_event, None)
         assert result["statusCode"] == 500
         assert "InternalServiceError" in result["body"]
+
+
+def test_view_batch(dummy_jwt):
+    event = {
+        "httpMethod": "POST",
+        "headers": {"Authorization": dummy_jwt},
+        "body": json.dumps({"mediaIds": ["m1", "m2", "m3"]}),
+    }
+    items = {"m1": {"status": "COMPLETED"}, "m2": {"status": "PENDING"}}
+    with patch("handlers.view_handler.batch_get_media", return_value=items) as mock_get, \
+         patch("handlers.view_handler.generate_download_urls", return_value=["http://m1-url"]) as mock_sign:
+
+        result = view_handler.lambda_handler(event, None)
+        body = json.loads(result["body"])
+
+        assert result["statusCode"] == 200
+        mock_get.assert_called_once_with("123", ["m1", "m2", "m3"])
+        assert body["urls"] == {"m1": "http://m1-url"}
+        assert body["errors"]["m2"]["type"] == "Forbidden"
+        assert body["errors"]["m3"]["type"] == "NotFound"
+        mock_sign.assert_called_once_with(["123/m1"])
+
+
+def test_view_batch_too_many_ids(dummy_jwt):
+    event = {
+        "httpMethod": "POST",
+        "headers": {"Authorization": dummy_jwt},
+        "body": json.dumps({"mediaIds": [f"m{i}" for i in range(101)]}),
+    }
+    result = view_handler.lambda_handler(event, None)
+    assert result["statusCode"] == 400
+    assert "At most 100 mediaIds" in result["body"]
+
+
+VARIANTS = {
+    "thumb": {"key": "variants/123/m1/thumb.webp", "width": 150, "height": 100},
+    "small": {"key": "variants/123/m1/small.webp", "width": 640, "height": 427},
+}
+
+
+@pytest.mark.parametrize("query, served, key", [
+    ({"maxWidth": "100"}, "thumb", "variants/123/m1/thumb.webp"),
+    ({"maxWidth": "300"}, "small", "variants/123/m1/small.webp"),
+    ({"maxWidth": "2000"}, "original", "123/m1"),
+    ({"variant": "small"}, "small", "variants/123/m1/small.webp"),
+    ({"variant": "large"}, "original", "123/m1"),  # not generated (yet)
+])
+def test_view_serves_smallest_adequate_variant(dummy_jwt, query, served, key):
+    event = {"headers": {"Authorization": dummy_jwt}, "pathParameters": {"mediaId": "m1"},
+             "queryStringParameters": query}
+    item = {"status": "COMPLETED", "s3Key": "123/m1", "variants": VARIANTS}
+    with patch("handlers.view_handler.get_media", return_value=item), \
+         patch("handlers.view_handler.generate_download_url", return_value="http://url") as mock_presign:
+        result = view_handler.lambda_handler(event, None)
+
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200
+    assert body["variant"] == served
+    mock_presign.assert_called_once_with("123", "m1", key)
+
+
+@pytest.mark.parametrize("query", [{"variant": "huge"}, {"maxWidth": "0"}, {"maxWidth": "wide"},
+                                   {"variant": "thumb", "maxWidth": "100"}])
+def test_view_rejects_bad_variant_selectors(dummy_jwt, query):
+    event = {"headers": {"Authorization": dummy_jwt}, "pathParameters": {"mediaId": "m1"},
+             "queryStringParameters": query}
+    result = view_handler.lambda_handler(event, None)
+    assert result["statusCode"] == 400
+
+
+def test_view_batch_variants_are_cached_apart_from_originals(dummy_jwt):
+    def event(body):
+        return {"httpMethod": "POST", "headers": {"Authorization": dummy_jwt}, "body": json.dumps(body)}
+
+    items = {"m1": {"status": "COMPLETED", "s3Key": "123/m1", "variants": VARIANTS}}
+    with patch("handlers.view_handler.batch_get_media", return_value=items), \
+         patch("handlers.view_handler.generate_download_urls", side_effect=lambda keys: keys) as mock_sign:
+        thumb = json.loads(view_handler.lambda_handler(event({"mediaIds": ["m1"], "variant": "thumb"}), None)["body"])
+        original = json.loads(view_handler.lambda_handler(event({"mediaIds": ["m1"]}), None)["body"])
+
+    assert thumb["urls"] == {"m1": "variants/123/m1/thumb.webp"} and thumb["variants"] == {"m1": "thumb"}
+    assert original["urls"] == {"m1": "123/m1"} and original["variants"] == {"m1": "original"}
+    assert mock_sign.call_count == 2
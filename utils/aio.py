@@ -0,0 +1,129 @@
+"""
+Concurrent fan-out over the blocking service functions.
+
+boto3 has no async client, so the async side is a thread-pool adapter:
+`await to_thread(fn, ...)` runs a service function on a shared executor,
+and handlers gather() the calls that do not depend on each other, so a
+fan-out takes about as long as its slowest call instead of the sum. Each
+process (a Lambda container, a container-mode worker) gets one event loop,
+on a daemon thread started by the first run(), and one executor of
+AIO_MAX_WORKERS threads; boto3 clients and their connection pools are
+shared with the rest of the process as before.
+
+Synchronous code enters with run(coro), which blocks until the coroutine
+is done. The caller's context variables (the open trace) carry over into
+the coroutine and into every to_thread call. gather() and map_limited()
+are structured: when one call fails the others are cancelled before the
+error propagates, and map_limited() keeps at most `limit` calls in flight.
+A call already running on a pool thread cannot be interrupted; cancelling
+it only discards its result.
+
+Code running on the loop or the executor must await instead of calling
+run(): blocking a pool thread on its own pool can deadlock, so run()
+refuses.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+_lock = threading.Lock()
+_loop = None
+_local = threading.local()  # .owned is set on the loop thread and the executor threads
+
+
+def _mark_owned():
+    _local.owned = True
+
+
+def _serve(loop):
+    _mark_owned()
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def _start():
+    """The process's event loop, started on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(
+                max_workers=config.AIO_MAX_WORKERS, thread_name_prefix="aio", initializer=_mark_owned,
+            ))
+            threading.Thread(target=_serve, args=(loop,), name="aio-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def _reset_after_fork():
+    # The loop and pool threads do not survive fork(); the child starts its own
+    global _loop, _lock
+    _loop = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+async def _in_context(coro, context):
+    # A task starts from a copy of the loop thread's context; give it the caller's values
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run(coro, timeout=None):
+    """Run a coroutine on the shared loop from synchronous code and return its result."""
+    if getattr(_local, "owned", False):
+        coro.close()
+        raise RuntimeError("aio.run() called from the event loop or its executor; await the coroutine instead")
+    loop = _loop or _start()
+    future = asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Timed out or interrupted: do not leave the rest of the work running
+        future.cancel()
+        raise
+
+
+async def to_thread(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs), run on the shared executor with the current context."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+async def gather(*aws, return_exceptions=False):
+    """
+    asyncio.gather, structured: if one awaitable fails, the others are
+    cancelled before the exception propagates. With return_exceptions=True
+    failures are returned in place of results.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def map_limited(fn, items, limit, return_exceptions=False):
+    """
+    `await fn(item)` for every item, at most `limit` at a time; results in
+    input order. Fails like gather().
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def one(item):
+        async with semaphore:
+            return await fn(item)
+
+    return await gather(*(one(item) for item in items), return_exceptions=return_exceptions)
@@ -1,8 +1,112 @@
-import boto3
+import threading
 import config
+from utils import tracing
+from utils.logger import logger
 
-print(f"[AWS CLIENTS] Using LocalStack endpoint: {config.ENDPOINT}")
+_lock = threading.RLock()
+_clients = {}
 
-s3 = boto3.client("s3", region_name=config.REGION, endpoint_url=config.ENDPOINT)
-dynamodb = boto3.resource("dynamodb", region_name=config.REGION, endpoint_url=config.ENDPOINT)
-table = dynamodb.Table(config.MEDIA_TABLE)
+
+def _memoized(factory):
+    """
+    Build a client on first use and reuse it for the life of the container.
+    Construction is serialized because boto3 sessions are not thread-safe.
+    """
+    name = factory.__name__
+
+    def getter():
+        client = _clients.get(name)
+        if client is None:
+            with _lock:
+                client = _clients.get(name)
+                if client is None:
+                    client = _clients[name] = factory()
+        return client
+
+    getter.__name__ = name
+    getter.__doc__ = factory.__doc__
+    return getter
+
+
+@_memoized
+def get_session():
+    """
+    Shared boto3 session, created on first use. boto3 and botocore are
+    already imported by the service modules (boto3.dynamodb.conditions,
+    botocore.exceptions); what is deferred is the session, credential
+    resolution and every client's service model.
+    """
+    import boto3
+
+    logger.debug({"event": "AWS_SESSION", "endpoint": config.ENDPOINT})
+    session = boto3.session.Session()
+    if config.TRACE_ENABLED:
+        tracing.instrument(session)
+    return session
+
+
+@_memoized
+def get_s3():
+    """S3 client. SigV4 + path-style so botocore and services.presigner agree."""
+    from botocore.config import Config
+
+    return get_session().client(
+        "s3",
+        region_name=config.REGION,
+        endpoint_url=config.ENDPOINT,
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"},
+                      max_pool_connections=config.AWS_MAX_POOL_CONNECTIONS),
+    )
+
+
+@_memoized
+def get_lambda():
+    """Lambda client, used to hand work to other functions asynchronously."""
+    return get_session().client("lambda", region_name=config.REGION, endpoint_url=config.ENDPOINT)
+
+
+@_memoized
+def get_sqs():
+    """SQS client, used by the container-mode upload notification consumer."""
+    return get_session().client("sqs", region_name=config.REGION, endpoint_url=config.ENDPOINT)
+
+
+@_memoized
+def get_dynamodb():
+    from botocore.config import Config
+
+    return get_session().resource(
+        "dynamodb",
+        region_name=config.REGION,
+        endpoint_url=config.ENDPOINT,
+        config=Config(max_pool_connections=config.AWS_MAX_POOL_CONNECTIONS),
+    )
+
+
+@_memoized
+def get_table():
+    return get_dynamodb().Table(config.MEDIA_TABLE)
+
+
+def reset_clients():
+    """
+    Forget every memoized client. Forked workers call this so they never
+    share a parent's connections.
+    """
+    with _lock:
+        _clients.clear()
+
+
+def frozen_credentials():
+    """Current credentials of the shared session (refreshed when they rotate)."""
+    return get_session().get_credentials().get_frozen_credentials()
+
+
+_LAZY_ATTRIBUTES = {"s3": get_s3, "dynamodb": get_dynamodb, "table": get_table}
+
+
+def __getattr__(name):
+    # Backwards compatible `aws_clients.s3` / `.dynamodb` / `.table`, built on first access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,54 @@
+import re
+import unicodedata
 import config
+from utils.errors import BadRequestError
 
-def make_public_url(url: str) -> str:
+# Letters, digits, underscore and dash in any script; "#" separates index key parts
+TAG_PATTERN = re.compile(r"^[\w-]+$")
+
+def parse_media_ids(body: dict, max_items: int) -> list:
+    """
+    Validate the "mediaIds" array of a batch request body.
+    Returns the ids de-duplicated, in request order.
+    """
+    # Valid JSON need not be an object ([] or "x")
+    media_ids = body.get("mediaIds") if isinstance(body, dict) else None
+    if not isinstance(media_ids, list) or not media_ids:
+        raise BadRequestError("mediaIds must be a non-empty array")
+    if len(media_ids) > max_items:
+        raise BadRequestError(f"At most {max_items} mediaIds are allowed per request")
+    if not all(isinstance(media_id, str) and media_id for media_id in media_ids):
+        raise BadRequestError("mediaIds must contain non-empty strings")
+    return list(dict.fromkeys(media_ids))
+
+
+def normalize_tag(tag):
+    """'#Sunset ' -> 'sunset'. Returns None for tags that cannot be indexed."""
+    if not isinstance(tag, str):
+        return None
+    tag = unicodedata.normalize("NFKC", tag).strip().lstrip("#").casefold()
+    if not tag or len(tag) > config.MAX_TAG_LENGTH or not TAG_PATTERN.match(tag):
+        return None
+    return tag
+
+
+def parse_tags(tags, max_items: int) -> list:
     """
-    Replace internal LocalStack endpoint with public-facing one.
+    Validate a tags array. Returns the normalized tags, de-duplicated, in
+    request order; a missing array means no tags.
     """
-    return url.replace(config.ENDPOINT, config.PUBLIC_ENDPOINT)
+    if tags is None:
+        return []
+    if not isinstance(tags, list):
+        raise BadRequestError("tags must be an array of strings")
+    if len(tags) > max_items:
+        raise BadRequestError(f"At most {max_items} tags are allowed")
+    normalized = []
+    for tag in tags:
+        value = normalize_tag(tag)
+        if value is None:
+            raise BadRequestError(
+                f"Invalid tag: {tag!r} (letters, digits, _ and -, up to {config.MAX_TAG_LENGTH} characters)"
+            )
+        normalized.append(value)
+    return list(dict.fromkeys(normalized))
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+
+import config
+from utils.errors import BadRequestError
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: bytes) -> str:
+    digest = hmac.new(config.CURSOR_SECRET.encode(), payload, hashlib.sha256).digest()
+    return _b64encode(digest[:16])
+
+
+def _to_json(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Unsupported cursor value: {type(value).__name__}")
+
+
+def encode_cursor(last_key: dict, scope: str) -> str:
+    """
+    Turn a DynamoDB LastEvaluatedKey into an opaque, signed cursor.
+    `scope` binds the cursor to the query it came from (user, index, order)
+    so it cannot be replayed against another partition or access path.
+    """
+    payload = json.dumps(
+        {"k": last_key, "s": scope}, default=_to_json, separators=(",", ":"), sort_keys=True
+    ).encode()
+    return f"{_b64encode(payload)}.{_sign(payload)}"
+
+
+def decode_cursor(cursor: str, scope: str) -> dict:
+    """
+    Verify a cursor produced by encode_cursor and return the ExclusiveStartKey.
+    Raises BadRequestError if the cursor is malformed, tampered with or
+    belongs to a different query.
+    """
+    try:
+        body, signature = cursor.split(".", 1)
+        payload = _b64decode(body)
+        # compare_digest raises TypeError for a non-ASCII signature
+        signed = hmac.compare_digest(signature, _sign(payload))
+    except (ValueError, TypeError):
+        raise BadRequestError("Invalid cursor")
+
+    if not signed:
+        raise BadRequestError("Invalid cursor")
+
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        raise BadRequestError("Invalid cursor")
+
+    if data.get("s") != scope or not isinstance(data.get("k"), dict):
+        raise BadRequestError("Cursor does not match this query")
+    return data["k"]
@@ -1,14 +1,18 @@
 # utils/decorators.py
 import functools
-import logging
+import time
 import uuid
-from utils.response import success, failure
-
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+from utils import profiling, tracing
+from utils.logger import logger
+from utils.response import Response, failure, render
 
 def with_request_id(func):
-    """Decorator to ensure every request has a requestId and consistent logging."""
+    """
+    Decorator to ensure every request has a requestId and consistent logging.
+    Each invocation is traced (utils.tracing) and ends with one EMF metrics line;
+    sampled or explicitly requested invocations are profiled (utils.profiling).
+    """
+    handler_name = func.__module__.rsplit(".", 1)[-1]
 
     @functools.wraps(func)
     def wrapper(event, context, *args, **kwargs):
@@ -20,41 +24,46 @@ def with_request_id(func):
         )
         event["requestId"] = request_id  # ensure availability
 
-        # ENTRY log
-        logger.info({
+        # ENTRY log (debug only; EXIT carries the request summary)
+        start = time.perf_counter()
+        trace = tracing.begin(handler_name, request_id)
+        status_code = None
+        logger.debug({
             "event": "ENTER",
             "handler": func.__name__,
             "requestId": request_id,
             "path": event.get("path"),
             "method": event.get("httpMethod"),
-            "hasHeaders": bool(event.get("headers")),
-            "hasBody": bool(event.get("body")),
+            "hasHeaders": lambda: bool(event.get("headers")),
+            "hasBody": lambda: bool(event.get("body")),
             "pathParameters": event.get("pathParameters"),
             "queryParameters": event.get("queryStringParameters"),
         })
 
         try:
-            response = func(event, context, *args, **kwargs)
-
-            # If response dict exists, inject requestId for consistency
-            if isinstance(response, dict) and "body" in response:
-                import json
-                try:
-                    body = json.loads(response["body"])
-                    body["requestId"] = request_id
-                    response["body"] = json.dumps(body)
-                except Exception:
-                    pass  # don’t break on body mutation
+            mode = profiling.requested_mode(event)
+            if mode:
+                response = profiling.run(mode, handler_name, request_id, func, event, context, *args, **kwargs)
+            else:
+                response = func(event, context, *args, **kwargs)
 
             # EXIT log
             logger.info({
                 "event": "EXIT",
                 "handler": func.__name__,
                 "requestId": request_id,
+                "path": event.get("path"),
+                "method": event.get("httpMethod"),
                 "status": "success",
-                "statusCode": response.get("statusCode") if isinstance(response, dict) else None,
+                "statusCode": response.status_code if isinstance(response, Response) else None,
+                "durationMs": lambda: round((time.perf_counter() - start) * 1000, 2),
             })
-            return response
+
+            # Body is serialized exactly once, with requestId injected
+            with tracing.span("serialize"):
+                rendered = render(response, request_id)
+            status_code = rendered.get("statusCode") if isinstance(rendered, dict) else None
+            return rendered
 
         except Exception as e:
             logger.error({
@@ -64,14 +73,18 @@ def with_request_id(func):
                 "status": "error",
                 "errorType": type(e).__name__,
                 "errorMessage": str(e),
+                "durationMs": round((time.perf_counter() - start) * 1000, 2),
             }, exc_info=True)
 
             # Ensure failure response always includes requestId
-            return failure(
+            status_code = 500
+            return render(failure(
                 message="Internal server error",
                 code=500,
                 error_type=type(e).__name__,
-                request_id=request_id
-            )
+            ), request_id)
+
+        finally:
+            tracing.end(trace, status_code)
 
     return wrapper
@@ -29,3 +29,15 @@ class InternalServiceError(MediaServiceError):
     """System/internal error"""
     def __init__(self, message="Internal server error"):
         super().__init__(message, code=500)
+
+
+class ConflictError(MediaServiceError):
+    """Concurrent modification lost a conditional write"""
+    def __init__(self, message="Conflict"):
+        super().__init__(message, code=409)
+
+
+class QuotaExceededError(MediaServiceError):
+    """Request would exceed the user's storage quota"""
+    def __init__(self, message="Quota exceeded"):
+        super().__init__(message, code=403)
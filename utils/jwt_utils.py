@@ -1,6 +1,47 @@
+import hashlib
+import time
 import jwt
 import config
+from utils.cache import TTLCache
 from utils.errors import UnauthorizedError
+from utils.tracing import span
+
+# Verified claims keyed by SHA-256 of the token; shared by warm invocations
+claims_cache = TTLCache(config.JWT_CACHE_MAX_ENTRIES, config.JWT_CACHE_MAX_AGE_SECONDS)
+_cache_key_material = None
+
+
+def _check_key_rotation():
+    """Drop every cached entry when JWT_SECRET / JWT_ALGO change."""
+    global _cache_key_material
+    material = (config.JWT_SECRET, config.JWT_ALGO)
+    if material != _cache_key_material:
+        claims_cache.clear()
+        _cache_key_material = material
+
+
+def verify_token(token: str) -> dict:
+    """
+    Decode and verify a bearer token, reusing a previous verification when
+    the same token was seen before. Entries live until the token's `exp`
+    or JWT_CACHE_MAX_AGE_SECONDS, whichever comes first.
+    """
+    _check_key_rotation()
+    digest = hashlib.sha256(token.encode()).hexdigest()
+
+    claims = claims_cache.get(digest)
+    if claims is not None:
+        return dict(claims)
+
+    claims = jwt.decode(token, config.JWT_SECRET, algorithms=[config.JWT_ALGO])
+
+    ttl = config.JWT_CACHE_MAX_AGE_SECONDS
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(ttl, exp - time.time())
+    claims_cache.set(digest, claims, ttl=ttl)
+    return dict(claims)
+
 
 def extract_jwt_claims(event):
     headers = event.get("headers") or {}
@@ -12,9 +53,21 @@ def extract_jwt_claims(event):
     token = auth_header.split(" ")[1]
 
     try:
-        claims = jwt.decode(token, config.JWT_SECRET, algorithms=[config.JWT_ALGO])
-        return claims
+        with span("jwt"):
+            claims = verify_token(token)
     except jwt.ExpiredSignatureError:
         raise UnauthorizedError("Token has expired")
     except jwt.InvalidTokenError as e:
         raise UnauthorizedError(f"Invalid token: {str(e)}")
+
+    # Decoded identity stays on the event for the rest of the invocation
+    event["claims"] = claims
+    event["userId"] = claims.get("user_id")
+    return claims
+
+
+def get_user_id(event):
+    """user_id of the caller, decoding the token only if not done yet."""
+    if "userId" in event:
+        return event["userId"]
+    return extract_jwt_claims(event).get("user_id")
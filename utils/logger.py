@@ -1,15 +1,114 @@
+"""
+Structured JSON-lines logging for every handler and service.
+
+Call sites log dicts (or plain strings). Nothing is formatted until a
+record is actually emitted:
+  - the logger's level check runs before a record is built;
+  - dict values that are callables are evaluated only at format time,
+    so expensive fields can be passed as `lambda: ...`;
+  - per-event sampling (LOG_SAMPLE_RATES, e.g. "ENTER=0,INSERT_MEDIA=0.1")
+    drops INFO/DEBUG records before formatting; warnings and errors are
+    never sampled;
+  - string fields are capped at LOG_MAX_FIELD_CHARS and sensitive keys
+    (Authorization, cookies, tokens) are redacted, including inside
+    nested payloads such as raw API Gateway events.
+"""
+import json
 import logging
-import os
+import random
+import time
+
+import config
+
+REDACTED = "[REDACTED]"
+REDACT_KEYS = {"authorization", "cookie", "x-amz-security-token", "token"}
+
+
+def parse_sample_rates(spec):
+    """'ENTER=0.1,EXIT=1' -> {"ENTER": 0.1, "EXIT": 1.0}; bad entries are ignored."""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, _, rate = part.partition("=")
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def event_type(msg):
+    """Sampling key of a structured message: its event, step or action."""
+    if isinstance(msg, dict):
+        return msg.get("event") or msg.get("step") or msg.get("action")
+    return None
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(event_type(record.msg))
+        return rate is None or random.random() < rate
+
+
+def _cap(value, limit):
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}...(truncated {len(value) - limit} chars)"
+
+
+def _scrub(value, limit, depth=0):
+    """Resolve lazy values, redact sensitive keys and cap large strings."""
+    if callable(value):
+        value = value()
+    if isinstance(value, dict):
+        if depth >= 4:
+            return _cap(json.dumps(value, default=str), limit)
+        return {
+            k: REDACTED if str(k).lower() in REDACT_KEYS else _scrub(v, limit, depth + 1)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        if depth >= 4:
+            return _cap(json.dumps(value, default=str), limit)
+        return [_scrub(v, limit, depth + 1) for v in value]
+    if isinstance(value, str):
+        return _cap(value, limit)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_field_chars):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record):
+        doc = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, dict):
+            doc.update(_scrub(record.msg, self.max_field_chars))
+        else:
+            doc["message"] = _cap(record.getMessage(), self.max_field_chars)
+        if record.exc_info:
+            doc["exception"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str)
 
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 logger = logging.getLogger("media-service")
 if not logger.handlers:
     handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
-    )
-    handler.setFormatter(formatter)
+    handler.setFormatter(JsonFormatter(config.LOG_MAX_FIELD_CHARS))
     logger.addHandler(handler)
+    logger.addFilter(SamplingFilter(parse_sample_rates(config.LOG_SAMPLE_RATES)))
 
-logger.setLevel(LOG_LEVEL)
+# One logger for the whole service; the Lambda runtime's root handler would duplicate lines
+logger.propagate = False
+logger.setLevel(config.LOG_LEVEL)
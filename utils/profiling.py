@@ -0,0 +1,217 @@
+"""
+On-demand profiling of single invocations, for slow requests that only
+reproduce against real traffic.
+
+with_request_id profiles a request when either
+  - PROFILE_SAMPLE_RATE > 0 and the request is sampled (mode PROFILE_MODE), or
+  - it carries an X-Debug-Profile header signed with PROFILE_SECRET:
+    "<mode>.<expiresEpoch>.<signature>", as made by profile_header() or
+    `python -m utils.profiling cpu 900`.
+
+Modes are "cpu" (cProfile), "memory" (tracemalloc) and "all". The handler
+runs under the selected profilers, then two artifacts tagged with the
+requestId are written to PROFILE_OUTPUT (a directory, or s3://bucket/prefix):
+  - <handler>/<requestId>.pstats: the cProfile dump (pstats, snakeviz, ...);
+  - <handler>/<requestId>.json: top functions by cumulative time, top
+    allocation sites and peak traced memory.
+cProfile only profiles the handler's own thread. tracemalloc is
+process-wide: concurrent memory profiles (threaded container mode) share
+one tracer, so their allocations and peaks include each other's. When
+neither setting is on, a request costs two config checks. Everything
+beyond that (profilers, hashing, temp files) is imported on first use, so
+cold starts don't pay for it either.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import config
+from utils.logger import logger
+
+MODES = ("cpu", "memory", "all")
+HEADER = "x-debug-profile"
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0       # profiles currently relying on the tracer
+_tracemalloc_owned = False   # whether this module started it (and so stops it)
+
+
+def _sign(message: str) -> str:
+    import base64
+    import hashlib
+    import hmac
+
+    digest = hmac.new(config.PROFILE_SECRET.encode(), message.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode("ascii")
+
+
+def profile_header(mode, ttl_seconds=900, now=None):
+    """X-Debug-Profile value asking for `mode`, valid for `ttl_seconds`."""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    expires = int((now or time.time()) + ttl_seconds)
+    return f"{mode}.{expires}.{_sign(f'{mode}.{expires}')}"
+
+
+def _header_mode(event, now=None):
+    headers = event.get("headers") or {}
+    value = next((v for k, v in headers.items() if k.lower() == HEADER), None)
+    if not value:
+        return None
+    import hmac
+
+    try:
+        mode, expires, signature = value.split(".")
+        expires = int(expires)
+    except (AttributeError, ValueError):
+        mode = expires = signature = None
+    if mode not in MODES or expires < (now or time.time()) or \
+            not hmac.compare_digest(signature, _sign(f"{mode}.{expires}")):
+        logger.warning({"event": "PROFILE_HEADER_REJECTED"})
+        return None
+    return mode
+
+
+def requested_mode(event):
+    """Profiling mode for this invocation, or None when it runs unprofiled."""
+    if config.PROFILE_SECRET:
+        mode = _header_mode(event)
+        if mode:
+            return mode
+    if config.PROFILE_SAMPLE_RATE > 0 and config.PROFILE_MODE in MODES:
+        if random.random() < config.PROFILE_SAMPLE_RATE:
+            return config.PROFILE_MODE
+    return None
+
+
+def _acquire_tracemalloc():
+    """Count one more profile using tracemalloc, starting it if nothing is tracing yet."""
+    global _tracemalloc_users, _tracemalloc_owned
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            # Leave a tracer started outside this module running
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+        _tracemalloc_users += 1
+    return tracemalloc
+
+
+def _release_tracemalloc(tracemalloc):
+    """The last profile using the tracer stops it, if this module started it."""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def run(mode, handler, request_id, func, *args, **kwargs):
+    """Call func(*args, **kwargs) under the profilers of `mode` and save the artifacts."""
+    profiler = None
+    if mode in ("cpu", "all"):
+        import cProfile
+        profiler = cProfile.Profile()
+    tracemalloc = _acquire_tracemalloc() if mode in ("memory", "all") else None
+
+    start = time.perf_counter()
+    if profiler:
+        try:
+            profiler.enable()
+        except Exception as e:
+            # e.g. another profiler owns the interpreter's hooks
+            logger.warning({"event": "PROFILE_START_FAILED", "error": str(e)})
+            profiler = None
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if profiler:
+            profiler.disable()
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        summary = {"requestId": request_id, "handler": handler, "mode": mode, "durationMs": duration_ms}
+        snapshot = peak = None
+        try:
+            if tracemalloc:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+            summary.update(summarize(profiler, snapshot, peak))
+            location = save(handler, request_id, profiler, summary)
+            logger.info({"event": "PROFILE_CAPTURED", "location": location, "mode": mode,
+                         "durationMs": duration_ms, "peakBytes": peak})
+        except Exception as e:
+            # Profiling must never change the outcome of the request
+            logger.warning({"event": "PROFILE_WRITE_FAILED", "error": str(e)})
+        finally:
+            if tracemalloc:
+                _release_tracemalloc(tracemalloc)
+
+
+def summarize(profiler=None, snapshot=None, peak=None, top_n=None):
+    """Top functions (cumulative time) and allocation sites (bytes) as JSON-ready lists."""
+    top_n = top_n or config.PROFILE_TOP_N
+    summary = {}
+    if profiler is not None:
+        import pstats
+        stats = pstats.Stats(profiler).stats
+        ranked = sorted(stats.items(), key=lambda entry: entry[1][3], reverse=True)[:top_n]
+        summary["functions"] = [
+            {"function": f"{file}:{line}({name})", "calls": calls,
+             "ownMs": round(own * 1000, 3), "cumulativeMs": round(cumulative * 1000, 3)}
+            for (file, line, name), (_, calls, own, cumulative, _) in ranked
+        ]
+    if snapshot is not None:
+        import tracemalloc
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        summary["allocations"] = [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "sizeBytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:top_n]
+        ]
+        summary["peakBytes"] = peak
+    return summary
+
+
+def save(handler, request_id, profiler, summary):
+    """Write the artifacts to PROFILE_OUTPUT. Returns where they went."""
+    output = config.PROFILE_OUTPUT
+    # Becomes a file name / key segment
+    request_id = "".join(c if c.isalnum() or c in "._-" else "_" for c in str(request_id))
+    name = f"{handler}/{request_id}"
+    if not output.startswith("s3://"):
+        directory = os.path.join(output, handler)
+        os.makedirs(directory, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(directory, f"{request_id}.pstats"))
+        with open(os.path.join(directory, f"{request_id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return os.path.join(output, name)
+
+    import tempfile
+    from utils.aws_clients import get_s3
+
+    bucket, _, prefix = output[len("s3://"):].partition("/")
+    key = f"{prefix.strip('/')}/{name}" if prefix.strip("/") else name
+    if profiler is not None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profile.pstats")
+            profiler.dump_stats(path)
+            with open(path, "rb") as f:
+                get_s3().put_object(Bucket=bucket, Key=f"{key}.pstats", Body=f.read())
+    get_s3().put_object(Bucket=bucket, Key=f"{key}.json", Body=json.dumps(summary, indent=2).encode(),
+                        ContentType="application/json")
+    return f"s3://{bucket}/{key}"
+
+
+if __name__ == "__main__":
+    # python -m utils.profiling <mode> [ttlSeconds]  (PROFILE_SECRET must match the deployed one)
+    print(profile_header(sys.argv[1] if len(sys.argv) > 1 else "cpu",
+                         int(sys.argv[2]) if len(sys.argv) > 2 else 900))
@@ -1,13 +1,73 @@
 import json
+from decimal import Decimal
+
+try:  # optional fast backend; output is parsed identically either way
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+class Response:
+    """
+    Structured handler result. The body stays a Python object until
+    render() serializes it once, after the decorator has added requestId.
+    """
+
+    __slots__ = ("status_code", "payload", "headers")
+
+    def __init__(self, payload, status_code=200, headers=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers
+
+
+def _default(value):
+    # DynamoDB numbers come back as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps_stdlib(payload):
+    return json.dumps(payload, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _dumps_orjson(payload):
+    try:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        # e.g. integers beyond 64 bits; the stdlib handles them
+        return _dumps_stdlib(payload)
+
+
+JSON_BACKENDS = {"stdlib": _dumps_stdlib}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = _dumps_orjson
+dumps = JSON_BACKENDS.get("orjson", _dumps_stdlib)
+
 
 def success(body, code=200):
-    return {"statusCode": code, "body": json.dumps(body)}
+    return Response(body, code)
+
 
 def failure(message, code=500, error_type="SystemError"):
-    return {
-        "statusCode": code,
-        "body": json.dumps({
-            "error": message,
-            "type": error_type
-        })
-    }
+    return Response({"error": message, "type": error_type}, code)
+
+
+def render(response, request_id=None):
+    """
+    Turn a Response into the API Gateway proxy dict, injecting requestId
+    into dict payloads. Anything else (e.g. SQS batchItemFailures) is
+    returned unchanged.
+    """
+    if not isinstance(response, Response):
+        return response
+    payload = response.payload
+    if request_id is not None and isinstance(payload, dict):
+        payload["requestId"] = request_id
+    rendered = {"statusCode": response.status_code, "body": dumps(payload)}
+    if response.headers:
+        rendered["headers"] = response.headers
+    return rendered
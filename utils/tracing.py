@@ -0,0 +1,227 @@
+"""
+Per-invocation trace of where a request's time went, emitted as one
+CloudWatch Embedded Metric Format (EMF) line when the handler returns.
+
+with_request_id opens the trace. It collects:
+  - every AWS call made through the shared session (utils.aws_clients),
+    timed by botocore before-call / after-call hooks, with its retry count
+    and, for DynamoDB, the capacity it consumed (requests are sent with
+    ReturnConsumedCapacity=TOTAL while a trace is open);
+  - named spans around local work: JWT verification, presigning and
+    response serialization;
+  - whether the invocation was the container's cold start.
+
+The trace lives in a ContextVar, so the hooks cost one lookup when no
+trace is open. Pool threads do not inherit it; submit bind(fn) instead of
+fn to have their calls counted (utils.aio carries it over by itself). Spans and call times from concurrent
+threads are summed, so they can exceed the invocation's duration.
+TRACE_ENABLED=false removes the hooks and the EMF line.
+"""
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+READ_OPERATIONS = {"GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems"}
+SERVICE_LABELS = {"dynamodb": "DynamoDB", "s3": "S3", "lambda": "Lambda"}
+_CONTEXT_KEY = "media_service_trace"
+
+_current = contextvars.ContextVar("media_service_trace", default=None)
+_cold_start = True
+
+
+class Trace:
+    """Everything recorded for one invocation; safe to update from pool threads."""
+
+    def __init__(self, handler, request_id, cold_start=False):
+        self.handler = handler
+        self.request_id = request_id
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.spans = {}       # "jwt" -> ms
+        self.operations = {}  # "dynamodb.Query" -> {"count", "ms", "retries", "errors", "rcu", "wcu"}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, ms):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def add_call(self, name, ms, retries=0, error=False, rcu=0.0, wcu=0.0):
+        with self._lock:
+            entry = self.operations.get(name)
+            if entry is None:
+                entry = self.operations[name] = {"count": 0, "ms": 0.0, "retries": 0, "errors": 0,
+                                                 "rcu": 0.0, "wcu": 0.0}
+            entry["count"] += 1
+            entry["ms"] += ms
+            entry["retries"] += retries
+            entry["errors"] += int(error)
+            entry["rcu"] += rcu
+            entry["wcu"] += wcu
+
+    def metrics(self, duration_ms):
+        """{metric name: (value, unit)} for the EMF line."""
+        values = {
+            "DurationMs": (duration_ms, "Milliseconds"),
+            "ColdStart": (int(self.cold_start), "Count"),
+        }
+        with self._lock:
+            operations = {name: dict(entry) for name, entry in self.operations.items()}
+            spans = dict(self.spans)
+        services = {"dynamodb": [0, 0.0], "s3": [0, 0.0]}  # always reported, so dashboards see zeros
+        for name, entry in operations.items():
+            totals = services.setdefault(name.split(".", 1)[0], [0, 0.0])
+            totals[0] += entry["count"]
+            totals[1] += entry["ms"]
+        for service, (count, ms) in services.items():
+            label = SERVICE_LABELS.get(service, service.capitalize())
+            values[f"{label}Calls"] = (count, "Count")
+            values[f"{label}Ms"] = (round(ms, 2), "Milliseconds")
+        values["AwsRetries"] = (sum(e["retries"] for e in operations.values()), "Count")
+        values["AwsErrors"] = (sum(e["errors"] for e in operations.values()), "Count")
+        values["ConsumedRCU"] = (round(sum(e["rcu"] for e in operations.values()), 2), "Count")
+        values["ConsumedWCU"] = (round(sum(e["wcu"] for e in operations.values()), 2), "Count")
+        for name, ms in spans.items():
+            values[f"{name.capitalize()}Ms"] = (round(ms, 2), "Milliseconds")
+        return values, operations
+
+    def to_emf(self, status_code=None, now=None):
+        duration_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        values, operations = self.metrics(duration_ms)
+        doc = {
+            "_aws": {
+                "Timestamp": int((now or time.time()) * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": config.METRICS_NAMESPACE,
+                    "Dimensions": [["Handler"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()],
+                }],
+            },
+            "Handler": self.handler,
+            "requestId": self.request_id,
+            "statusCode": status_code,
+        }
+        doc.update((name, value) for name, (value, _) in values.items())
+        # Per-operation detail stays a plain property: metrics per operation would multiply cardinality
+        doc["operations"] = {
+            name: {k: round(v, 2) if isinstance(v, float) else v for k, v in entry.items()}
+            for name, entry in sorted(operations.items())
+        }
+        return doc
+
+
+def current():
+    return _current.get()
+
+
+def begin(handler, request_id):
+    """Open a trace for this invocation. Returns the token end() needs, or None when disabled."""
+    global _cold_start
+    if not config.TRACE_ENABLED:
+        return None
+    cold_start, _cold_start = _cold_start, False
+    return _current.set(Trace(handler, request_id, cold_start))
+
+
+def end(token, status_code=None):
+    """Close the trace opened by begin() and write its EMF line."""
+    if token is None:
+        return
+    trace = _current.get()
+    _current.reset(token)
+    if trace is not None:
+        emit(trace.to_emf(status_code))
+
+
+def emit(doc):
+    # EMF is picked up from the function's log stream; stdout keeps it apart from the JSON logger
+    sys.stdout.write(json.dumps(doc, separators=(",", ":"), default=str) + "\n")
+    sys.stdout.flush()
+
+
+@contextmanager
+def span(name):
+    """Time a block of local work into the current trace (no-op without one)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, (time.perf_counter() - start) * 1000)
+
+
+def bind(fn):
+    """fn, made to record into the caller's trace when run on a pool thread."""
+    trace = _current.get()
+    if trace is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+def consumed_capacity(operation, consumed):
+    """(RCU, WCU) from a DynamoDB ConsumedCapacity field (one entry, or one per table)."""
+    if not consumed:
+        return 0.0, 0.0
+    entries = consumed if isinstance(consumed, list) else [consumed]
+    units = float(sum(entry.get("CapacityUnits", 0) for entry in entries))
+    return (units, 0.0) if operation in READ_OPERATIONS else (0.0, units)
+
+
+def _request_capacity(params, model, **kwargs):
+    if _current.get() is not None and "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _before_call(model, context, **kwargs):
+    trace = _current.get()
+    if trace is not None:
+        name = f"{model.service_model.endpoint_prefix}.{model.name}"
+        context[_CONTEXT_KEY] = (trace, name, time.perf_counter())
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    entry = context.pop(_CONTEXT_KEY, None)
+    if entry is None:
+        return
+    trace, name, start = entry
+    rcu, wcu = consumed_capacity(model.name, parsed.get("ConsumedCapacity"))
+    trace.add_call(
+        name, (time.perf_counter() - start) * 1000,
+        retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+        error=http_response.status_code >= 300, rcu=rcu, wcu=wcu,
+    )
+
+
+def _after_call_error(context, **kwargs):
+    # Raised before a response was parsed (e.g. connection errors after the last retry)
+    entry = context.pop(_CONTEXT_KEY, None)
+    if entry is not None:
+        trace, name, start = entry
+        trace.add_call(name, (time.perf_counter() - start) * 1000, error=True)
+
+
+def instrument(session):
+    """Register the hooks on a boto3 session; clients created from it afterwards are traced."""
+    events = session.events
+    events.register("provide-client-params.dynamodb", _request_capacity)
+    # First and as specific as any other before-call handler: one that answers the call (e.g. a
+    # Stubber) would otherwise stop the event before the timer starts
+    events.register_first("before-call.*.*", _before_call)
+    events.register("after-call", _after_call)
+    events.register("after-call-error", _after_call_error)
+    return session